@@ -0,0 +1,80 @@
+"""move source code into source_codes
+
+Revision ID: 4b7e0c93d2a1
+Revises: 8f2c6d1e4a57
+Create Date: 2026-10-19 11:03:47.118240
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from vjudge.compression import compress, decompress, digest
+
+
+# revision identifiers, used by Alembic.
+revision = '4b7e0c93d2a1'
+down_revision = '8f2c6d1e4a57'
+branch_labels = None
+depends_on = None
+
+submissions = sa.table('submissions',
+                       sa.column('id', sa.Integer),
+                       sa.column('source_code', sa.String),
+                       sa.column('source_digest', sa.String))
+
+source_codes = sa.table('source_codes',
+                        sa.column('digest', sa.String),
+                        sa.column('data', sa.LargeBinary))
+
+batch_size = 500
+
+
+def _batches(connection, key, *columns):
+    last = None
+    while True:
+        query = sa.select([key, *columns]).order_by(key).limit(batch_size)
+        if last is not None:
+            query = query.where(key > last)
+        rows = connection.execute(query).fetchall()
+        if not rows:
+            return
+        yield rows
+        last = rows[-1][0]
+
+
+def upgrade():
+    op.create_table('source_codes',
+    sa.Column('digest', sa.String(), nullable=False),
+    sa.Column('data', sa.LargeBinary(), nullable=False),
+    sa.PrimaryKeyConstraint('digest')
+    )
+    op.add_column('submissions', sa.Column('source_digest', sa.String(), nullable=True))
+    connection = op.get_bind()
+    seen = set()
+    for rows in _batches(connection, submissions.c.id, submissions.c.source_code):
+        for submission_id, source_code in rows:
+            source_digest = digest(source_code)
+            if source_digest not in seen:
+                connection.execute(source_codes.insert().values(digest=source_digest, data=compress(source_code)))
+                seen.add(source_digest)
+            connection.execute(submissions.update().where(submissions.c.id == submission_id).values(
+                source_digest=source_digest))
+    with op.batch_alter_table('submissions') as batch_op:
+        batch_op.alter_column('source_digest', existing_type=sa.String(), nullable=False)
+        batch_op.create_foreign_key('fk_submissions_source_digest_source_codes',
+                                    'source_codes', ['source_digest'], ['digest'])
+        batch_op.drop_column('source_code')
+
+
+def downgrade():
+    op.add_column('submissions', sa.Column('source_code', sa.String(), nullable=True))
+    connection = op.get_bind()
+    for rows in _batches(connection, source_codes.c.digest, source_codes.c.data):
+        for source_digest, data in rows:
+            connection.execute(submissions.update().where(submissions.c.source_digest == source_digest).values(
+                source_code=decompress(data)))
+    with op.batch_alter_table('submissions') as batch_op:
+        batch_op.alter_column('source_code', existing_type=sa.String(), nullable=False)
+        batch_op.drop_constraint('fk_submissions_source_digest_source_codes', type_='foreignkey')
+        batch_op.drop_column('source_digest')
+    op.drop_table('source_codes')
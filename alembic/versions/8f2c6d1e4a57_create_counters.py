@@ -0,0 +1,36 @@
+"""create counters
+
+Revision ID: 8f2c6d1e4a57
+Revises: 1512a8979993
+Create Date: 2026-10-19 10:12:31.402215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f2c6d1e4a57'
+down_revision = '1512a8979993'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('counters',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('value', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.execute("INSERT INTO counters (name, value) SELECT 'submissions', COUNT(*) FROM submissions")
+    op.execute("INSERT INTO counters (name, value) SELECT 'submissions:oj_name:' || oj_name, COUNT(*) "
+               "FROM submissions GROUP BY oj_name")
+    op.execute("INSERT INTO counters (name, value) SELECT 'submissions:verdict:' || verdict, COUNT(*) "
+               "FROM submissions WHERE verdict IS NOT NULL GROUP BY verdict")
+    op.execute("INSERT INTO counters (name, value) SELECT 'problems', COUNT(*) FROM problems")
+    op.execute("INSERT INTO counters (name, value) SELECT 'problems:oj_name:' || oj_name, COUNT(*) "
+               "FROM problems GROUP BY oj_name")
+
+
+def downgrade():
+    op.drop_table('counters')
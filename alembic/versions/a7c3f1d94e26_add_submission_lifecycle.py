@@ -0,0 +1,29 @@
+"""add submission lifecycle timestamps
+
+Revision ID: a7c3f1d94e26
+Revises: e2d8b4f61c39
+Create Date: 2026-10-19 14:02:11.530917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3f1d94e26'
+down_revision = 'e2d8b4f61c39'
+branch_labels = None
+depends_on = None
+
+lifecycle_columns = ('enqueued_at', 'dequeued_at', 'picked_at', 'submitted_at', 'first_polled_at', 'judged_at')
+
+
+def upgrade():
+    for name in lifecycle_columns:
+        op.add_column('submissions', sa.Column(name, sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('submissions') as batch_op:
+        for name in lifecycle_columns:
+            batch_op.drop_column(name)
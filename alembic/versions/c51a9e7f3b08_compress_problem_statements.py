@@ -0,0 +1,67 @@
+"""compress problem statements
+
+Revision ID: c51a9e7f3b08
+Revises: 4b7e0c93d2a1
+Create Date: 2026-10-19 11:48:05.630917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from vjudge.compression import compress_statement, decompress_statement
+
+
+# revision identifiers, used by Alembic.
+revision = 'c51a9e7f3b08'
+down_revision = '4b7e0c93d2a1'
+branch_labels = None
+depends_on = None
+
+statement_columns = ('description', 'input', 'output', 'sample_input', 'sample_output')
+
+batch_size = 200
+
+
+def _batches(connection, table, *columns):
+    last = None
+    while True:
+        query = sa.select([table.c.oj_name, table.c.problem_id, *columns]).order_by(
+            table.c.oj_name, table.c.problem_id).limit(batch_size)
+        if last is not None:
+            query = query.where(sa.or_(table.c.oj_name > last[0],
+                                       sa.and_(table.c.oj_name == last[0], table.c.problem_id > last[1])))
+        rows = connection.execute(query).fetchall()
+        if not rows:
+            return
+        yield rows
+        last = rows[-1][0], rows[-1][1]
+
+
+def _convert(old_type, new_type, convert):
+    for column in statement_columns:
+        op.add_column('problems', sa.Column(f'{column}_new', new_type, nullable=True))
+    problems = sa.table('problems', sa.column('oj_name', sa.String), sa.column('problem_id', sa.String),
+                        *[sa.column(x, old_type) for x in statement_columns],
+                        *[sa.column(f'{x}_new', new_type) for x in statement_columns])
+    connection = op.get_bind()
+    for rows in _batches(connection, problems, *[problems.c[x] for x in statement_columns]):
+        for oj_name, problem_id, *row in rows:
+            values = {}
+            for column, value in zip(statement_columns, row):
+                if value is not None:
+                    values[f'{column}_new'] = convert(value)
+            if values:
+                key_filter = sa.and_(problems.c.oj_name == oj_name, problems.c.problem_id == problem_id)
+                connection.execute(problems.update().where(key_filter).values(**values))
+    with op.batch_alter_table('problems') as batch_op:
+        for column in statement_columns:
+            batch_op.drop_column(column)
+            batch_op.alter_column(f'{column}_new', new_column_name=column, existing_type=new_type)
+
+
+def upgrade():
+    _convert(sa.String(), sa.LargeBinary(), compress_statement)
+
+
+def downgrade():
+    _convert(sa.LargeBinary(), sa.String(), lambda x: decompress_statement(bytes(x)))
@@ -0,0 +1,65 @@
+"""create problem search index
+
+Revision ID: e2d8b4f61c39
+Revises: c51a9e7f3b08
+Create Date: 2026-10-19 13:20:54.871436
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from vjudge.compression import CompressedText
+from vjudge.search import get_search_index, strip_tags
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2d8b4f61c39'
+down_revision = 'c51a9e7f3b08'
+branch_labels = None
+depends_on = None
+
+problems = sa.table('problems',
+                    sa.column('oj_name', sa.String),
+                    sa.column('problem_id', sa.String),
+                    sa.column('title', sa.String),
+                    sa.column('description', CompressedText),
+                    sa.column('input', CompressedText),
+                    sa.column('output', CompressedText))
+
+batch_size = 200
+
+
+def _batches(connection, *columns):
+    last = None
+    while True:
+        query = sa.select([problems.c.oj_name, problems.c.problem_id, *columns]).order_by(
+            problems.c.oj_name, problems.c.problem_id).limit(batch_size)
+        if last is not None:
+            query = query.where(sa.or_(problems.c.oj_name > last[0],
+                                       sa.and_(problems.c.oj_name == last[0], problems.c.problem_id > last[1])))
+        rows = connection.execute(query).fetchall()
+        if not rows:
+            return
+        yield rows
+        last = rows[-1][0], rows[-1][1]
+
+
+def upgrade():
+    connection = op.get_bind()
+    search_index = get_search_index(connection.dialect.name)
+    if search_index is None:
+        return
+    for statement in search_index.ddl:
+        op.execute(statement)
+    for rows in _batches(connection, problems.c.title, problems.c.description, problems.c.input, problems.c.output):
+        for oj_name, problem_id, title, *texts in rows:
+            body = strip_tags(' '.join(x or '' for x in texts))
+            search_index.update(connection, oj_name, problem_id, title=title or '', body=body)
+
+
+def downgrade():
+    search_index = get_search_index(op.get_bind().dialect.name)
+    if search_index is None:
+        return
+    for statement in search_index.drop_ddl:
+        op.execute(statement)
@@ -36,6 +36,30 @@ logger = logging.getLogger('vjudge-core')
 SQLALCHEMY_DATABASE_URI = (os.environ.get('DATABASE_URL') or
                            'sqlite:///' + os.path.dirname(__file__) + '/data.sqlite')
 
+SQLALCHEMY_REPLICA_URIS = [x for x in (os.environ.get('DATABASE_REPLICA_URLS') or '').split(',') if x]
+
+DATABASE_CONFIG = {
+    'sqlite': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'mmap_size': 268435456,
+        'pool_size': 8,
+        'max_overflow': -1
+    },
+    'postgresql': {
+        'pool_size': 10,
+        'max_overflow': 20,
+        'pool_recycle': 1800,
+        'pool_pre_ping': True,
+        'statement_timeout': 30000
+    },
+    'replica': {
+        'max_lag': 5,
+        'check_interval': 10
+    }
+}
+
 OJ_CONFIG = os.path.dirname(__file__) + '/accounts.json'
 
 DEFAULT_REDIS_URI = 'redis://localhost:6379/0'
@@ -44,12 +68,74 @@ REDIS_CONFIG = {
     'host': 'localhost',
     'port': 6379,
     'db': 0,
+    'max_connections': 64,
     'queue': {
         'submitter_queue': 'vjudge-core-task-submitter',
         'crawler_queue': 'vjudge-core-task-crawler'
+    },
+    'channel': {
+        'problem': 'vjudge-core-event-problem',
+        'contest': 'vjudge-core-event-contest',
+        'submission': 'vjudge-core-event-submission',
+        'profiler': 'vjudge-core-event-profiler',
+        'control': 'vjudge-core-event-control'
+    },
+    'cache': {
+        'recent_contests': 'vjudge-core-recent-contests',
+        'metrics': 'vjudge-core-metrics',
+        'worker_state': 'vjudge-core-worker-state'
     }
 }
 
+CONTEST_LIST_REFRESH_INTERVAL = 300
+
+CONTEST_PREWARM_CONFIG = {
+    'lead_time': 300,
+    'interval': 30
+}
+
+METRICS_PUSH_INTERVAL = 15
+
+WORKER_STATE_INTERVAL = 5
+
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+PROFILER_CONFIG = {
+    'interval': 0.01,
+    'max_seconds': 300,
+    'output_dir': os.environ.get('PROFILE_DIR') or '/tmp'
+}
+
+RETRY_CONFIG = {
+    'request': {'attempts': 3, 'base_delay': 0.5, 'max_delay': 8},
+    'submit': {'attempts': 3, 'base_delay': 5, 'max_delay': 20}
+}
+
+CIRCUIT_BREAKER_CONFIG = {
+    'threshold': 5,
+    'cooldown': 30,
+    'max_cooldown': 300
+}
+
+REMOTE_BASE_URLS = {
+    'hdu': os.environ.get('HDU_BASE_URL') or 'http://acm.hdu.edu.cn',
+    'scu': os.environ.get('SCU_BASE_URL') or 'http://acm.scu.edu.cn/soj'
+}
+
+WORKLOAD_CAPTURE_PATH = os.environ.get('WORKLOAD_CAPTURE')
+
+SCU_CAPTCHA_CONFIG = {
+    'db_path': os.environ.get('SCU_CAPTCHA_DB'),
+    'templates_path': (os.environ.get('SCU_CAPTCHA_TEMPLATES') or
+                       os.path.dirname(__file__) + '/captcha_templates.npz'),
+    'save_interval': 60
+}
+
+REMOTE_TRACE_CONFIG = {
+    'path': os.environ.get('REMOTE_TRACE_LOG'),
+    'sample_rate': float(os.environ.get('REMOTE_TRACE_SAMPLE_RATE') or 0.01)
+}
+
 USER_AGENTS = [
     "Mozilla/4.0 (compatible; MSIE 6.0; Windows NT 5.1; SV1; AcooBrowser; .NET CLR 1.1.4322; .NET CLR 2.0.50727)",
     "Mozilla/4.0 (compatible; MSIE 7.0; Windows NT 6.0; Acoo Browser; SLCC1; .NET CLR 2.0.50727; Media Center PC 5.0; .NET CLR 3.0.04506)",
@@ -1,9 +1,23 @@
 #!/usr/bin/env python3
+import json
+import os
+import shutil
+import sys
+import tempfile
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+
 from flask_script import Manager, Shell
 
+from config import REDIS_CONFIG
 from server import app
+from server.fake_oj import FakeJudge, create_app, captcha_hashes
 from vjudge import db
-from vjudge.models import Submission, Problem
+from vjudge.benchmark import Benchmark, default_source_code
+from vjudge.dump import dumped_models, export_ndjson, import_ndjson, open_ndjson
+from vjudge.models import Submission, Problem, Counter
+from vjudge.report import lifecycle_report, report_percentiles
+from vjudge.workload import replay_workload
 
 
 def make_shell_context():
@@ -13,5 +27,120 @@ def make_shell_context():
 manager = Manager(app)
 manager.add_command('shell', Shell(make_context=make_shell_context))
 
+
+@manager.option('table', choices=tuple(dumped_models), help='table to export')
+@manager.option('-o', '--output', dest='output', default='-', help='NDJSON file, .gz to compress, - for stdout')
+def export_data(table, output):
+    """Stream a table out as NDJSON"""
+    with open_ndjson(output, 'w') as fp:
+        count = export_ndjson(table, fp)
+    print(f'Exported {count} {table}', file=sys.stderr)
+
+
+@manager.option('table', choices=tuple(dumped_models), help='table to import')
+@manager.option('-i', '--input', dest='path', default='-', help='NDJSON file, .gz if compressed, - for stdin')
+def import_data(table, path):
+    """Load an NDJSON export in batches, skipping rows that already exist"""
+    with open_ndjson(path, 'r') as fp:
+        count = import_ndjson(table, fp)
+    print(f'Imported {count} {table}', file=sys.stderr)
+
+
+@manager.command
+def rebuild_counters():
+    """Recount the rows behind the list endpoints"""
+    Counter.rebuild()
+
+
+@manager.option('-b', '--by', dest='by', choices=('oj_name', 'account'), default='oj_name', help='grouping')
+@manager.option('-s', '--since', dest='since', type=float, default=24, help='hours to look back, 0 for all')
+def latency_report(by, since):
+    """Print per-stage submission latency percentiles in seconds"""
+    since = datetime.utcnow() - timedelta(hours=since) if since > 0 else None
+    headers = ['group', 'stage', 'count'] + [f'p{x}' for x in report_percentiles] + ['max']
+    print(f'{headers[0]:<32}{headers[1]:<12}' + ''.join(f'{x:>10}' for x in headers[2:]))
+    for row in lifecycle_report(since, by):
+        print(f'{row["group"]:<32}{row["stage"]:<12}{row["count"]:>10}' +
+              ''.join(f'{row[x]:>10.2f}' for x in headers[3:]))
+
+
+@manager.option('-H', '--host', dest='host', default='127.0.0.1', help='bind address')
+@manager.option('-p', '--port', dest='port', type=int, default=8900, help='bind port')
+@manager.option('-l', '--latency', dest='latency', type=float, default=0.0, help='mean request latency in seconds')
+@manager.option('-j', '--judge-latency', dest='judge_latency', type=float, default=2.0,
+                help='seconds until a run gets its final verdict')
+@manager.option('-e', '--error-rate', dest='error_rate', type=float, default=0.0,
+                help='fraction of requests answered with 503')
+@manager.option('-r', '--rate-limit', dest='rate_limit', type=float, default=5.0,
+                help='minimum seconds between submits of one account')
+@manager.option('--seed-captchas', dest='seed_captchas', action='store_true',
+                help='seed a copy of captcha.db with the fake SCU captchas')
+def fake_oj(host, port, latency, judge_latency, error_rate, rate_limit, seed_captchas):
+    """Serve fake HDU (/hdu) and SCU (/soj) sites for load testing"""
+    env = f'HDU_BASE_URL=http://{host}:{port}/hdu SCU_BASE_URL=http://{host}:{port}/soj'
+    if seed_captchas:
+        from vjudge.site.scu.client import CaptchaStore, captcha_db_path
+        fd, path = tempfile.mkstemp(prefix='captcha-', suffix='.db')
+        os.close(fd)
+        shutil.copyfile(captcha_db_path, path)
+        captcha_store = CaptchaStore(path)
+        for digest, code in captcha_hashes():
+            captcha_store.add(digest, code)
+        env += f' SCU_CAPTCHA_DB={path}'
+    judge = FakeJudge(latency, judge_latency, error_rate, rate_limit)
+    print(f'Set {env}', file=sys.stderr)
+    create_app(judge).run(host=host, port=port, threaded=True)
+
+
+@manager.option('-u', '--url', dest='url', default='http://127.0.0.1:5000', help='API base url')
+@manager.option('-j', '--oj', dest='oj_name', default='hdu', help='oj to submit to')
+@manager.option('-P', '--problems', dest='problems', default='1000', help='comma separated problem ids')
+@manager.option('-l', '--language', dest='language', default='G++', help='submission language')
+@manager.option('-f', '--source', dest='source', default=None, help='source file, an A+B program by default')
+@manager.option('-r', '--rate', dest='rate', type=float, default=5, help='submissions per second')
+@manager.option('-n', '--count', dest='count', type=int, default=100, help='number of submissions')
+@manager.option('-c', '--concurrency', dest='concurrency', type=int, default=64, help='submissions tracked at once')
+@manager.option('-t', '--timeout', dest='timeout', type=float, default=300, help='seconds to wait for a verdict')
+@manager.option('-o', '--output', dest='output', default='-', help='JSON result file, - for stdout')
+def benchmark(url, oj_name, problems, language, source, rate, count, concurrency, timeout, output):
+    """Submit at a fixed rate through the API and report throughput, latency and worker usage as JSON"""
+    source_code = default_source_code
+    if source is not None:
+        with open(source) as f:
+            source_code = f.read()
+    problem_ids = [x.strip() for x in problems.split(',') if x.strip()]
+    result = Benchmark(url, oj_name, problem_ids, language, source_code, rate, count, concurrency, timeout).run()
+    with _open(output, 'w') as fp:
+        json.dump(result, fp, indent=2)
+        fp.write('\n')
+    print(f'Judged {result["judged"]}/{count} in {result["duration"]:.1f}s, '
+          f'throughput {result["throughput"]:.2f}/s', file=sys.stderr)
+
+
+@manager.option('paths', nargs='+', help='captured workload files, one per process, .gz if compressed, - for stdin')
+@manager.option('-s', '--speed', dest='speed', type=float, default=1.0, help='replay speed, 10 for 10x')
+@manager.option('-f', '--source', dest='source', default=None, help='source file, an A+B program by default')
+@manager.option('--confirm', dest='confirm', action='store_true',
+                help='write into the configured database and Redis, never use it on production')
+def replay(paths, speed, source, confirm):
+    """Push a workload captured with WORKLOAD_CAPTURE into the task queues of this instance"""
+    if not confirm:
+        print(f'Replay adds submissions to {db.engine.url!r} and tasks to Redis '
+              f'{REDIS_CONFIG["host"]}:{REDIS_CONFIG["port"]}/{REDIS_CONFIG["db"]}, '
+              f'pass --confirm if this is a staging instance', file=sys.stderr)
+        sys.exit(1)
+    if speed <= 0:
+        print('Speed should be positive', file=sys.stderr)
+        sys.exit(1)
+    source_code = default_source_code
+    if source is not None:
+        with open(source) as f:
+            source_code = f.read()
+    with ExitStack() as stack:
+        fps = [stack.enter_context(open_ndjson(x, 'r')) for x in paths]
+        counts = replay_workload(fps, source_code, speed)
+    print(f'Replayed {counts["submitter"]} submissions and {counts["crawler"]} crawl tasks', file=sys.stderr)
+
+
 if __name__ == '__main__':
     manager.run()
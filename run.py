@@ -10,7 +10,7 @@ parser.add_argument('-b', required=False, dest='address', default='localhost:500
 args = parser.parse_args()
 
 p = subprocess.Popen(
-    shlex.split(f"gunicorn -w 2 -k gevent --logger-class config.GLogger --log-level {LOG_LEVEL} "
+    shlex.split(f"gunicorn -c python:server.gunicorn_config --log-level {LOG_LEVEL} "
                 f"-b '{args.address}' manage:app"))
 
 try:
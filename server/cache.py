@@ -0,0 +1,54 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, jsonify, request
+
+
+class CachedResponse(object):
+    def __init__(self, body, meta):
+        self.body = body
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.meta = meta
+        self.created_at = time.monotonic()
+
+    def response(self):
+        response = current_app.response_class(self.body, mimetype=current_app.config['JSONIFY_MIMETYPE'])
+        response.set_etag(self.etag)
+        return response.make_conditional(request)
+
+
+class ResponseCache(object):
+    def __init__(self, capacity=4096, ttl=300):
+        self._capacity = capacity
+        self._ttl = ttl
+        self._resources = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, resource, variant):
+        with self._lock:
+            variants = self._resources.get(resource)
+            if variants is None:
+                return None
+            entry = variants.get(variant)
+            if entry is None:
+                return None
+            if time.monotonic() - entry.created_at > self._ttl:
+                variants.pop(variant)
+                return None
+            self._resources.move_to_end(resource)
+            return entry
+
+    def put(self, resource, variant, data, **meta):
+        entry = CachedResponse(jsonify(data).get_data(), meta)
+        with self._lock:
+            self._resources.setdefault(resource, {})[variant] = entry
+            self._resources.move_to_end(resource)
+            while len(self._resources) > self._capacity:
+                self._resources.popitem(last=False)
+        return entry
+
+    def invalidate(self, resource):
+        with self._lock:
+            self._resources.pop(resource, None)
@@ -0,0 +1,142 @@
+import sys
+import threading
+import time
+from bisect import bisect_left, insort
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from config import logger
+from vjudge.database import Pagination
+from vjudge.models import db, Problem
+
+
+class _Shard(object):
+    def __init__(self):
+        self.problem_ids = []
+        self.titles = []
+
+    def range(self, problem_id):
+        if not problem_id:
+            return 0, len(self.problem_ids)
+        if problem_id.endswith('%'):
+            prefix = problem_id[:-1]
+            start = bisect_left(self.problem_ids, prefix)
+            end = bisect_left(self.problem_ids, prefix + '\U0010ffff', start)
+            return start, end
+        start = bisect_left(self.problem_ids, problem_id)
+        if start < len(self.problem_ids) and self.problem_ids[start] == problem_id:
+            return start, start + 1
+        return start, start
+
+    def put(self, problem_id, title):
+        index = bisect_left(self.problem_ids, problem_id)
+        if index < len(self.problem_ids) and self.problem_ids[index] == problem_id:
+            self.titles[index] = title
+        else:
+            self.problem_ids.insert(index, problem_id)
+            self.titles.insert(index, title)
+
+    def remove(self, problem_id):
+        index = bisect_left(self.problem_ids, problem_id)
+        if index < len(self.problem_ids) and self.problem_ids[index] == problem_id:
+            del self.problem_ids[index]
+            del self.titles[index]
+
+
+class ProblemCatalog(object):
+    def __init__(self, refresh_interval=600):
+        self._refresh_interval = refresh_interval
+        self._shards = {}
+        self._oj_names = []
+        self._loaded_at = None
+        self._reloading = False
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def supports(problem_id):
+        pattern = problem_id[:-1] if problem_id.endswith('%') else problem_id
+        return '%' not in pattern and '_' not in pattern
+
+    def load(self):
+        shards = {}
+        rows = db.session.query(Problem.oj_name, Problem.problem_id, Problem.title).on_replica().order_by(
+            Problem.oj_name, Problem.problem_id)
+        for oj_name, problem_id, title in rows:
+            oj_name = sys.intern(oj_name)
+            if oj_name not in shards:
+                shards[oj_name] = _Shard()
+            shard = shards[oj_name]
+            shard.problem_ids.append(problem_id)
+            shard.titles.append(title)
+        for shard in shards.values():
+            if shard.problem_ids != sorted(shard.problem_ids):
+                pairs = sorted(zip(shard.problem_ids, shard.titles))
+                shard.problem_ids = [x[0] for x in pairs]
+                shard.titles = [x[1] for x in pairs]
+        with self._lock:
+            self._shards = shards
+            self._oj_names = sorted(shards)
+            self._loaded_at = time.monotonic()
+
+    def _reload_in_background(self):
+        with self._lock:
+            if self._reloading:
+                return
+            self._reloading = True
+        threading.Thread(target=self._reload, name='catalog-reload', daemon=True).start()
+
+    def _reload(self):
+        try:
+            self.load()
+        except SQLAlchemyError as e:
+            logger.error(f'Reloaded problem catalog failed, reason: {e}')
+        finally:
+            db.session.remove()
+            self._reloading = False
+
+    def apply(self, event):
+        if 'title' not in event:
+            return
+        oj_name = sys.intern(event['oj_name'])
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            shard = self._shards.get(oj_name)
+            if event.get('deleted'):
+                if shard is not None:
+                    shard.remove(event['problem_id'])
+                return
+            if shard is None:
+                shard = self._shards[oj_name] = _Shard()
+                insort(self._oj_names, oj_name)
+            shard.put(event['problem_id'], event['title'])
+
+    def paginate(self, oj_names, problem_id='', page=1, per_page=20):
+        if self._loaded_at is None:
+            self.load()
+        elif time.monotonic() - self._loaded_at > self._refresh_interval:
+            self._reload_in_background()
+        if page < 1:
+            page = 1
+        if per_page < 0:
+            per_page = 20
+        items = []
+        total = 0
+        offset = (page - 1) * per_page
+        with self._lock:
+            for oj_name in self._oj_names:
+                if oj_name not in oj_names:
+                    continue
+                shard = self._shards[oj_name]
+                start, end = shard.range(problem_id)
+                count = end - start
+                if offset < total + count and len(items) < per_page:
+                    first = start + max(offset - total, 0)
+                    last = min(end, first + per_page - len(items))
+                    for index in range(first, last):
+                        items.append({'oj_name': oj_name, 'problem_id': shard.problem_ids[index],
+                                      'title': shard.titles[index]})
+                total += count
+        if not items and page != 1:
+            page = 1
+        return Pagination(None, page, per_page, total, items)
@@ -0,0 +1,321 @@
+import base64
+import hashlib
+import random
+import threading
+import time
+from datetime import datetime
+from html import escape
+
+from flask import Flask, Blueprint, request, make_response, abort
+
+VERDICTS = ('Accepted', 'Wrong Answer', 'Time Limit Exceeded', 'Memory Limit Exceeded', 'Runtime Error',
+            'Compilation Error')
+
+PROBLEM_IDS = tuple(str(x) for x in range(1000, 1200))
+
+CONTESTS = {
+    '1': {'title': 'Fake Contest 1', 'problems': ('1001', '1002', '1003', '1004'), 'public': True},
+    '2': {'title': 'Fake Contest 2', 'problems': ('1001', '1002'), 'public': False},
+}
+
+CAPTCHA_POOL_SIZE = 100
+
+
+def captcha_image(code, index):
+    header = f'P5\n# fake-soj {code} {index}\n60 20\n255\n'.encode()
+    return header + b'\xff' * 1200
+
+
+def captcha_pool(size=CAPTCHA_POOL_SIZE):
+    rand = random.Random(0)
+    return [(f'{rand.randint(0, 9999):04d}', i) for i in range(size)]
+
+
+def captcha_hashes(size=CAPTCHA_POOL_SIZE):
+    return [(hashlib.md5(captcha_image(code, i)).hexdigest(), code) for code, i in captcha_pool(size)]
+
+
+class FakeJudge(object):
+    def __init__(self, latency=0.0, judge_latency=2.0, error_rate=0.0, rate_limit=5.0, accept_rate=0.6):
+        self.latency = latency
+        self.judge_latency = judge_latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.accept_rate = accept_rate
+        self._runs = []
+        self._last_submit = {}
+        self._captchas = {}
+        self._captcha_pool = captcha_pool()
+        self._lock = threading.Lock()
+
+    def submit(self, site, user, problem_id, language, contest_id=''):
+        now = time.time()
+        with self._lock:
+            key = site, user
+            if now - self._last_submit.get(key, 0) < self.rate_limit:
+                return None
+            self._last_submit[key] = now
+            if random.random() < self.accept_rate:
+                verdict = 'Accepted'
+            else:
+                verdict = random.choice(VERDICTS[1:])
+            run = {'run_id': str(len(self._runs) + 1), 'site': site, 'contest_id': contest_id, 'user': user,
+                   'problem_id': problem_id, 'language': language, 'time': now, 'verdict': verdict,
+                   'exe_time': random.randint(0, 1000), 'exe_mem': random.randint(1000, 65536)}
+            self._runs.append(run)
+            return run
+
+    def runs(self, site, contest_id='', user='', problem_id='', first=None, limit=15):
+        result = []
+        with self._lock:
+            runs = list(reversed(self._runs))
+        for run in runs:
+            if run['site'] != site or run['contest_id'] != contest_id:
+                continue
+            if user and run['user'] != user or problem_id and run['problem_id'] != problem_id:
+                continue
+            if first and int(run['run_id']) > int(first):
+                continue
+            result.append(run)
+            if len(result) >= limit:
+                break
+        return result
+
+    def status_of(self, run):
+        elapsed = time.time() - run['time']
+        if elapsed < self.judge_latency / 2:
+            return 'Queuing', 0, 0
+        if elapsed < self.judge_latency:
+            return 'Running', 0, 0
+        return run['verdict'], run['exe_time'], run['exe_mem']
+
+    def new_captcha(self, session):
+        code, index = random.choice(self._captcha_pool)
+        with self._lock:
+            self._captchas[session] = code
+        return captcha_image(code, index)
+
+    def check_captcha(self, session, code):
+        with self._lock:
+            return self._captchas.pop(session, None) == code
+
+
+def _page(title, body):
+    return f'<html><head><title>{escape(title)}</title></head><body>{body}</body></html>'
+
+
+def _current_user(cookie):
+    return request.cookies.get(cookie, '')
+
+
+def _login_response(body, cookie, username):
+    resp = make_response(body)
+    resp.set_cookie(cookie, username)
+    return resp
+
+
+def _hdu_blueprint(judge):
+    bp = Blueprint('hdu', __name__)
+    cookie = 'hdu_user'
+    login_page = _page('HDU', '<form>Sign In Your Account</form>')
+
+    def problem_page(problem_id):
+        if problem_id not in PROBLEM_IDS:
+            return _page('System Message', '<h1>System Message</h1>')
+        sections = ''.join(f'<div class="panel_title" align="left">{x}</div>'
+                           f'<div class="panel_content">{x} of problem {problem_id}</div>'
+                           for x in ('Problem Description', 'Input', 'Output', 'Sample Input', 'Sample Output'))
+        return _page(problem_id, f'<h1>Fake Problem {problem_id}</h1>'
+                                 f'Time Limit: 2000/1000 MS (Java/Others) Memory Limit: 65536/32768 K '
+                                 f'(Java/Others){sections}')
+
+    def status_page(contest_id):
+        rows = []
+        for run in judge.runs('hdu', contest_id, request.args.get('user', ''), request.args.get('pid', ''),
+                              request.args.get('first') or None):
+            verdict, exe_time, exe_mem = judge.status_of(run)
+            submit_time = datetime.fromtimestamp(run['time']).strftime('%Y-%m-%d %H:%M:%S')
+            rows.append(f'<tr align="center"><td>{run["run_id"]}</td><td>{submit_time}</td><td>{verdict}</td>'
+                        f'<td>{run["problem_id"]}</td><td>{exe_time}MS</td><td>{exe_mem}K</td><td>100B</td>'
+                        f'<td>{run["language"]}</td><td>{run["user"]}</td></tr>')
+        return _page('Realtime Status', '<table><tr><td>Run ID</td><td>Submit Time</td><td>Judge Status</td>'
+                                        '<td>Pro.ID</td><td>Exe.Time</td><td>Exe.Memory</td><td>Code Len.</td>'
+                                        '<td>Language</td><td>Author</td></tr>' + ''.join(rows) + '</table>')
+
+    def submit(contest_id):
+        user = _current_user(cookie)
+        if not user:
+            return login_page
+        problem_id = request.form.get('problemid', '')
+        source_code = request.form.get('usercode', '')
+        if contest_id:
+            source_code = base64.b64decode(source_code or '').decode('utf-8', 'replace')
+        if len(source_code) < 50:
+            return _page('HDU', 'Code length is improper! Make sure your code length is longer than 50.')
+        if judge.submit('hdu', user, problem_id, request.form.get('language', ''), contest_id) is None:
+            return _page('HDU', "Please don't re-submit in 5 seconds, thank you.")
+        return status_page(contest_id)
+
+    @bp.route('/userloginex.php', methods=['POST'])
+    def login():
+        username = request.form.get('username', '')
+        if not username or request.form.get('userpass') == 'wrong':
+            return login_page
+        return _login_response(_page('HDU', f'Welcome {escape(username)}'), cookie, username)
+
+    @bp.route('/control_panel.php')
+    def control_panel():
+        if not _current_user(cookie):
+            return login_page
+        return _page('HDU', 'Control Panel')
+
+    @bp.route('/showproblem.php')
+    def show_problem():
+        return problem_page(request.args.get('pid', ''))
+
+    @bp.route('/listproblem.php')
+    def list_problem():
+        vol = request.args.get('vol')
+        links = ''.join(f'<a href="listproblem.php?vol={x}">{x}</a>' for x in (1, 2))
+        if vol not in ('1', '2'):
+            return _page('HDU', links)
+        ids = PROBLEM_IDS[:100] if vol == '1' else PROBLEM_IDS[100:]
+        script = ''.join(f'p(0,{x},-1,"Fake Problem {x}",1,2);' for x in ids)
+        return _page('HDU', f'{links}<script>{script}</script>')
+
+    @bp.route('/submit.php', methods=['POST'])
+    def practice_submit():
+        return submit('')
+
+    @bp.route('/status.php')
+    def practice_status():
+        return status_page('')
+
+    @bp.route('/contests/contest_list.php')
+    def contest_list():
+        start = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        rows = ''.join(f'<tr align="center"><td>{cid}</td><td>{x["title"]}</td><td>{start}</td>'
+                       f'<td>{"Public" if x["public"] else "Private"}</td><td>Running</td><td>Fake</td></tr>'
+                       for cid, x in CONTESTS.items())
+        return _page('Contests', f'<table class="table_text">{rows}</table>')
+
+    @bp.route('/contests/contest_show.php')
+    def contest_show():
+        contest = CONTESTS.get(request.args.get('cid', ''))
+        if contest is None:
+            return _page('System Message', '<h1>System Message</h1>')
+        now = time.time()
+        start = datetime.fromtimestamp(now - 3600).strftime('%Y-%m-%d %H:%M:%S')
+        end = datetime.fromtimestamp(now + 86400).strftime('%Y-%m-%d %H:%M:%S')
+        rows = ''.join(f'<tr align="center"><td></td><td>{x}</td><td>Fake Problem {x}</td><td>0%</td></tr>'
+                       for x in contest['problems'])
+        return _page(contest['title'], f'<h1>{contest["title"]}</h1>'
+                                       f'<div>Start Time : {start} End Time : {end} '
+                                       f'Contest Type : {"Public" if contest["public"] else "Private"} '
+                                       f'Contest Status : Running Current Server Time : {start}</div>'
+                                       f'<table><tr><td>Solved</td><td>Title</td><td>Ratio</td></tr>{rows}</table>')
+
+    @bp.route('/contests/contest_showproblem.php')
+    def contest_show_problem():
+        return problem_page(request.args.get('pid', ''))
+
+    @bp.route('/contests/contest_submit.php', methods=['POST'])
+    def contest_submit():
+        return submit(request.args.get('cid', ''))
+
+    @bp.route('/contests/contest_status.php')
+    def contest_status():
+        return status_page(request.args.get('cid', ''))
+
+    return bp
+
+
+def _soj_blueprint(judge):
+    bp = Blueprint('soj', __name__)
+    cookie = 'soj_user'
+
+    def solutions_page(runs):
+        rows = []
+        for run in runs:
+            verdict, exe_time, exe_mem = judge.status_of(run)
+            rows.append(f'<tr><td>{run["run_id"]}</td><td>{run["user"]}</td><td>{run["problem_id"]}</td>'
+                        f'<td>{run["language"]}</td><td>100</td><td>{verdict}</td><td>{exe_time}</td>'
+                        f'<td>{exe_mem}</td></tr>')
+        return _page('Solutions', '<table><tr><td>Search</td></tr></table>'
+                                  '<table><tr><td>ID</td><td>User</td><td>Problem</td><td>Language</td>'
+                                  '<td>Length</td><td>Result</td><td>Time</td><td>Memory</td></tr>' +
+                     ''.join(rows) + '</table>')
+
+    @bp.route('/login.action', methods=['POST'])
+    def login():
+        username = request.form.get('id', '')
+        if not username:
+            return _page('SOJ', 'USER_NOT_EXIST')
+        if request.form.get('password') == 'wrong':
+            return _page('SOJ', 'PASSWORD_ERROR')
+        return _login_response(_page('SOJ', f'Welcome {escape(username)}'), cookie, username)
+
+    @bp.route('/update_user_form.action')
+    def update_user_form():
+        if not _current_user(cookie):
+            return _page('SOJ', 'Please login first')
+        return _page('SOJ', 'Update user')
+
+    @bp.route('/validation_code')
+    def validation_code():
+        resp = make_response(judge.new_captcha(_current_user(cookie)))
+        resp.headers['Content-Type'] = 'image/x-portable-graymap'
+        return resp
+
+    @bp.route('/problem.action')
+    def problem():
+        problem_id = request.args.get('id', '')
+        if problem_id not in PROBLEM_IDS:
+            return _page('SOJ', 'No such problem')
+        return _page(f'{problem_id}: Fake Problem {problem_id}', f'Problem {problem_id}')
+
+    @bp.route('/problems.action')
+    def problems():
+        volume = request.args.get('volume')
+        if volume not in ('1', '2'):
+            links = ''.join(f'<a href="problems.action?volume={x}">[{x}]</a>' for x in (1, 2))
+            return _page('SOJ', f'<table><tr><td>Volumes</td></tr><tr><td>{links}</td></tr></table>')
+        ids = PROBLEM_IDS[:100] if volume == '1' else PROBLEM_IDS[100:]
+        rows = ''.join(f'<tr><td></td><td>{x}</td><td>Fake Problem {x}</td></tr>' for x in ids)
+        return _page('SOJ', f'<table><tr></tr><tr></tr><tr></tr>{rows}</table>')
+
+    @bp.route('/submit.action', methods=['POST'])
+    def submit():
+        user = _current_user(cookie)
+        if not user:
+            return _page('SOJ', 'ERROR: Please login first')
+        if not judge.check_captcha(user, request.form.get('validation')):
+            return _page('SOJ', 'ERROR: validation code is wrong')
+        if judge.submit('scu', user, request.form.get('problemId', ''), request.form.get('language', '')) is None:
+            return _page('SOJ', 'ERROR: submit too frequently')
+        return solutions_page(judge.runs('scu', user=user))
+
+    @bp.route('/solutions.action')
+    def solutions():
+        return solutions_page(judge.runs('scu', user=request.args.get('userId', ''),
+                                         problem_id=request.args.get('problemId', ''),
+                                         first=request.args.get('from') or None))
+
+    return bp
+
+
+def create_app(judge=None):
+    judge = judge or FakeJudge()
+    app = Flask(__name__)
+    app.config['fake_judge'] = judge
+
+    @app.before_request
+    def inject_faults():
+        if judge.latency:
+            time.sleep(random.uniform(0, 2 * judge.latency))
+        if random.random() < judge.error_rate:
+            abort(503)
+
+    app.register_blueprint(_hdu_blueprint(judge), url_prefix='/hdu')
+    app.register_blueprint(_soj_blueprint(judge), url_prefix='/soj')
+    return app
@@ -0,0 +1,31 @@
+import os
+
+from sqlalchemy.engine.url import make_url
+
+from config import SQLALCHEMY_DATABASE_URI, SQLALCHEMY_REPLICA_URIS
+
+# The gevent worker monkey-patches the process before the app is imported, so
+# redis-py sockets, the scoped session registry, the event listener thread and
+# the SSE/long-poll queues all become cooperative.
+worker_class = 'gevent'
+workers = int(os.environ.get('WEB_WORKERS') or 2)
+worker_connections = int(os.environ.get('WEB_WORKER_CONNECTIONS') or 4096)
+keepalive = 75
+timeout = 30
+graceful_timeout = 30
+logger_class = 'config.GLogger'
+
+
+def post_fork(server, worker):
+    # psycopg2 is a C extension and would block the hub on every query
+    # unless it is told to wait through gevent.
+    uris = [SQLALCHEMY_DATABASE_URI] + SQLALCHEMY_REPLICA_URIS
+    if all(make_url(x).get_backend_name() != 'postgresql' for x in uris):
+        return
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        server.log.warning('psycogreen is not installed, every PostgreSQL query will block the gevent worker')
+        return
+    patch_psycopg()
+    server.log.info(f'Patched psycopg2 for gevent in worker {worker.pid}')
@@ -1,19 +1,138 @@
+import hmac
 import json
+import re
+import time
 from datetime import datetime, timedelta
+from functools import partial, wraps
 
 import redis
-from flask import Flask, jsonify, request, abort, url_for
+from flask import Flask, Response, g, jsonify, request, abort, url_for, stream_with_context
 from sqlalchemy import and_, or_
 
-from config import REDIS_CONFIG
-from vjudge.models import db, Submission, Problem, Contest
+from config import ADMIN_TOKEN, PROFILER_CONFIG, REDIS_CONFIG, WORKER_STATE_INTERVAL, logger
+from vjudge import metrics
+from vjudge.events import EventListener, publish
+from vjudge.models import db, Submission, Problem, Contest, Counter, counter_name
+from vjudge.search import SearchUnsupported
 from vjudge.site import contest_clients, supported_sites, supported_contest_sites
+from vjudge.site.base import ContestInfo
+from vjudge.workload import WorkloadRecorder
+from .cache import ResponseCache
+from .catalog import ProblemCatalog
+from .watch import SubmissionWatcher
 
 app = Flask(__name__)
 
-redis_con = redis.StrictRedis(host=REDIS_CONFIG['host'], port=REDIS_CONFIG['port'], db=REDIS_CONFIG['db'])
+redis_con = redis.StrictRedis(connection_pool=redis.BlockingConnectionPool(
+    host=REDIS_CONFIG['host'], port=REDIS_CONFIG['port'], db=REDIS_CONFIG['db'],
+    max_connections=REDIS_CONFIG['max_connections'], timeout=5))
 submitter_queue = REDIS_CONFIG['queue']['submitter_queue']
 crawler_queue = REDIS_CONFIG['queue']['crawler_queue']
+recent_contests_key = REDIS_CONFIG['cache']['recent_contests']
+worker_state_key = REDIS_CONFIG['cache']['worker_state']
+
+problem_catalog = ProblemCatalog()
+response_cache = ResponseCache()
+recent_contests = {}
+submission_watcher = SubmissionWatcher()
+event_listener = EventListener()
+event_listener.subscribe('problem', problem_catalog.apply)
+event_listener.subscribe('submission', submission_watcher.notify)
+metrics_pusher = metrics.MetricsPusher('api')
+workload_recorder = WorkloadRecorder()
+request_latency = metrics.registry.histogram('vjudge_http_request_duration_seconds', 'HTTP request latency by route.',
+                                             ('method', 'route', 'status'))
+queue_metrics = metrics.Registry()
+queue_metrics.gauge('vjudge_redis_queue_length', 'Tasks waiting in the Redis task lists.', ('queue',),
+                    function=lambda: {('submitter',): redis_con.llen(submitter_queue),
+                                      ('crawler',): redis_con.llen(crawler_queue)})
+
+
+@event_listener.subscribe_to('problem')
+def invalidate_problem(event):
+    response_cache.invalidate(('problem', event['oj_name'], event['problem_id']))
+    res = re.match(r'^(.*?)_ct_([0-9]+)$', event['oj_name'])
+    if res:
+        response_cache.invalidate(('contest',) + res.groups())
+
+
+@event_listener.subscribe_to('contest')
+def invalidate_contest(event):
+    response_cache.invalidate(('contest', event['site'], event['contest_id']))
+
+
+@app.before_first_request
+def start_event_listener():
+    event_listener.start()
+    metrics_pusher.start()
+    if workload_recorder.enabled:
+        workload_recorder.start()
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def observe_request_latency(response):
+    start = g.get('request_start')
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        request_latency.observe(time.perf_counter() - start, request.method, route, str(response.status_code))
+    return response
+
+
+class FieldError(Exception):
+    pass
+
+
+def push_crawl_task(task):
+    redis_con.lpush(crawler_queue, json.dumps(task))
+    workload_recorder.record('crawler', task)
+
+
+def push_submission(submission):
+    redis_con.lpush(submitter_queue, submission.id)
+    workload_recorder.record('submitter', {'id': submission.id, 'oj_name': submission.oj_name,
+                                           'problem_id': submission.problem_id, 'language': submission.language})
+
+
+def admin_required(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            return jsonify({'error': 'admin endpoints are disabled'}), 403
+        token = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(token.encode(), f'Bearer {ADMIN_TOKEN}'.encode()):
+            return jsonify({'error': 'invalid admin token'}), 401
+        return f(*args, **kwargs)
+
+    return decorated
+
+
+def get_fields(model, default=None):
+    fields = request.args.get('fields')
+    fields = [x.strip() for x in (fields or '').split(',') if x.strip()]
+    if not fields:
+        return default or model.json_fields
+    for field in fields:
+        if field not in model.json_fields:
+            raise FieldError(f'unknown field {field}')
+    return fields
+
+
+def to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        abort(404)
+
+
+@app.errorhandler(FieldError)
+@app.errorhandler(SearchUnsupported)
+def field_error(e):
+    return jsonify({'error': str(e)}), 422
 
 
 @app.route('/problems/')
@@ -22,28 +141,46 @@ def get_problem_list():
     per_page = request.args.get('per_page', 20, type=int)
     oj_name = request.args.get('oj_name', '')
     problem_id = request.args.get('problem_id', '')
+    q = request.args.get('q', '')
+    fields = get_fields(Problem, Problem.summary_fields)
     if oj_name:
         oj_name_filter = Problem.oj_name == oj_name
+        oj_names = [oj_name]
     else:
         filter_args = []
         for site in supported_sites:
             filter_args.append(Problem.oj_name == site)
         oj_name_filter = or_(*filter_args)
-    pagination = Problem.query.filter(
-        and_(oj_name_filter, Problem.problem_id.like(problem_id or '%'))).paginate(
-        page=page, per_page=per_page, error_out=False)
-    problems = pagination.items
+        oj_names = supported_sites
+    if not q and set(fields) <= set(Problem.summary_fields) and ProblemCatalog.supports(problem_id):
+        pagination = problem_catalog.paginate(set(oj_names), problem_id, page=page, per_page=per_page)
+        problems = [{x: p[x] for x in fields} for p in pagination.items]
+    else:
+        query = Problem.query.on_replica().only(*fields).filter(
+            and_(oj_name_filter, Problem.problem_id.like(problem_id or '%')))
+        total = None
+        if q:
+            matches = Problem.search(q)
+            if matches is None:
+                return jsonify({'error': 'invalid search query'}), 422
+            query = query.join(matches, and_(Problem.oj_name == matches.c.oj_name,
+                                             Problem.problem_id == matches.c.problem_id)).order_by(matches.c.rank)
+        elif not problem_id:
+            counter_names = [counter_name('problems', 'oj_name', x) for x in oj_names]
+            total = partial(Counter.get, *counter_names)
+        pagination = query.paginate(page=page, per_page=per_page, error_out=False, total=total)
+        problems = [p.to_json(fields) for p in pagination.items]
     page = pagination.page
     prev = None
     if pagination.has_prev:
-        prev = url_for('get_problem_list', oj_name=oj_name, problem_id=problem_id,
-                       page=page - 1, per_page=per_page, _external=True)
+        prev = url_for('get_problem_list', oj_name=oj_name, problem_id=problem_id, q=q,
+                       fields=request.args.get('fields'), page=page - 1, per_page=per_page, _external=True)
     next = None
     if pagination.has_next:
-        next = url_for('get_problem_list', oj_name=oj_name, problem_id=problem_id,
-                       page=page + 1, per_page=per_page, _external=True)
+        next = url_for('get_problem_list', oj_name=oj_name, problem_id=problem_id, q=q,
+                       fields=request.args.get('fields'), page=page + 1, per_page=per_page, _external=True)
     return jsonify({
-        'problems': [p.summary() for p in problems],
+        'problems': problems,
         'prev': prev,
         'next': next,
         'count': pagination.total
@@ -57,37 +194,45 @@ def refresh_all_problems():
         return jsonify({'error': 'missing field oj_name'}), 422
     if oj_name not in supported_sites:
         return jsonify({'error': f'oj {oj_name} is not supported'}), 422
-    redis_con.lpush(crawler_queue, json.dumps({
+    push_crawl_task({
         'oj_name': oj_name,
         'type': 'problem',
         'all': True
-    }))
+    })
     return jsonify({'status': 'success'})
 
 
 @app.route('/problems/<oj_name>/<problem_id>')
 def get_problem(oj_name, problem_id):
-    problem = Problem.query.filter_by(oj_name=oj_name, problem_id=problem_id).first()
-    if problem is None:
-        abort(404)
-    if datetime.utcnow() - timedelta(days=1) > problem.last_update:
-        redis_con.lpush(crawler_queue, json.dumps({
+    fields = tuple(get_fields(Problem))
+    resource = ('problem', oj_name, problem_id)
+    cached = response_cache.get(resource, fields)
+    if cached is None:
+        # Read from the primary: a lagging replica would put the row an invalidation
+        # just dropped back into the cache for the whole TTL.
+        problem = Problem.query.on_primary().only('last_update', *fields).filter_by(
+            oj_name=oj_name, problem_id=problem_id).first()
+        if problem is None:
+            abort(404)
+        cached = response_cache.put(resource, fields, problem.to_json(fields), last_update=problem.last_update)
+    if datetime.utcnow() - timedelta(days=1) > cached.meta['last_update']:
+        push_crawl_task({
             'oj_name': oj_name,
             'type': 'problem',
             'all': False,
             'problem_id': problem_id
-        }))
-    return jsonify(problem.to_json())
+        })
+    return cached.response()
 
 
 @app.route('/problems/<oj_name>/<problem_id>', methods=['POST'])
 def refresh_problem(oj_name, problem_id):
-    redis_con.lpush(crawler_queue, json.dumps({
+    push_crawl_task({
         'oj_name': oj_name,
         'type': 'problem',
         'all': False,
         'problem_id': problem_id
-    }))
+    })
     return jsonify({
         'status': 'success',
         'url': url_for('get_problem', oj_name=oj_name, problem_id=problem_id, _external=True)
@@ -98,18 +243,35 @@ def refresh_problem(oj_name, problem_id):
 def get_submission_list():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
-    pagination = Submission.query.order_by(Submission.id.desc()).paginate(
-        page=page, per_page=per_page, error_out=False)
+    oj_name = request.args.get('oj_name', '')
+    verdict = request.args.get('verdict', '')
+    fields = get_fields(Submission)
+    query = Submission.query.on_replica().only(*fields)
+    if oj_name and verdict:
+        query = query.filter_by(oj_name=oj_name, verdict=verdict)
+        total = None
+    elif oj_name:
+        query = query.filter_by(oj_name=oj_name)
+        total = partial(Counter.get, counter_name('submissions', 'oj_name', oj_name))
+    elif verdict:
+        query = query.filter_by(verdict=verdict)
+        total = partial(Counter.get, counter_name('submissions', 'verdict', verdict))
+    else:
+        total = partial(Counter.get, counter_name('submissions'))
+    pagination = query.order_by(Submission.id.desc()).paginate(
+        page=page, per_page=per_page, error_out=False, total=total)
     submissions = pagination.items
     page = pagination.page
     prev = None
     if pagination.has_prev:
-        prev = url_for('get_submission_list', page=page - 1, per_page=per_page, _external=True)
+        prev = url_for('get_submission_list', oj_name=oj_name, verdict=verdict,
+                       fields=request.args.get('fields'), page=page - 1, per_page=per_page, _external=True)
     next = None
     if pagination.has_next:
-        next = url_for('get_submission_list', page=page + 1, per_page=per_page, _external=True)
+        next = url_for('get_submission_list', oj_name=oj_name, verdict=verdict,
+                       fields=request.args.get('fields'), page=page + 1, per_page=per_page, _external=True)
     return jsonify({
-        'submissions': [s.to_json() for s in submissions],
+        'submissions': [s.to_json(fields) for s in submissions],
         'prev': prev,
         'next': next,
         'count': pagination.total
@@ -127,20 +289,81 @@ def submit_problem():
     if not Problem.query.filter_by(oj_name=oj_name, problem_id=problem_id).first():
         return jsonify({'error': 'no such problem'}), 422
     submission = Submission(oj_name=oj_name, problem_id=problem_id,
-                            language=language, source_code=source_code)
+                            language=language, source_code=source_code, enqueued_at=datetime.utcnow())
     db.session.add(submission)
     db.session.commit()
-    redis_con.lpush(submitter_queue, submission.id)
+    push_submission(submission)
     url = url_for('get_submission', id=submission.id, _external=True)
     return jsonify({'status': 'success', 'id': submission.id, 'url': url})
 
 
 @app.route('/submissions/<id>')
 def get_submission(id):
-    submission = Submission.query.get(id)
+    fields = get_fields(Submission)
+    submission = Submission.query.on_replica().only(*fields).get(id)
     if submission is None:
+        # The replica may not have caught up with a submission that was just created.
+        submission = Submission.query.on_primary().only(*fields).get(id)
+    if submission is None:
+        abort(404)
+    return jsonify(submission.to_json(fields))
+
+
+@app.route('/submissions/<id>/wait')
+def wait_submission(id):
+    verdict = request.args.get('verdict')
+    timeout = min(request.args.get('timeout', 30, type=float), 60)
+    waiter = submission_watcher.watch(ids=[to_int(id)])
+    try:
+        submission = Submission.query.on_primary().get(id)
+        if submission is None:
+            abort(404)
+        submission_json = submission.to_json()
+        db.session.remove()
+        if submission_json['verdict'] == verdict:
+            submission_json = submission_watcher.wait(waiter, timeout) or submission_json
+            submission_json.pop('user_id', None)
+    finally:
+        submission_watcher.unwatch(waiter)
+    return jsonify(submission_json)
+
+
+@app.route('/submissions/events')
+def stream_submissions():
+    ids = [to_int(x) for x in request.args.getlist('id')]
+    user_id = request.args.get('user_id')
+    if not ids and not user_id:
+        return jsonify({'error': 'missing field id or user_id'}), 422
+    waiter = submission_watcher.watch(ids=ids, user_id=user_id)
+    pending = set()
+    initial = []
+    for submission in Submission.query.on_primary().filter(Submission.id.in_(ids)):
+        initial.append(submission.to_json())
+        if submission.verdict in ('Queuing', 'Being Judged'):
+            pending.add(submission.id)
+    db.session.remove()
+    if ids and not initial and not user_id:
+        submission_watcher.unwatch(waiter)
         abort(404)
-    return jsonify(submission.to_json())
+
+    def generate():
+        try:
+            for submission_json in initial:
+                yield f'event: submission\ndata: {json.dumps(submission_json)}\n\n'
+            while user_id or pending:
+                submission_json = submission_watcher.wait(waiter, 15)
+                if submission_json is None:
+                    yield ': keep-alive\n\n'
+                    continue
+                submission_json.pop('user_id', None)
+                yield f'event: submission\ndata: {json.dumps(submission_json)}\n\n'
+                if submission_json['verdict'] not in ('Queuing', 'Being Judged'):
+                    pending.discard(submission_json['id'])
+        finally:
+            submission_watcher.unwatch(waiter)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
 @app.route('/submissions/<id>', methods=['POST'])
@@ -150,8 +373,11 @@ def update_submission(id):
         return jsonify({'error': 'no such submission'}), 422
     if submission.verdict not in ('Queuing', 'Being Judged'):
         submission.verdict = 'Being Judged'
+        submission.enqueued_at = datetime.utcnow()
+        for field in ('dequeued_at', 'picked_at', 'submitted_at', 'first_polled_at', 'judged_at'):
+            setattr(submission, field, None)
         db.session.commit()
-        redis_con.lpush(submitter_queue, submission.id)
+        push_submission(submission)
     url = url_for('get_submission', id=submission.id, _external=True)
     return jsonify({'status': 'success', 'id': submission.id, 'url': url})
 
@@ -160,37 +386,138 @@ def update_submission(id):
 def get_recent_contests(site):
     if site not in contest_clients:
         abort(404)
-    c = contest_clients[site]
-    contest_list = c.get_recent_contest()
+    expires_at, contest_list = recent_contests.get(site, (0, None))
+    if time.monotonic() > expires_at:
+        data = redis_con.get(f'{recent_contests_key}-{site}')
+        if data:
+            contest_list = json.loads(data)
+        else:
+            contests = Contest.query.on_replica().filter_by(site=site).order_by(
+                Contest.start_time.desc()).limit(50).all()
+            contest_list = []
+            for contest in contests:
+                contest_json = contest.to_json()
+                contest_json.pop('oj_name')
+                contest_list.append(ContestInfo(**contest_json).to_json())
+        recent_contests[site] = (time.monotonic() + 30, contest_list)
     return jsonify({
-        'contests': [x.to_json() for x in contest_list]
+        'contests': contest_list
     })
 
 
 @app.route('/contests/<site>/<contest_id>')
 def get_contest_info(site, contest_id):
-    contest = Contest.query.filter_by(site=site, contest_id=contest_id).first()
-    if contest is None:
-        abort(404)
-    problems = Problem.query.filter_by(oj_name=contest.oj_name).all()
-    return jsonify({
-        'contest': contest.to_json(),
-        'problems': [p.to_json() for p in problems]
-    })
+    fields = tuple(get_fields(Problem))
+    resource = ('contest', site, contest_id)
+    cached = response_cache.get(resource, fields)
+    if cached is None:
+        # Primary reads for the same reason as in get_problem.
+        contest = Contest.query.on_primary().filter_by(site=site, contest_id=contest_id).first()
+        if contest is None:
+            abort(404)
+        problems = Problem.query.on_primary().only(*fields).filter_by(oj_name=contest.oj_name).all()
+        cached = response_cache.put(resource, fields, {
+            'contest': contest.to_json(),
+            'problems': [p.to_json(fields) for p in problems]
+        })
+    return cached.response()
 
 
 @app.route('/contests/<site>/<contest_id>', methods=['POST'])
 def crawl_contest_info(site, contest_id):
     if site not in supported_contest_sites:
         return jsonify({'error': f'site {site} is not supported'}), 422
-    redis_con.lpush(crawler_queue, json.dumps({
+    push_crawl_task({
         'oj_name': f'{site}_ct_{contest_id}',
         'type': 'contest'
-    }))
+    })
     url = url_for('get_contest_info', site=site, contest_id=contest_id, _external=True)
     return jsonify({'status': 'success', 'url': url})
 
 
+@app.route('/profiler', methods=['POST'])
+@admin_required
+def control_profiler():
+    action = request.form.get('action')
+    if action not in ('start', 'stop'):
+        return jsonify({'error': 'action should be start or stop'}), 422
+    max_seconds = PROFILER_CONFIG['max_seconds']
+    seconds = request.form.get('seconds')
+    try:
+        seconds = float(seconds) if seconds else max_seconds
+    except ValueError:
+        return jsonify({'error': 'invalid seconds'}), 422
+    if not 0 < seconds <= max_seconds:
+        return jsonify({'error': f'seconds should be in (0, {max_seconds}]'}), 422
+    publish('profiler', action=action, seconds=seconds)
+    return jsonify({'status': 'success'})
+
+
+@app.route('/admin/workers')
+@admin_required
+def get_worker_state():
+    workers = {}
+    stale = []
+    try:
+        states = redis_con.hgetall(worker_state_key)
+    except redis.exceptions.RedisError as e:
+        logger.error(f'Loaded worker state failed, reason: {e}')
+        return jsonify({'error': 'worker state is unavailable'}), 503
+    now = time.time()
+    for process, data in states.items():
+        process = process.decode()
+        try:
+            data = json.loads(data)
+            expired = now - data['time'] > WORKER_STATE_INTERVAL * 4
+        except (ValueError, KeyError, TypeError):
+            stale.append(process)
+            continue
+        if expired:
+            stale.append(process)
+        else:
+            workers[process] = data
+    if stale:
+        try:
+            redis_con.hdel(worker_state_key, *stale)
+        except redis.exceptions.RedisError as e:
+            logger.error(f'Removed stale worker state failed, reason: {e}')
+    return jsonify({'workers': workers})
+
+
+@app.route('/admin/workers/<oj_name>', methods=['POST'])
+@admin_required
+def control_workers(oj_name):
+    action = request.form.get('action')
+    target = request.form.get('target') or 'all'
+    if action not in ('pause', 'resume', 'drain', 'scale'):
+        return jsonify({'error': 'action should be pause, resume, drain or scale'}), 422
+    if target not in ('submitter', 'crawler', 'all'):
+        return jsonify({'error': 'target should be submitter, crawler or all'}), 422
+    count = None
+    if action == 'scale':
+        try:
+            count = int(request.form.get('count'))
+        except (TypeError, ValueError):
+            count = 0
+        if count < 1:
+            return jsonify({'error': 'count should be a positive integer'}), 422
+    publish('control', action=action, oj_name=oj_name, target=target, count=count)
+    return jsonify({'status': 'success'})
+
+
+@app.route('/metrics')
+def get_metrics():
+    snapshots = {}
+    try:
+        snapshots = metrics.load_snapshots(redis_con)
+    except redis.exceptions.RedisError as e:
+        logger.error(f'Loaded metrics failed, reason: {e}')
+    snapshots[metrics_pusher.process] = metrics.registry.snapshot()
+    groups = [({}, queue_metrics.snapshot())]
+    groups.extend(({'process': k}, v) for k, v in sorted(snapshots.items()))
+    return Response(metrics.render(groups), mimetype='text/plain; version=0.0.4')
+
+
 @app.teardown_appcontext
 def shutdown_session(response_or_exc):
     db.session.remove()
@@ -0,0 +1,44 @@
+import threading
+from queue import Queue, Empty
+
+
+class _Waiter(object):
+    def __init__(self, ids, user_id):
+        self.ids = ids
+        self.user_id = user_id
+        self.queue = Queue()
+
+    def matches(self, event):
+        if self.ids and event.get('id') not in self.ids:
+            return False
+        if self.user_id and event.get('user_id') != self.user_id:
+            return False
+        return True
+
+
+class SubmissionWatcher(object):
+    def __init__(self):
+        self._waiters = set()
+        self._lock = threading.Lock()
+
+    def watch(self, ids=None, user_id=None):
+        waiter = _Waiter(set(ids or ()), user_id)
+        with self._lock:
+            self._waiters.add(waiter)
+        return waiter
+
+    def unwatch(self, waiter):
+        with self._lock:
+            self._waiters.discard(waiter)
+
+    def wait(self, waiter, timeout):
+        try:
+            return waiter.queue.get(timeout=timeout)
+        except Empty:
+            return None
+
+    def notify(self, event):
+        with self._lock:
+            waiters = [x for x in self._waiters if x.matches(event)]
+        for waiter in waiters:
+            waiter.queue.put(dict(event))
@@ -0,0 +1,23 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+# A file database, since worker threads each get their own in-memory one.
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test.sqlite'))
+
+from vjudge.models import db  # noqa: E402
+
+
+class DatabaseTestCase(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch('vjudge.events.publish')
+        self.publish = patcher.start()
+        self.addCleanup(patcher.stop)
+        db.create_all()
+        self.addCleanup(self._drop_all)
+
+    @staticmethod
+    def _drop_all():
+        db.session.remove()
+        db.drop_all()
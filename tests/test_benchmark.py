@@ -0,0 +1,62 @@
+from unittest import mock
+
+import requests
+
+from vjudge.benchmark import Benchmark
+
+from . import DatabaseTestCase
+
+
+class Response(object):
+    def __init__(self, data):
+        self.data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+
+class BenchmarkTest(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.benchmark = Benchmark('http://api/', 'hdu', ['1000'], 'G++', 'code', rate=10, count=4, timeout=60)
+
+    def test_run_one_waits_for_verdict(self):
+        session = mock.Mock()
+        session.post.return_value = Response({'id': 7})
+        session.get.side_effect = [Response({'verdict': 'Being Judged'}), requests.exceptions.Timeout(),
+                                   Response({'verdict': 'Accepted'})]
+        with mock.patch('vjudge.benchmark.time.sleep'):
+            result = self.benchmark._run_one(session, '1000')
+        self.assertEqual((result['id'], result['verdict']), (7, 'Accepted'))
+        self.assertIn('latency', result)
+        self.assertEqual(session.post.call_args[0][0], 'http://api/submissions/')
+        self.assertEqual([x[1]['params']['verdict'] for x in session.get.call_args_list],
+                         ['Queuing', 'Being Judged', 'Being Judged'])
+
+    def test_run_one_submit_error(self):
+        session = mock.Mock()
+        session.post.side_effect = requests.exceptions.ConnectionError()
+        result = self.benchmark._run_one(session, '1000')
+        self.assertIsNone(result['id'])
+        session.get.assert_not_called()
+
+    def test_summary(self):
+        self.benchmark._results = [
+            {'id': 1, 'submit_time': 0.1, 'verdict': 'Accepted', 'latency': 2.0},
+            {'id': 2, 'submit_time': 0.2, 'verdict': 'Wrong Answer', 'latency': 4.0},
+            {'id': 3, 'submit_time': 0.3, 'verdict': 'Queuing'},
+            {'id': None, 'submit_time': 0.4, 'verdict': None},
+        ]
+        summary = self.benchmark._summarize(0, 10, 2, {'worker:a': (1.0, 100)},
+                                            {'worker:a': (3.0, 200), 'worker:b': (5.0, 300)})
+        self.assertEqual((summary['submitted'], summary['submit_errors'], summary['judged'], summary['timed_out']),
+                         (3, 1, 2, 1))
+        self.assertEqual(summary['offered_rate'], 2)
+        self.assertEqual(summary['throughput'], 0.2)
+        self.assertEqual(summary['verdicts'], {'Accepted': 1, 'Wrong Answer': 1})
+        self.assertEqual(summary['latency']['max'], 4.0)
+        self.assertEqual(summary['workers']['worker:a'], {'cpu_seconds': 2.0, 'cpu_percent': 20.0, 'rss_bytes': 200})
+        self.assertIsNone(summary['workers']['worker:b']['cpu_seconds'])
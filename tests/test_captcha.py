@@ -0,0 +1,95 @@
+import io
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from PIL import Image, ImageDraw
+
+from vjudge.site.scu.client import CaptchaStore
+from vjudge.site.scu.solver import CaptchaSolver
+
+
+def render(code):
+    image = Image.new('L', (60, 20), 255)
+    draw = ImageDraw.Draw(image)
+    for i, char in enumerate(code):
+        draw.text((4 + i * 14, 4), char, fill=0)
+    content = io.BytesIO()
+    image.save(content, 'PNG')
+    return content.getvalue()
+
+
+class TempDirTestCase(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.temp_dir = temp_dir.name
+
+
+class CaptchaStoreTest(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(self.temp_dir, 'captcha.db')
+        self.execute('CREATE TABLE captcha (hash TEXT PRIMARY KEY, code TEXT)',
+                     "INSERT INTO captcha VALUES ('a', '1234')")
+
+    def execute(self, *statements):
+        connection = sqlite3.connect(self.path)
+        with connection:
+            for statement in statements:
+                connection.execute(statement)
+        connection.close()
+
+    def test_add(self):
+        store = CaptchaStore(self.path)
+        self.assertEqual(store.get('a'), '1234')
+        store.add('b', '5678')
+        store.add('a', '0000')
+        self.assertEqual(store.get('b'), '5678')
+        self.assertEqual(store.get('a'), '1234')
+        self.assertEqual(CaptchaStore(self.path).get('b'), '5678')
+
+    def test_reload_when_file_changes(self):
+        store = CaptchaStore(self.path, check_interval=0)
+        self.assertIsNone(store.get('c'))
+        self.execute("INSERT INTO captcha VALUES ('c', '4321')")
+        os.utime(self.path, ns=(0, 0))
+        self.assertEqual(store.get('c'), '4321')
+
+
+class CaptchaSolverTest(TempDirTestCase):
+    codes = ('0123', '4567', '8901', '2345', '6789')
+
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(self.temp_dir, 'templates.npz')
+        patcher = mock.patch('vjudge.site.scu.solver._TemplateSaver')
+        self.saver = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_learn_and_solve(self):
+        solver = CaptchaSolver(path=self.path)
+        self.assertIsNone(solver.solve(render('1234')))
+        for code in self.codes:
+            solver.learn(render(code), code)
+        self.assertEqual(solver.solve(render('9630')), '9630')
+        self.assertIsNone(solver.solve(b'not an image'))
+
+    def test_saved_in_background(self):
+        solver = CaptchaSolver(path=self.path)
+        for code in self.codes:
+            solver.learn(render(code), code)
+        self.saver.assert_called_once_with(solver, 60)
+        self.assertFalse(os.path.exists(self.path))
+        solver.save()
+        self.assertEqual(CaptchaSolver(path=self.path).solve(render('9630')), '9630')
+        os.utime(self.path, ns=(0, 0))
+        solver.save()
+        self.assertEqual(os.stat(self.path).st_mtime_ns, 0)
+
+    def test_corrupt_templates(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'garbage')
+        self.assertIsNone(CaptchaSolver(path=self.path).solve(render('1234')))
@@ -0,0 +1,50 @@
+from datetime import datetime
+
+from server.catalog import ProblemCatalog
+from vjudge.models import db, Problem
+
+from . import DatabaseTestCase
+
+
+class ProblemCatalogTest(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        db.session.add_all([Problem(oj_name=oj_name, problem_id=problem_id, last_update=datetime.utcnow(),
+                                    title=f'{oj_name} {problem_id}')
+                            for oj_name, problem_id in (('hdu', '1000'), ('hdu', '1001'), ('hdu', '1100'),
+                                                        ('hdu', '2000'), ('scu', '1000'))])
+        db.session.commit()
+        self.catalog = ProblemCatalog()
+
+    def ids(self, oj_names, problem_id='', page=1, per_page=20):
+        pagination = self.catalog.paginate(set(oj_names), problem_id, page=page, per_page=per_page)
+        return [f'{x["oj_name"]}/{x["problem_id"]}' for x in pagination.items], pagination.total
+
+    def test_prefix_lookup(self):
+        self.assertEqual(self.ids(['hdu'], '10%'), (['hdu/1000', 'hdu/1001'], 2))
+        self.assertEqual(self.ids(['hdu'], '1100'), (['hdu/1100'], 1))
+        self.assertEqual(self.ids(['hdu'], '11'), ([], 0))
+        self.assertEqual(self.ids(['hdu', 'scu'], '1000'), (['hdu/1000', 'scu/1000'], 2))
+
+    def test_pages_across_sites(self):
+        self.assertEqual(self.ids(['hdu', 'scu'], page=2, per_page=3), (['hdu/2000', 'scu/1000'], 5))
+        self.assertEqual(self.ids(['scu'], page=3, per_page=3), ([], 1))
+
+    def test_supports(self):
+        self.assertTrue(ProblemCatalog.supports('10%'))
+        self.assertFalse(ProblemCatalog.supports('1_00'))
+        self.assertFalse(ProblemCatalog.supports('%00'))
+
+    def test_apply_events(self):
+        self.catalog.apply({'oj_name': 'hdu', 'problem_id': '1002', 'title': 'new'})
+        self.assertEqual(self.ids(['hdu'], '10%'), (['hdu/1000', 'hdu/1001'], 2))
+        self.catalog.apply({'oj_name': 'hdu', 'problem_id': '1002', 'title': 'new'})
+        self.catalog.apply({'oj_name': 'hdu', 'problem_id': '1000', 'title': 'renamed'})
+        self.catalog.apply({'oj_name': 'hdu', 'problem_id': '1001', 'title': 'gone', 'deleted': True})
+        self.catalog.apply({'oj_name': 'poj', 'problem_id': '1000', 'title': 'poj'})
+        self.catalog.apply({'oj_name': 'hdu', 'problem_id': '1100'})
+        pagination = self.catalog.paginate({'hdu', 'poj'}, '10%')
+        self.assertEqual(pagination.items, [{'oj_name': 'hdu', 'problem_id': '1000', 'title': 'renamed'},
+                                            {'oj_name': 'hdu', 'problem_id': '1002', 'title': 'new'},
+                                            {'oj_name': 'poj', 'problem_id': '1000', 'title': 'poj'}])
+        self.assertEqual(self.ids(['hdu'], '1100'), (['hdu/1100'], 1))
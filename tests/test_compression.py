@@ -0,0 +1,41 @@
+import unittest
+import zlib
+from datetime import datetime
+
+from vjudge.compression import compress, decompress, compress_statement, decompress_statement
+from vjudge.models import db, Problem
+
+from . import DatabaseTestCase
+
+statement = ('<p>There are multiple test cases. The first line of the input contains an integer T '
+             'indicating the number of test cases. For each test case, output the answer in one line.</p>'
+             '<p>1 &lt;= n &lt;= 10<sup>5</sup>，答案对 10^9+7 取模。</p>')
+
+
+class CompressionTest(unittest.TestCase):
+    def test_round_trip(self):
+        for text in ('', 'a', statement, statement * 20):
+            self.assertEqual(decompress(compress(text)), text)
+            self.assertEqual(decompress_statement(compress_statement(text)), text)
+
+    def test_dictionary_helps_short_statements(self):
+        self.assertLess(len(compress_statement(statement)), len(zlib.compress(statement.encode('utf-8'), 9)))
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            decompress_statement(b'\x02' + zlib.compress(b'text'))
+
+
+class CompressedTextTest(DatabaseTestCase):
+    def test_column_round_trip(self):
+        db.session.add(Problem(oj_name='hdu', problem_id='1000', last_update=datetime.utcnow(), title='A + B',
+                               description=statement, input='', output=None))
+        db.session.commit()
+        db.session.remove()
+        problem = Problem.query.get(('hdu', '1000'))
+        self.assertEqual(problem.description, statement)
+        self.assertEqual(problem.input, '')
+        self.assertIsNone(problem.output)
+        raw = db.session.execute('SELECT description, output FROM problems').first()
+        self.assertEqual(decompress_statement(raw[0]), statement)
+        self.assertIsNone(raw[1])
@@ -0,0 +1,101 @@
+import json
+from datetime import datetime, timedelta
+from unittest import mock
+
+from vjudge.main import ContestListRefresher, ContestPrewarmer
+from vjudge.models import db, Contest
+from vjudge.site.base import ContestInfo
+
+from . import DatabaseTestCase
+
+
+class Stop(Exception):
+    pass
+
+
+class ContestClient(object):
+    contests = [ContestInfo('hdu', '1', 'Contest 1', True, 'Running', 1767225600, 1767243600),
+                ContestInfo('hdu', '2', 'Contest 2', False, 'Pending', 1767312000, 1767329999)]
+
+    @classmethod
+    def get_recent_contest(cls):
+        return cls.contests
+
+
+class BrokenClient(object):
+    @classmethod
+    def get_recent_contest(cls):
+        raise ValueError('unexpected page layout')
+
+
+@mock.patch.dict('vjudge.main.contest_clients', {'broken': BrokenClient, 'hdu': ContestClient}, clear=True)
+class ContestListRefresherTest(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.refresher = ContestListRefresher()
+        self.refresher._redis_con = mock.Mock()
+
+    def contest_events(self):
+        return [x for x in self.publish.call_args_list if x[0][0] == 'contest']
+
+    def test_stores_naive_utc(self):
+        self.refresher._refresh('hdu')
+        db.session.remove()
+        contest = Contest.query.get('hdu_ct_1')
+        self.assertEqual(contest.start_time, datetime(2026, 1, 1))
+        self.assertEqual(contest.end_time, datetime(2026, 1, 1, 5))
+        self.assertEqual(len(self.contest_events()), 2)
+
+    def test_unchanged_contests_are_not_rewritten(self):
+        self.refresher._refresh('hdu')
+        self.publish.reset_mock()
+        self.refresher._refresh('hdu')
+        db.session.remove()
+        self.refresher._refresh('hdu')
+        self.assertEqual(self.contest_events(), [])
+
+    def test_a_failing_site_does_not_stop_the_refresher(self):
+        with mock.patch('vjudge.main.time.sleep', side_effect=Stop):
+            with self.assertRaises(Stop):
+                self.refresher.run()
+        self.assertEqual(Contest.query.count(), 2)
+
+
+class ContestPrewarmerTest(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = datetime(2026, 1, 1, 12)
+        db.session.add_all([Contest(oj_name=f'hdu_ct_{i}', site='hdu', contest_id=str(i),
+                                    start_time=self.now + timedelta(seconds=offset))
+                            for i, offset in ((1, 200), (2, -200), (3, 400), (4, -400))])
+        db.session.add(Contest(oj_name='scu_ct_1', site='scu', contest_id='1', start_time=self.now))
+        db.session.commit()
+        self.submitter_handler = mock.Mock()
+        accounts = {f'hdu_ct_{i}': [] for i in range(1, 5)}
+        self.prewarmer = ContestPrewarmer(self.submitter_handler, accounts, lead_time=300)
+        self.prewarmer._redis_con = mock.Mock()
+
+    def prewarm(self, seconds=0):
+        with mock.patch('vjudge.main.datetime') as datetime_mock:
+            datetime_mock.utcnow.return_value = self.now + timedelta(seconds=seconds)
+            self.prewarmer._prewarm()
+        prewarmed = sorted(x[0][0] for x in self.submitter_handler.prewarm.call_args_list)
+        crawled = sorted(json.loads(x[0][1])['oj_name'] for x in self.prewarmer._redis_con.lpush.call_args_list)
+        self.submitter_handler.reset_mock()
+        self.prewarmer._redis_con.reset_mock()
+        return prewarmed, crawled
+
+    def test_selects_contests_within_lead_time(self):
+        self.assertEqual(self.prewarm(), (['hdu_ct_1', 'hdu_ct_2'], ['hdu_ct_1', 'hdu_ct_2']))
+        self.assertEqual(self.prewarm(), ([], []))
+
+    def test_window_moves_and_started_contests_are_crawled_again(self):
+        self.prewarm()
+        self.assertEqual(self.prewarm(250), (['hdu_ct_3'], ['hdu_ct_1', 'hdu_ct_3']))
+        self.assertEqual(self.prewarm(260), ([], []))
+
+    def test_prewarms_again_when_rescheduled(self):
+        self.prewarm()
+        Contest.query.get('hdu_ct_1').start_time = self.now + timedelta(seconds=100)
+        db.session.commit()
+        self.assertEqual(self.prewarm(), (['hdu_ct_1'], ['hdu_ct_1']))
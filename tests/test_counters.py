@@ -0,0 +1,60 @@
+from datetime import datetime
+
+from vjudge.models import db, Counter, Problem, Submission
+
+from . import DatabaseTestCase
+
+
+def add_submission(oj_name='hdu', verdict='Queuing'):
+    submission = Submission(oj_name=oj_name, problem_id='1000', language='G++', source_code='int main() {}',
+                            verdict=verdict)
+    db.session.add(submission)
+    db.session.commit()
+    return submission
+
+
+class CounterTest(DatabaseTestCase):
+    def counts(self):
+        return {x.name: x.value for x in Counter.query if x.value}
+
+    def test_insert_increments_counters(self):
+        add_submission()
+        add_submission('scu')
+        self.assertEqual(Counter.get('submissions'), 2)
+        self.assertEqual(Counter.get('submissions:oj_name:hdu'), 1)
+        self.assertEqual(Counter.get('submissions:verdict:Queuing'), 2)
+        self.assertEqual(Counter.get('submissions:oj_name:hdu', 'submissions:oj_name:scu'), 2)
+        self.assertEqual(Counter.get('submissions:oj_name:poj'), 0)
+
+    def test_update_moves_counters(self):
+        submission = add_submission()
+        submission.verdict = 'Accepted'
+        db.session.commit()
+        self.assertEqual(Counter.get('submissions:verdict:Queuing'), 0)
+        self.assertEqual(Counter.get('submissions:verdict:Accepted'), 1)
+        self.assertEqual(Counter.get('submissions'), 1)
+
+    def test_delete_decrements_counters(self):
+        submission = add_submission()
+        add_submission()
+        db.session.delete(submission)
+        db.session.commit()
+        self.assertEqual(Counter.get('submissions'), 1)
+        self.assertEqual(Counter.get('submissions:oj_name:hdu'), 1)
+
+    def test_rollback_discards_deltas(self):
+        add_submission()
+        db.session.add(Submission(oj_name='hdu', problem_id='1000', language='G++', source_code='x'))
+        db.session.flush()
+        db.session.rollback()
+        self.assertEqual(Counter.get('submissions'), 1)
+
+    def test_rebuild_matches_hooks(self):
+        add_submission()
+        add_submission('scu', 'Accepted').verdict = 'Wrong Answer'
+        db.session.add(Problem(oj_name='hdu', problem_id='1000', last_update=datetime.utcnow(), title='A + B'))
+        db.session.commit()
+        counts = self.counts()
+        Counter.rebuild()
+        self.assertEqual(self.counts(), counts)
+        self.assertEqual(counts['problems:oj_name:hdu'], 1)
@@ -0,0 +1,65 @@
+import io
+import json
+from datetime import datetime
+from unittest import mock
+
+from vjudge.dump import export_ndjson, import_ndjson
+from vjudge.models import db, Contest, Counter, Problem, Submission
+
+from . import DatabaseTestCase
+
+
+class DumpTest(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        db.session.add_all([
+            Problem(oj_name='hdu', problem_id='1000', last_update=datetime(2026, 1, 1, 8), title='A + B',
+                    description='<p>Sum</p>', input='a b', output='a+b'),
+            Contest(oj_name='hdu_ct_1', site='hdu', contest_id='1', title='Contest', public=True,
+                    start_time=datetime(2026, 1, 1), end_time=datetime(2026, 1, 2)),
+        ])
+        for verdict in ('Accepted', 'Wrong Answer'):
+            db.session.add(Submission(oj_name='hdu', problem_id='1000', language='G++', verdict=verdict,
+                                      source_code=f'// {verdict}\nint main() {{}}', time_stamp=datetime(2026, 1, 1)))
+        db.session.commit()
+
+    def export(self):
+        dumps = {}
+        for name in ('problems', 'contests', 'submissions'):
+            fp = io.StringIO()
+            export_ndjson(name, fp)
+            dumps[name] = fp.getvalue()
+        return dumps
+
+    def reset(self):
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+
+    def test_round_trip(self):
+        dumps = self.export()
+        self.assertEqual(len(dumps['submissions'].splitlines()), 2)
+        self.reset()
+        counts = {x: import_ndjson(x, io.StringIO(y), batch_size=1) for x, y in dumps.items()}
+        self.assertEqual(counts, {'problems': 1, 'contests': 1, 'submissions': 2})
+        self.assertEqual(self.export(), dumps)
+        self.assertEqual(Problem.query.get(('hdu', '1000')).description, '<p>Sum</p>')
+        self.assertEqual(Counter.get('submissions'), 2)
+
+    def test_skips_existing_and_repeated_keys(self):
+        dumps = self.export()
+        self.assertEqual(import_ndjson('submissions', io.StringIO(dumps['submissions'])), 0)
+        row = json.loads(dumps['submissions'].splitlines()[0])
+        row['id'] = 10
+        line = json.dumps(row) + '\n'
+        self.assertEqual(import_ndjson('submissions', io.StringIO(line * 3 + '\n' + dumps['submissions'])), 1)
+        self.assertEqual(Submission.query.count(), 3)
+        self.assertEqual(Submission.query.get(10).source_code, row['source_code'])
+
+    def test_resets_postgresql_sequences(self):
+        with mock.patch.object(db.engine.dialect, 'name', 'postgresql'), \
+                mock.patch.object(db.session, 'execute') as execute:
+            import_ndjson('submissions', io.StringIO(''))
+            import_ndjson('problems', io.StringIO(''))
+        self.assertEqual(execute.call_count, 1)
+        self.assertIn("pg_get_serial_sequence('submissions', 'id')", str(execute.call_args[0][0]))
@@ -0,0 +1,47 @@
+import hashlib
+import unittest
+from unittest import mock
+
+from server.fake_oj import FakeJudge, captcha_hashes, create_app
+
+
+class FakeJudgeTest(unittest.TestCase):
+    def setUp(self):
+        self.judge = FakeJudge(judge_latency=2.0, rate_limit=5.0)
+
+    def test_rate_limit_per_user(self):
+        self.assertIsNotNone(self.judge.submit('hdu', 'a', '1000', 'G++'))
+        self.assertIsNone(self.judge.submit('hdu', 'a', '1001', 'G++'))
+        self.assertIsNotNone(self.judge.submit('hdu', 'b', '1000', 'G++'))
+        self.assertIsNotNone(self.judge.submit('scu', 'a', '1000', 'G++'))
+
+    def test_runs_are_filtered_newest_first(self):
+        self.judge.rate_limit = 0
+        for user, problem_id, contest_id in (('a', '1000', ''), ('a', '1001', ''), ('b', '1000', ''),
+                                             ('a', '1000', '1')):
+            self.judge.submit('hdu', user, problem_id, 'G++', contest_id)
+        self.assertEqual([x['run_id'] for x in self.judge.runs('hdu', user='a')], ['2', '1'])
+        self.assertEqual([x['run_id'] for x in self.judge.runs('hdu', problem_id='1000')], ['3', '1'])
+        self.assertEqual([x['run_id'] for x in self.judge.runs('hdu', first='2')], ['2', '1'])
+        self.assertEqual([x['run_id'] for x in self.judge.runs('hdu', contest_id='1')], ['4'])
+
+    def test_status_moves_to_the_verdict(self):
+        run = self.judge.submit('hdu', 'a', '1000', 'G++')
+        with mock.patch('server.fake_oj.time.time', return_value=run['time'] + 0.5):
+            self.assertEqual(self.judge.status_of(run), ('Queuing', 0, 0))
+        with mock.patch('server.fake_oj.time.time', return_value=run['time'] + 1.5):
+            self.assertEqual(self.judge.status_of(run), ('Running', 0, 0))
+        with mock.patch('server.fake_oj.time.time', return_value=run['time'] + 2):
+            self.assertEqual(self.judge.status_of(run), (run['verdict'], run['exe_time'], run['exe_mem']))
+
+    def test_captcha_is_in_the_known_hashes(self):
+        client = create_app(self.judge).test_client()
+        content = client.get('/soj/validation_code').data
+        code = dict(captcha_hashes())[hashlib.md5(content).hexdigest()]
+        self.assertTrue(self.judge.check_captcha('', code))
+        self.assertFalse(self.judge.check_captcha('', code))
+
+    def test_injected_errors(self):
+        self.judge.error_rate = 1
+        client = create_app(self.judge).test_client()
+        self.assertEqual(client.get('/hdu/showproblem.php?pid=1000').status_code, 503)
@@ -0,0 +1,39 @@
+import unittest
+
+from vjudge import metrics
+
+
+class MetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.registry = metrics.Registry()
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = self.registry.histogram('latency_seconds', 'Latency.', ('route',), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 2.0):
+            histogram.observe(value, '/')
+        samples = {(name, labels.get('le')): value for name, labels, value in histogram.samples()}
+        self.assertEqual(samples[('latency_seconds_bucket', '0.1')], 1)
+        self.assertEqual(samples[('latency_seconds_bucket', '1.0')], 3)
+        self.assertEqual(samples[('latency_seconds_bucket', '+Inf')], 4)
+        self.assertEqual(samples[('latency_seconds_count', None)], 4)
+        self.assertAlmostEqual(samples[('latency_seconds_sum', None)], 3.05)
+
+    def test_render_merges_processes(self):
+        counter = self.registry.counter('requests_total', 'Requests.', ('site',))
+        counter.inc('hdu')
+        counter.inc('hdu', amount=2)
+        self.registry.gauge('broken', 'Raises.', function=lambda: 1 / 0)
+        snapshot = self.registry.snapshot()
+        self.assertEqual([x['name'] for x in snapshot], ['requests_total'])
+        text = metrics.render([({'process': 'a'}, snapshot), ({'process': 'b"\n'}, snapshot)])
+        self.assertEqual(text, '# HELP requests_total Requests.\n'
+                               '# TYPE requests_total counter\n'
+                               'requests_total{site="hdu",process="a"} 3\n'
+                               'requests_total{site="hdu",process="b\\"\\n"} 3\n')
+
+    def test_register_replaces_same_name(self):
+        first = self.registry.counter('requests_total', 'Requests.')
+        second = self.registry.counter('requests_total', 'Requests.')
+        first.inc()
+        self.assertIsNot(first, second)
+        self.assertEqual(self.registry.snapshot()[0]['samples'], [])
@@ -0,0 +1,30 @@
+import os
+import tempfile
+import unittest
+
+from vjudge.profiler import SamplingProfiler
+
+
+class SamplingProfilerTest(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.output_dir = temp_dir.name
+
+    def test_toggle_is_capped(self):
+        profiler = SamplingProfiler(interval=0.001, max_seconds=0.05, output_dir=self.output_dir)
+        profiler.toggle()
+        thread = profiler._thread
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(len(os.listdir(self.output_dir)), 1)
+
+    def test_toggle_stops(self):
+        profiler = SamplingProfiler(interval=0.001, max_seconds=60, output_dir=self.output_dir)
+        profiler.toggle()
+        self.assertTrue(profiler.running)
+        thread = profiler._thread
+        profiler.toggle()
+        thread.join(5)
+        self.assertFalse(profiler.running)
+        self.assertFalse(profiler.stop())
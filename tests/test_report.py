@@ -0,0 +1,56 @@
+import unittest
+from datetime import datetime, timedelta
+
+from vjudge.models import db, Submission
+from vjudge.report import lifecycle_report, percentile
+
+from . import DatabaseTestCase
+
+
+class PercentileTest(unittest.TestCase):
+    def test_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 90), 90)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile(values, 100), 100)
+        self.assertEqual(percentile([3.5], 99), 3.5)
+        self.assertEqual(percentile([1, 2], 50), 1)
+        self.assertEqual(percentile([1, 2], 0), 1)
+
+
+class LifecycleReportTest(DatabaseTestCase):
+    def add_submission(self, oj_name, user_id, judge_seconds, **offsets):
+        start = datetime(2026, 1, 1)
+        submission = Submission(oj_name=oj_name, user_id=user_id, problem_id='1000', language='G++',
+                                source_code='int main() {}', verdict='Accepted', enqueued_at=start,
+                                submitted_at=start + timedelta(seconds=1),
+                                judged_at=start + timedelta(seconds=1 + judge_seconds))
+        for field, seconds in offsets.items():
+            setattr(submission, field, start + timedelta(seconds=seconds))
+        db.session.add(submission)
+        db.session.commit()
+        return submission.id
+
+    def rows(self, **kwargs):
+        return {(x['group'], x['stage']): x for x in lifecycle_report(**kwargs)}
+
+    def test_percentiles_by_group(self):
+        ids = [self.add_submission('hdu', 'a', x) for x in range(1, 11)]
+        ids.append(self.add_submission('scu', 'b', 100, dequeued_at=0.5))
+        rows = self.rows()
+        self.assertEqual(rows['hdu', 'judge'], {'group': 'hdu', 'stage': 'judge', 'count': 10,
+                                                'p50': 5, 'p90': 9, 'p99': 10, 'max': 10})
+        self.assertEqual(rows['*', 'judge']['count'], 11)
+        self.assertEqual(rows['*', 'judge']['max'], 100)
+        self.assertEqual(rows['scu', 'redis_queue']['p50'], 0.5)
+        self.assertNotIn(('hdu', 'redis_queue'), rows)
+        self.assertEqual(list(rows)[0][0], '*')
+        self.assertEqual(self.rows(ids=ids[-1:])['*', 'total']['count'], 1)
+        self.assertIn(('scu/b', 'judge'), self.rows(group_by='account'))
+
+    def test_skips_unjudged_submissions(self):
+        self.add_submission('hdu', 'a', 1)
+        db.session.query(Submission).update({'judged_at': None})
+        db.session.commit()
+        self.assertEqual(lifecycle_report(), [])
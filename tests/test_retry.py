@@ -0,0 +1,259 @@
+import threading
+import unittest
+from unittest import mock
+
+import requests
+
+from vjudge import metrics
+from vjudge.site import exceptions
+from vjudge.site.base import BaseClient
+from vjudge.site.retry import CircuitBreaker, backoff
+
+
+class Response(object):
+    def __init__(self, status_code, text=''):
+        self.status_code = status_code
+        self.text = text
+        self.content = text.encode()
+        self.request = mock.Mock(body=None)
+
+
+class Session(object):
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = 0
+
+    def request(self, method, url, data=None, timeout=None):
+        self.calls += 1
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+class Client(BaseClient):
+    endpoint_patterns = ((r'/submit', 'submit'), (r'/status', 'status'))
+
+    def __init__(self, session, breaker):
+        super().__init__()
+        self._session = session
+        self._breaker = breaker
+        self.latest_run_ids = []
+
+    def get_name(self):
+        return 'test'
+
+    def get_user_id(self):
+        return 'user'
+
+    def get_client_type(self):
+        return 'practice'
+
+    def login(self, username, password):
+        pass
+
+    def check_login(self):
+        return True
+
+    def update_cookies(self):
+        pass
+
+    def get_problem(self, problem_id):
+        pass
+
+    def get_problem_list(self):
+        return []
+
+    def submit_problem(self, problem_id, language, source_code):
+        pass
+
+    def get_submit_status(self, run_id, **kwargs):
+        pass
+
+    def get_breaker(self):
+        return self._breaker
+
+    def _get_latest_run_id(self, problem_id):
+        result = self.latest_run_ids.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def _request_url(self, method, url, data=None, timeout=None, retry=True):
+        try:
+            return self._send(method, url, data=data, timeout=timeout, retry=retry).text
+        except requests.exceptions.RequestException:
+            raise exceptions.ConnectionError(f'Request "{url}" failed')
+
+
+class BackoffTest(unittest.TestCase):
+    def test_delay_is_jittered_and_capped(self):
+        policy = {'base_delay': 1, 'max_delay': 5}
+        for attempt, delay in ((0, 1), (1, 2), (2, 4), (3, 5), (10, 5)):
+            for _ in range(50):
+                self.assertTrue(delay / 2 <= backoff(policy, attempt) <= delay)
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 100.0
+        patcher = mock.patch('vjudge.site.retry.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker('test', threshold=3, cooldown=10, max_cooldown=25)
+
+    def open_breaker(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+
+    def test_opens_after_threshold(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertFalse(self.breaker.is_open)
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.is_open)
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(self.breaker.retry_after(), 10)
+
+    def test_success_resets_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertFalse(self.breaker.is_open)
+
+    def test_allows_a_single_probe_after_cooldown(self):
+        self.open_breaker()
+        self.now += 10
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertFalse(self.breaker.is_open)
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_probe_reopens_with_longer_cooldown(self):
+        self.open_breaker()
+        self.now += 10
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.is_open)
+        self.assertEqual(self.breaker.retry_after(), 20)
+        self.now += 20
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.retry_after(), 25)
+
+    def test_release_only_frees_own_probe(self):
+        self.open_breaker()
+        self.now += 10
+        self.assertTrue(self.breaker.allow())
+        thread = threading.Thread(target=self.breaker.release)
+        thread.start()
+        thread.join()
+        self.assertFalse(self.breaker.allow())
+        self.breaker.release()
+        self.assertTrue(self.breaker.allow())
+
+
+@mock.patch('vjudge.site.base.time.sleep')
+class SendTest(unittest.TestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker('test', threshold=2, cooldown=10, max_cooldown=20)
+
+    def test_retries_server_errors(self, sleep):
+        session = Session(Response(503), requests.exceptions.Timeout(), Response(200, 'ok'))
+        r = Client(session, self.breaker)._send('get', 'http://oj/problem')
+        self.assertEqual(r.text, 'ok')
+        self.assertEqual(session.calls, 3)
+        self.assertEqual(sleep.call_count, 2)
+
+    def test_gives_up_after_attempts(self, sleep):
+        session = Session(Response(502), Response(503), Response(504))
+        with self.assertRaises(requests.exceptions.HTTPError):
+            Client(session, self.breaker)._send('get', 'http://oj/problem')
+        self.assertEqual(session.calls, 3)
+        self.assertFalse(self.breaker.is_open)
+
+    def test_does_not_retry_submit_or_without_retry(self, sleep):
+        session = Session(Response(503), Response(503))
+        client = Client(session, self.breaker)
+        with self.assertRaises(requests.exceptions.HTTPError):
+            client._send('post', 'http://oj/submit')
+        with self.assertRaises(requests.exceptions.HTTPError):
+            client._send('get', 'http://oj/status', retry=False)
+        self.assertEqual(session.calls, 2)
+        sleep.assert_not_called()
+        self.assertTrue(self.breaker.is_open)
+        with self.assertRaises(exceptions.CircuitOpen):
+            client._send('get', 'http://oj/status')
+
+    def test_releases_probe_on_unexpected_error(self, sleep):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        with mock.patch('vjudge.site.retry.time.monotonic', return_value=float('inf')):
+            client = Client(Session(ValueError('bad url'), Response(200)), self.breaker)
+            with self.assertRaises(ValueError):
+                client._send('get', 'http://oj/status')
+            client._send('get', 'http://oj/status')
+        self.assertFalse(self.breaker.is_open)
+
+
+@mock.patch('vjudge.site.base.time.sleep')
+class InstrumentationTest(unittest.TestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker('test', threshold=10, cooldown=10, max_cooldown=20)
+        self.requests = metrics.Counter('requests', '', ('oj_name', 'endpoint', 'account', 'status'))
+        self.bytes = metrics.Counter('bytes', '', ('oj_name', 'endpoint', 'account', 'direction'))
+        self.retries = metrics.Counter('retries', '', ('oj_name', 'endpoint'))
+        for name, metric in (('remote_requests', self.requests), ('remote_bytes', self.bytes),
+                             ('remote_retries', self.retries)):
+            patcher = mock.patch(f'vjudge.site.base.{name}', metric)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def values(metric):
+        return {tuple(labels.values()): value for name, labels, value in metric.samples()}
+
+    def test_records_status_bytes_and_retries(self, sleep):
+        client = Client(Session(requests.exceptions.Timeout(), Response(503), Response(200, 'ok')), self.breaker)
+        client.auth = ('team1', 'password')
+        client._send('get', 'http://oj/status?id=1')
+        self.assertEqual(self.values(self.requests), {('test', 'status', 'team1', 'timeout'): 1,
+                                                      ('test', 'status', 'team1', '503'): 1,
+                                                      ('test', 'status', 'team1', '200'): 1})
+        self.assertEqual(self.values(self.bytes)[('test', 'status', 'team1', 'received')], 2)
+        self.assertEqual(self.values(self.retries), {('test', 'status'): 2})
+
+    def test_unknown_endpoint_and_anonymous_account(self, sleep):
+        Client(Session(Response(200)), self.breaker)._send('get', 'http://oj/problem')
+        self.assertEqual(self.values(self.requests), {('test', 'other', 'anonymous', '200'): 1})
+
+
+@mock.patch('vjudge.site.base.time.sleep')
+class SubmitWithRetryTest(unittest.TestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker('test', threshold=10, cooldown=10, max_cooldown=20)
+
+    def test_returns_response(self, sleep):
+        client = Client(Session(Response(200, 'done')), self.breaker)
+        self.assertEqual(client._submit_with_retry('http://oj/submit', dict, '1000', '1'), 'done')
+
+    def test_stops_when_submit_landed(self, sleep):
+        client = Client(Session(requests.exceptions.Timeout()), self.breaker)
+        client.latest_run_ids = ['2']
+        self.assertIsNone(client._submit_with_retry('http://oj/submit', dict, '1000', '1'))
+
+    def test_resubmits_when_check_fails(self, sleep):
+        session = Session(requests.exceptions.Timeout(), requests.exceptions.Timeout(), Response(200, 'done'))
+        client = Client(session, self.breaker)
+        client.latest_run_ids = ['1', exceptions.ConnectionError('status down')]
+        self.assertEqual(client._submit_with_retry('http://oj/submit', dict, '1000', '1'), 'done')
+        self.assertEqual(session.calls, 3)
+
+    def test_raises_after_attempts(self, sleep):
+        session = Session(*[requests.exceptions.Timeout()] * 3)
+        client = Client(session, self.breaker)
+        client.latest_run_ids = ['1', '1']
+        with self.assertRaises(exceptions.ConnectionError):
+            client._submit_with_retry('http://oj/submit', dict, '1000', '1')
@@ -0,0 +1,67 @@
+import unittest
+from datetime import datetime
+
+from vjudge.models import db, Problem
+from vjudge.search import strip_tags
+
+from . import DatabaseTestCase
+
+
+class StripTagsTest(unittest.TestCase):
+    def test_strip_tags(self):
+        self.assertEqual(strip_tags('<p>a <b>b</b></p>\n<br/>c'), 'a b c')
+
+
+class SearchIndexTest(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        db.session.add_all([
+            Problem(oj_name='hdu', problem_id='1000', last_update=datetime.utcnow(), title='A + B Problem',
+                    description='<p>Calculate the sum of two integers.</p>'),
+            Problem(oj_name='hdu', problem_id='1001', last_update=datetime.utcnow(), title='Sum Problem',
+                    description='<span class="katex">Add up the numbers from 1 to n.</span>'),
+            Problem(oj_name='scu', problem_id='1000', last_update=datetime.utcnow(), title='Shortest Path',
+                    description='<p>Find the minimum distance in a graph.</p>', input='<b>graph</b> edges'),
+        ])
+        db.session.commit()
+
+    def search(self, q):
+        matches = Problem.search(q)
+        if matches is None:
+            return None
+        query = db.session.query(matches.c.oj_name, matches.c.problem_id).order_by(matches.c.rank)
+        return [f'{x}/{y}' for x, y in query]
+
+    def test_matches_title_and_body(self):
+        self.assertEqual(self.search('graph'), ['scu/1000'])
+        self.assertEqual(self.search('integers'), ['hdu/1000'])
+        self.assertEqual(self.search('minimum distance'), ['scu/1000'])
+        self.assertEqual(self.search('nothing'), [])
+
+    def test_title_ranks_first(self):
+        self.assertEqual(self.search('sum'), ['hdu/1001', 'hdu/1000'])
+
+    def test_prefix_and_invalid_queries(self):
+        self.assertEqual(self.search('shor'), ['scu/1000'])
+        self.assertEqual(self.search('"graph"'), ['scu/1000'])
+        self.assertIsNone(self.search('+-*'))
+
+    def test_tags_are_not_indexed(self):
+        self.assertEqual(self.search('katex'), [])
+
+    def test_updates_and_deletes(self):
+        problem = Problem.query.get(('scu', '1000'))
+        problem.title = 'Longest Path'
+        db.session.commit()
+        self.assertEqual(self.search('shortest'), [])
+        self.assertEqual(self.search('longest graph'), ['scu/1000'])
+        db.session.remove()
+        problem = Problem.query.get(('hdu', '1000'))
+        problem.description = '<p>Print the product.</p>'
+        db.session.commit()
+        self.assertEqual(self.search('integers'), [])
+        self.assertEqual(self.search('product'), ['hdu/1000'])
+        self.assertEqual(self.search('problem'), ['hdu/1000', 'hdu/1001'])
+        db.session.delete(Problem.query.get(('hdu', '1001')))
+        db.session.commit()
+        self.assertEqual(self.search('sum'), [])
@@ -0,0 +1,36 @@
+from vjudge.models import db, SourceCode, Submission
+
+from . import DatabaseTestCase
+
+
+class SourceCodeTest(DatabaseTestCase):
+    def add_submission(self, source_code):
+        submission = Submission(oj_name='hdu', problem_id='1000', language='G++', source_code=source_code)
+        db.session.add(submission)
+        db.session.commit()
+        return submission.id
+
+    def test_identical_sources_are_stored_once(self):
+        ids = [self.add_submission('int main() {}') for _ in range(3)]
+        self.add_submission('int main() { return 0; }')
+        self.assertEqual(SourceCode.query.count(), 2)
+        db.session.remove()
+        digests = {Submission.query.get(x).source_digest for x in ids}
+        self.assertEqual(len(digests), 1)
+
+    def test_source_code_round_trip(self):
+        source_code = '#include <stdio.h>\n// 注释\nint main() { puts("hi"); }\n' * 50
+        submission_id = self.add_submission(source_code)
+        db.session.remove()
+        submission = Submission.query.get(submission_id)
+        self.assertEqual(submission.source_code, source_code)
+        self.assertLess(len(submission.source.data), len(source_code.encode()))
+
+    def test_changing_source_code_stores_new_source(self):
+        submission_id = self.add_submission('a')
+        submission = Submission.query.get(submission_id)
+        submission.source_code = 'b'
+        db.session.commit()
+        db.session.remove()
+        self.assertEqual(Submission.query.get(submission_id).source_code, 'b')
+        self.assertEqual(SourceCode.query.count(), 2)
@@ -0,0 +1,162 @@
+import json
+import threading
+import time
+from datetime import datetime
+from unittest import mock
+
+from server import views
+from server.cache import ResponseCache
+from server.catalog import ProblemCatalog
+from vjudge.database import BaseQuery
+from vjudge.models import db, Problem, Submission
+
+from . import DatabaseTestCase
+
+
+class ViewTestCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        for target in ('event_listener', 'metrics_pusher'):
+            patcher = mock.patch.object(getattr(views, target), 'start')
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(views, 'response_cache', ResponseCache())
+        self.response_cache = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = views.app.test_client()
+
+
+class ProblemCacheTest(ViewTestCase):
+    def setUp(self):
+        super().setUp()
+        db.session.add(Problem(oj_name='hdu', problem_id='1000', last_update=datetime.utcnow(), title='A + B'))
+        db.session.commit()
+
+    def rename(self, title):
+        Problem.query.filter_by(oj_name='hdu', problem_id='1000').update({'title': title})
+        db.session.commit()
+
+    def test_etag_and_not_modified(self):
+        response = self.client.get('/problems/hdu/1000?fields=title')
+        self.assertEqual(response.get_json(), {'title': 'A + B'})
+        etag = response.headers['ETag']
+        response = self.client.get('/problems/hdu/1000?fields=title', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get('/problems/hdu/1000', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_invalidated_by_problem_event(self):
+        self.client.get('/problems/hdu/1000?fields=title')
+        self.rename('A plus B')
+        response = self.client.get('/problems/hdu/1000?fields=title')
+        self.assertEqual(response.get_json(), {'title': 'A + B'})
+        views.invalidate_problem({'oj_name': 'hdu', 'problem_id': '1000'})
+        response = self.client.get('/problems/hdu/1000?fields=title')
+        self.assertEqual(response.get_json(), {'title': 'A plus B'})
+
+    def test_miss_reads_primary(self):
+        with mock.patch.object(BaseQuery, 'on_primary', autospec=True,
+                               side_effect=lambda query: query) as on_primary:
+            self.client.get('/problems/hdu/1000?fields=title')
+        on_primary.assert_called_once()
+
+    def test_contest_problem_invalidates_contest(self):
+        with views.app.app_context():
+            self.response_cache.put(('contest', 'hdu', '1'), (), {})
+        views.invalidate_problem({'oj_name': 'hdu_ct_1', 'problem_id': '1001'})
+        self.assertIsNone(self.response_cache.get(('contest', 'hdu', '1'), ()))
+
+
+class FieldsTest(ViewTestCase):
+    def test_empty_field_list_uses_defaults(self):
+        db.session.add(Problem(oj_name='hdu', problem_id='1000', last_update=datetime.utcnow(), title='A + B'))
+        db.session.commit()
+        with mock.patch.object(views, 'problem_catalog', ProblemCatalog()):
+            response = self.client.get('/problems/?oj_name=hdu&fields=,')
+        self.assertEqual(response.get_json()['problems'], [{'oj_name': 'hdu', 'problem_id': '1000', 'title': 'A + B'}])
+        response = self.client.get('/problems/hdu/1000?fields=title,,')
+        self.assertEqual(response.get_json(), {'title': 'A + B'})
+
+    def test_unknown_field(self):
+        response = self.client.get('/problems/hdu/1000?fields=title,secret')
+        self.assertEqual(response.status_code, 422)
+
+
+class CountTest(ViewTestCase):
+    def test_list_count_comes_from_counters(self):
+        with mock.patch.object(views.Counter, 'get', return_value=42) as get:
+            response = self.client.get('/submissions/?oj_name=hdu&per_page=0')
+        self.assertEqual(response.get_json()['count'], 42)
+        get.assert_called_once_with(views.counter_name('submissions', 'oj_name', 'hdu'))
+
+
+class WaitSubmissionTest(ViewTestCase):
+    def setUp(self):
+        super().setUp()
+        submission = Submission(oj_name='hdu', problem_id='1000', language='G++', source_code='code')
+        db.session.add(submission)
+        db.session.commit()
+        self.id = submission.id
+        db.session.remove()
+
+    def test_wakes_up_on_event(self):
+        responses = []
+        thread = threading.Thread(target=lambda: responses.append(
+            self.client.get(f'/submissions/{self.id}/wait?verdict=Queuing&timeout=10')))
+        started = time.monotonic()
+        thread.start()
+        while not views.submission_watcher._waiters and time.monotonic() - started < 5:
+            time.sleep(0.01)
+        views.submission_watcher.notify({'id': self.id + 1, 'verdict': 'Accepted'})
+        views.submission_watcher.notify({'id': self.id, 'user_id': 'u', 'verdict': 'Accepted'})
+        thread.join(5)
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(responses[0].get_json(), {'id': self.id, 'verdict': 'Accepted'})
+        self.assertFalse(views.submission_watcher._waiters)
+
+    def test_returns_at_once_when_verdict_changed(self):
+        response = self.client.get(f'/submissions/{self.id}/wait?verdict=Being Judged&timeout=10')
+        self.assertEqual(response.get_json()['verdict'], 'Queuing')
+
+    def test_times_out(self):
+        response = self.client.get(f'/submissions/{self.id}/wait?verdict=Queuing&timeout=0.1')
+        self.assertEqual(response.get_json()['verdict'], 'Queuing')
+        self.assertEqual(self.client.get(f'/submissions/{self.id + 1}/wait').status_code, 404)
+
+
+class WorkerControlTest(ViewTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(views, 'ADMIN_TOKEN', 'secret')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(views, 'publish')
+        self.views_publish = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.headers = {'Authorization': 'Bearer secret'}
+
+    def test_requires_token(self):
+        self.assertEqual(self.client.post('/admin/workers/hdu', data={'action': 'pause'}).status_code, 401)
+        with mock.patch.object(views, 'ADMIN_TOKEN', None):
+            response = self.client.post('/admin/workers/hdu', data={'action': 'pause'}, headers=self.headers)
+        self.assertEqual(response.status_code, 403)
+        self.views_publish.assert_not_called()
+
+    def test_control(self):
+        response = self.client.post('/admin/workers/hdu', data={'action': 'scale', 'target': 'submitter',
+                                                                'count': '3'}, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.views_publish.assert_called_once_with('control', action='scale', oj_name='hdu', target='submitter',
+                                                   count=3)
+        for data in ({'action': 'restart'}, {'action': 'pause', 'target': 'poller'}, {'action': 'scale'}):
+            self.assertEqual(self.client.post('/admin/workers/hdu', data=data, headers=self.headers).status_code, 422)
+
+    def test_worker_state_drops_stale_processes(self):
+        now = time.time()
+        states = {b'fresh': json.dumps({'time': now, 'submitters': []}).encode(),
+                  b'stale': json.dumps({'time': now - 3600}).encode(), b'broken': b'{'}
+        with mock.patch.object(views, 'redis_con') as redis_con:
+            redis_con.hgetall.return_value = states
+            response = self.client.get('/admin/workers', headers=self.headers)
+        self.assertEqual(response.get_json(), {'workers': {'fresh': {'time': now, 'submitters': []}}})
+        self.assertEqual(sorted(redis_con.hdel.call_args[0][1:]), ['broken', 'stale'])
@@ -0,0 +1,116 @@
+import time
+from queue import Queue
+from unittest import mock
+
+from vjudge.main import Submitter, SubmitterHandler
+from vjudge.models import db, Submission
+from vjudge.site import exceptions
+from vjudge.site.retry import CircuitBreaker
+
+from . import DatabaseTestCase
+
+
+class StatusCrawler(object):
+    def start(self):
+        pass
+
+    def wait_start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def join(self):
+        pass
+
+    def in_flight(self):
+        return []
+
+
+class Client(object):
+    def __init__(self, breaker):
+        self.breaker = breaker
+        self.submits = 0
+
+    def get_name(self):
+        return 'hdu'
+
+    def get_user_id(self):
+        return 'user'
+
+    def get_breaker(self):
+        return self.breaker
+
+    def submit_problem(self, problem_id, language, source_code):
+        self.submits += 1
+        raise exceptions.CircuitOpen('Circuit breaker of hdu is open')
+
+
+class SubmitterTest(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        submission = Submission(oj_name='hdu', problem_id='1000', language='G++', source_code='int main() {}')
+        db.session.add(submission)
+        db.session.commit()
+        self.task = (submission.id, None)
+        self.breaker = CircuitBreaker('hdu', threshold=1, cooldown=60, max_cooldown=60)
+        self.breaker.record_failure()
+        self.client = Client(self.breaker)
+        self.queue = Queue()
+        self.queue.put(self.task)
+        self.submitter = Submitter(self.client, self.queue, StatusCrawler(), daemon=True)
+
+    def tearDown(self):
+        self.submitter.stop(drain=False)
+        self.submitter.join(5)
+        self.assertFalse(self.submitter.is_alive())
+        self.assertEqual(list(self.queue.queue), [self.task])
+        self.assertEqual(Submission.query.get(self.task[0]).verdict, 'Queuing')
+
+    def test_waits_for_open_breaker(self):
+        self.submitter.start()
+        time.sleep(0.5)
+        self.assertEqual(self.client.submits, 1)
+
+    def test_draining_worker_waits_for_open_breaker(self):
+        self.submitter.stop()
+        self.submitter.start()
+        time.sleep(0.5)
+        self.assertEqual(self.client.submits, 1)
+
+
+class Stop(Exception):
+    pass
+
+
+class SubmitterHandlerTest(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        submission = Submission(oj_name='hdu', problem_id='1000', language='G++', source_code='int main() {}')
+        db.session.add(submission)
+        db.session.commit()
+        self.submission_id = submission.id
+        self.handler = SubmitterHandler({'hdu': [('user', 'password')]}, {}, daemon=True)
+        self.handler._redis_con = mock.Mock()
+        self.handler._redis_con.brpop.side_effect = [(b'queue', str(self.submission_id).encode()), Stop()]
+
+    def run_handler(self, error):
+        with mock.patch('vjudge.main.get_client_by_oj_name', side_effect=error):
+            with self.assertRaises(Stop):
+                self.handler.run()
+        db.session.remove()
+        return Submission.query.get(self.submission_id)
+
+    @mock.patch.dict('vjudge.main.CIRCUIT_BREAKER_CONFIG', cooldown=0.5)
+    def test_parks_tasks_while_site_is_unreachable(self):
+        submission = self.run_handler(exceptions.ConnectionError('Request failed'))
+        self.assertEqual(submission.verdict, 'Queuing')
+        self.assertEqual(self.handler.state()['hdu']['held'], 1)
+        self.handler._retry_timers['hdu'].join(5)
+        self.assertEqual(self.handler.state()['hdu']['held'], 0)
+        self.handler._redis_con.lpush.assert_called_with(self.handler._redis_key, self.submission_id)
+
+    def test_fails_tasks_on_login_errors(self):
+        submission = self.run_handler(exceptions.PasswordError('Wrong password'))
+        self.assertEqual(submission.verdict, 'Submit Failed')
+        self.assertEqual(self.handler._held, {})
@@ -0,0 +1,53 @@
+import gzip
+import io
+import json
+import os
+import tempfile
+import time
+from unittest import mock
+
+from vjudge.models import Submission
+from vjudge.workload import WorkloadRecorder, replay_workload
+
+from . import DatabaseTestCase
+
+
+class WorkloadRecorderTest(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.temp_dir = temp_dir.name
+
+    def test_capture_path_per_process(self):
+        recorder = WorkloadRecorder(os.path.join(self.temp_dir, 'capture.ndjson.gz'))
+        self.assertEqual(recorder.capture_path(42), os.path.join(self.temp_dir, 'capture.ndjson.42.gz'))
+        recorder = WorkloadRecorder(os.path.join(self.temp_dir, 'capture.ndjson'))
+        self.assertEqual(recorder.capture_path(42), os.path.join(self.temp_dir, 'capture.ndjson.42'))
+
+    def test_writes_gzip(self):
+        recorder = WorkloadRecorder(os.path.join(self.temp_dir, 'capture.ndjson.gz'))
+        recorder.record('crawler', {'oj_name': 'hdu'})
+        recorder.start()
+        path = recorder.capture_path(os.getpid())
+        records = []
+        deadline = time.monotonic() + 5
+        while not records and time.monotonic() < deadline:
+            time.sleep(0.01)
+            try:
+                with gzip.open(path, 'rt') as f:
+                    records = [json.loads(x) for x in f]
+            except (OSError, EOFError):
+                pass
+        self.assertEqual([x[1:] for x in records], [['crawler', {'oj_name': 'hdu'}]])
+
+    def test_replay_merges_files_by_time(self):
+        first = io.StringIO('[1.0,"crawler",{"n":1}]\n[3.0,"crawler",{"n":3}]\n')
+        second = io.StringIO('[2.0,"submitter",{"oj_name":"hdu","problem_id":"1000","language":"G++"}]\n'
+                             '\n[4.0,"crawler",{"n":4}]\n')
+        with mock.patch('vjudge.workload.redis.StrictRedis') as redis_con:
+            counts = replay_workload([first, second], 'code', speed=1000)
+        pushed = [x[0][1] for x in redis_con.return_value.lpush.call_args_list]
+        submission = Submission.query.one()
+        self.assertEqual(pushed, ['{"n": 1}', submission.id, '{"n": 3}', '{"n": 4}'])
+        self.assertEqual(counts, {'crawler': 3, 'submitter': 1})
@@ -0,0 +1,158 @@
+import queue
+import threading
+import time
+from collections import Counter
+
+import redis
+import requests
+
+from config import REDIS_CONFIG, logger
+from . import metrics
+from .report import lifecycle_report, percentile, report_percentiles
+
+pending_verdicts = ('Queuing', 'Being Judged')
+
+default_source_code = '''#include <stdio.h>
+
+int main() {
+    int a, b;
+    while (scanf("%d %d", &a, &b) == 2) printf("%d\\n", a + b);
+    return 0;
+}
+'''
+
+
+def _sample_value(snapshot, name):
+    for metric in snapshot:
+        if metric['name'] == name and metric['samples']:
+            return metric['samples'][0][2]
+
+
+class Benchmark(object):
+    def __init__(self, api_url, oj_name, problem_ids, language, source_code, rate, count,
+                 concurrency=64, timeout=300):
+        self.api_url = api_url.rstrip('/')
+        self.oj_name = oj_name
+        self.problem_ids = problem_ids
+        self.language = language
+        self.source_code = source_code
+        self.rate = rate
+        self.count = count
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self._results = []
+        self._lock = threading.Lock()
+        self._redis_con = redis.StrictRedis(host=REDIS_CONFIG['host'], port=REDIS_CONFIG['port'],
+                                            db=REDIS_CONFIG['db'])
+
+    def run(self):
+        usage_before = self._worker_usage()
+        tasks = queue.Queue()
+        workers = [threading.Thread(target=self._work, args=(tasks,), daemon=True) for _ in range(self.concurrency)]
+        for worker in workers:
+            worker.start()
+        started = time.time()
+        for i in range(self.count):
+            delay = started + i / self.rate - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            tasks.put(self.problem_ids[i % len(self.problem_ids)])
+        send_duration = time.time() - started
+        for _ in workers:
+            tasks.put(None)
+        for worker in workers:
+            worker.join()
+        duration = time.time() - started
+        return self._summarize(started, duration, send_duration, usage_before, self._worker_usage())
+
+    def _work(self, tasks):
+        session = requests.session()
+        while True:
+            problem_id = tasks.get()
+            if problem_id is None:
+                return
+            result = self._run_one(session, problem_id)
+            with self._lock:
+                self._results.append(result)
+
+    def _run_one(self, session, problem_id):
+        data = {'oj_name': self.oj_name, 'problem_id': problem_id, 'language': self.language,
+                'source_code': self.source_code}
+        sent_at = time.time()
+        try:
+            r = session.post(f'{self.api_url}/submissions/', data=data, timeout=30)
+            r.raise_for_status()
+            submission_id = r.json()['id']
+        except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+            logger.error(f'Benchmark submit failed, problem_id: {problem_id}, reason: {e}')
+            return {'id': None, 'submit_time': time.time() - sent_at, 'verdict': None}
+        result = {'id': submission_id, 'submit_time': time.time() - sent_at, 'verdict': 'Queuing'}
+        deadline = sent_at + self.timeout
+        while result['verdict'] in pending_verdicts and time.time() < deadline:
+            wait = min(deadline - time.time(), 30)
+            try:
+                r = session.get(f'{self.api_url}/submissions/{submission_id}/wait',
+                                params={'verdict': result['verdict'], 'timeout': wait}, timeout=wait + 10)
+                r.raise_for_status()
+                result['verdict'] = r.json()['verdict']
+            except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+                logger.error(f'Benchmark poll failed, submission_id: {submission_id}, reason: {e}')
+                time.sleep(1)
+        if result['verdict'] not in pending_verdicts:
+            result['latency'] = time.time() - sent_at
+        return result
+
+    def _worker_usage(self):
+        try:
+            snapshots = metrics.load_snapshots(self._redis_con)
+        except redis.exceptions.RedisError as e:
+            logger.error(f'Loaded worker metrics failed, reason: {e}')
+            return {}
+        return {process: (_sample_value(snapshot, 'process_cpu_seconds_total'),
+                          _sample_value(snapshot, 'process_resident_memory_bytes'))
+                for process, snapshot in snapshots.items() if process.startswith('worker:')}
+
+    def _summarize(self, started, duration, send_duration, usage_before, usage_after):
+        results = self._results
+        submitted = [x for x in results if x['id'] is not None]
+        judged = [x for x in submitted if 'latency' in x]
+        latencies = sorted(x['latency'] for x in judged)
+        submit_times = sorted(x['submit_time'] for x in results)
+        summary = {
+            'config': {'api_url': self.api_url, 'oj_name': self.oj_name, 'problem_ids': self.problem_ids,
+                       'language': self.language, 'rate': self.rate, 'count': self.count,
+                       'concurrency': self.concurrency, 'timeout': self.timeout},
+            'started_at': started,
+            'duration': duration,
+            'offered_rate': len(results) / send_duration if send_duration > 0 else None,
+            'submitted': len(submitted),
+            'submit_errors': len(results) - len(submitted),
+            'judged': len(judged),
+            'timed_out': len(submitted) - len(judged),
+            'throughput': len(judged) / duration if duration > 0 else None,
+            'verdicts': dict(Counter(x['verdict'] for x in judged)),
+            'submit_latency': self._percentiles(submit_times),
+            'latency': self._percentiles(latencies),
+            'stages': {},
+            'workers': {},
+        }
+        for row in lifecycle_report(group_by='oj_name', ids=[x['id'] for x in submitted]):
+            if row['group'] == '*':
+                summary['stages'][row['stage']] = {k: v for k, v in row.items() if k not in ('group', 'stage')}
+        for process, (cpu_after, rss) in usage_after.items():
+            cpu_before = usage_before.get(process, (None, None))[0]
+            cpu = cpu_after - cpu_before if None not in (cpu_before, cpu_after) else None
+            summary['workers'][process] = {
+                'cpu_seconds': cpu,
+                'cpu_percent': cpu / duration * 100 if cpu is not None and duration > 0 else None,
+                'rss_bytes': rss,
+            }
+        return summary
+
+    @staticmethod
+    def _percentiles(values):
+        if not values:
+            return {}
+        result = {f'p{p}': percentile(values, p) for p in report_percentiles}
+        result['max'] = values[-1]
+        return result
@@ -0,0 +1,69 @@
+import hashlib
+import zlib
+
+from sqlalchemy.types import TypeDecorator, LargeBinary
+
+# Substrings that recur across crawled problem statements. zlib weighs the end of a
+# preset dictionary most, so the most frequent fragments are kept last.
+STATEMENT_DICTIONARY = ''.join((
+    'Hint', 'Author', 'Source', 'Recommend', 'modulo 1000000007', '10^9', '10^5', '10^18',
+    'It is guaranteed that ', 'You may assume that ', 'For example, ', 'respectively.',
+    'separated by a single space', 'separated by spaces', 'a positive integer ', 'non-negative integer',
+    'the number of ', 'the answer ', 'the sum of ', 'the minimum ', 'the maximum ', 'in one line.',
+    'There are multiple test cases.', 'The input contains several test cases.',
+    'The first line of the input contains an integer T', 'indicating the number of test cases.',
+    'The first line contains an integer ', 'The first line of each test case contains ',
+    'Each test case contains ', 'Each test case starts with ', 'The next line contains ',
+    'The following ', 'lines follow', 'each line contains ', 'Input is terminated by ',
+    'end of file', 'For each test case, output ', 'For each test case, print ',
+    'Output the answer in a single line.', 'output a single line containing ',
+    '<sup>', '</sup>', '<sub>', '</sub>', '<b>', '</b>', '<i>', '</i>', '<p>', '</p>',
+    '<pre>', '</pre>', '<center>', '</center>', '<font face="Times New Roman">', '</font>',
+    '<img style="max-width:100%;" src="http://acm.hdu.edu.cn/data/images/', '.jpg">', '.gif">',
+    '<div style="font-family:Courier New,Courier,monospace;">', '</div>',
+    '<br />', '<br>', '&lt;', '&gt;', '&amp;', '&nbsp;',
+)).encode('utf-8')
+
+_FORMAT_STATEMENT = b'\x01'
+
+
+def compress(text):
+    return zlib.compress(text.encode('utf-8'))
+
+
+def decompress(data):
+    return zlib.decompress(data).decode('utf-8')
+
+
+def compress_statement(text):
+    compressor = zlib.compressobj(9, zdict=STATEMENT_DICTIONARY)
+    data = compressor.compress(text.encode('utf-8')) + compressor.flush()
+    return _FORMAT_STATEMENT + data
+
+
+def decompress_statement(data):
+    fmt, data = data[:1], data[1:]
+    if fmt == _FORMAT_STATEMENT:
+        decompressor = zlib.decompressobj(zdict=STATEMENT_DICTIONARY)
+        return (decompressor.decompress(data) + decompressor.flush()).decode('utf-8')
+    raise ValueError(f'Unknown statement format {fmt!r}')
+
+
+def digest(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class CompressedText(TypeDecorator):
+    impl = LargeBinary
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return compress_statement(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            return value
+        return decompress_statement(bytes(value))
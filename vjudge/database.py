@@ -1,8 +1,16 @@
-from sqlalchemy import create_engine, orm
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from sqlalchemy import create_engine, event, exc, orm, text
+from sqlalchemy.engine.url import make_url
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker, load_only, undefer_group
+from sqlalchemy.pool import QueuePool
 from math import ceil
-from config import SQLALCHEMY_DATABASE_URI
+from config import SQLALCHEMY_DATABASE_URI, SQLALCHEMY_REPLICA_URIS, DATABASE_CONFIG
 
 
 class Pagination(object):
@@ -53,7 +61,34 @@ class Pagination(object):
 
 
 class BaseQuery(orm.Query):
-    def paginate(self, page=1, per_page=20, error_out=True):
+    _bind_name = None
+
+    def on_replica(self):
+        query = self._clone()
+        query._bind_name = 'replica'
+        return query
+
+    def on_primary(self):
+        query = self._clone()
+        query._bind_name = 'primary'
+        return query
+
+    def _routed(self):
+        if self._bind_name is None:
+            return nullcontext()
+        return self.session.using(self._bind_name)
+
+    def __iter__(self):
+        with self._routed():
+            return super().__iter__()
+
+    def only(self, *fields):
+        return self.options(load_only(*fields))
+
+    def undefer(self, *groups):
+        return self.options(*[undefer_group(x) for x in groups])
+
+    def paginate(self, page=1, per_page=20, error_out=True, total=None):
         if page < 1:
             if error_out:
                 raise IndexError
@@ -72,19 +107,136 @@ class BaseQuery(orm.Query):
                 page = 1
         if page == 1 and len(items) < per_page:
             total = len(items)
-        else:
+        elif callable(total):
+            with self._routed():
+                total = total()
+        elif total is None:
             total = self.order_by(None).count()
         return Pagination(self, page, per_page, total, items)
 
 
+_replica_lag_queries = {
+    'postgresql': text('SELECT CASE WHEN NOT pg_is_in_recovery() '
+                       'OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+                       'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'),
+}
+
+
+class ReplicaSet(object):
+    def __init__(self, engines, max_lag, check_interval):
+        self._engines = engines
+        self._max_lag = max_lag
+        self._check_interval = check_interval
+        self._healthy = list(engines)
+        self._checker_pid = None
+        self._lock = threading.Lock()
+
+    def choose(self):
+        if not self._engines:
+            return None
+        if self._checker_pid != os.getpid():
+            self._start_checker()
+        healthy = self._healthy
+        if not healthy:
+            return None
+        return random.choice(healthy)
+
+    def _start_checker(self):
+        # The checker is started lazily so that every forked web worker runs
+        # its own instead of inheriting a dead thread from the master.
+        with self._lock:
+            if self._checker_pid == os.getpid():
+                return
+            self._checker_pid = os.getpid()
+            threading.Thread(target=self._check_forever, name='replica-checker', daemon=True).start()
+
+    def _check_forever(self):
+        while True:
+            self._healthy = [x for x in self._engines if self._is_healthy(x)]
+            time.sleep(self._check_interval)
+
+    def _is_healthy(self, engine):
+        # Backends without a replication lag query (e.g. a copied SQLite file)
+        # are only checked for reachability.
+        query = _replica_lag_queries.get(engine.dialect.name, text('SELECT 0'))
+        try:
+            with engine.connect() as connection:
+                lag = connection.execute(query).scalar()
+        except exc.SQLAlchemyError:
+            return False
+        return lag is None or lag <= self._max_lag
+
+
+class RoutingSession(orm.Session):
+    def __init__(self, replicas=None, **kwargs):
+        super().__init__(**kwargs)
+        self.replicas = replicas
+        self.bind_name = None
+
+    def get_bind(self, mapper=None, clause=None):
+        if self.bind_name == 'replica' and self.replicas is not None and not self._flushing:
+            engine = self.replicas.choose()
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper, clause)
+
+    @contextmanager
+    def using(self, bind_name):
+        previous, self.bind_name = self.bind_name, bind_name
+        try:
+            yield self
+        finally:
+            self.bind_name = previous
+
+
+def _create_sqlite_engine(url, profile):
+    connect_args = {'check_same_thread': False, 'timeout': profile['busy_timeout'] / 1000}
+    if url.database and url.database != ':memory:':
+        # Each pooled connection is used by one thread at a time, so sharing
+        # them across threads is safe once check_same_thread is off.
+        engine = create_engine(url, echo=False, connect_args=connect_args,
+                               poolclass=QueuePool, pool_size=profile['pool_size'],
+                               max_overflow=profile['max_overflow'])
+    else:
+        engine = create_engine(url, echo=False, connect_args=connect_args)
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode={profile['journal_mode']}")
+        cursor.execute(f"PRAGMA synchronous={profile['synchronous']}")
+        cursor.execute(f"PRAGMA busy_timeout={int(profile['busy_timeout'])}")
+        cursor.execute(f"PRAGMA mmap_size={int(profile['mmap_size'])}")
+        cursor.close()
+
+    return engine
+
+
+def _create_postgresql_engine(url, profile):
+    connect_args = {'options': f"-c statement_timeout={int(profile['statement_timeout'])}"}
+    return create_engine(url, echo=False, connect_args=connect_args,
+                         pool_size=profile['pool_size'], max_overflow=profile['max_overflow'],
+                         pool_recycle=profile['pool_recycle'], pool_pre_ping=profile['pool_pre_ping'])
+
+
+def create_engine_from_uri(uri):
+    url = make_url(uri)
+    backend = url.get_backend_name()
+    if backend == 'sqlite':
+        return _create_sqlite_engine(url, DATABASE_CONFIG['sqlite'])
+    if backend == 'postgresql':
+        return _create_postgresql_engine(url, DATABASE_CONFIG['postgresql'])
+    return create_engine(url, echo=False)
+
+
 class SQLManager(object):
     def __init__(self):
-        if 'sqlite' in SQLALCHEMY_DATABASE_URI:
-            connect_args = {'check_same_thread': False}
-            engine = create_engine(SQLALCHEMY_DATABASE_URI, echo=False, connect_args=connect_args)
-        else:
-            engine = create_engine(SQLALCHEMY_DATABASE_URI, echo=False)
-        session_factory = sessionmaker(bind=engine)
+        engine = self.engine = create_engine_from_uri(SQLALCHEMY_DATABASE_URI)
+        replica_profile = DATABASE_CONFIG['replica']
+        self.replicas = ReplicaSet([create_engine_from_uri(x) for x in SQLALCHEMY_REPLICA_URIS],
+                                   replica_profile['max_lag'], replica_profile['check_interval'])
+        session_factory = sessionmaker(bind=engine, class_=RoutingSession, query_cls=BaseQuery,
+                                       replicas=self.replicas)
         self._session = scoped_session(session_factory)
         self.Model = declarative_base(bind=engine)
         self.Model.query = self._session.query_property(query_cls=BaseQuery)
@@ -0,0 +1,119 @@
+import gzip
+import json
+import sys
+from contextlib import nullcontext
+from datetime import datetime
+
+from sqlalchemy import DateTime, Integer, inspect, text
+from sqlalchemy.orm import joinedload
+
+from .models import db, Submission, Problem, Contest
+
+dumped_models = {
+    'problems': Problem,
+    'contests': Contest,
+    'submissions': Submission,
+}
+
+
+def open_ndjson(path, mode):
+    if path == '-':
+        return nullcontext(sys.stdin if mode == 'r' else sys.stdout)
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def _columns(model):
+    return [x for x in inspect(model).column_attrs if x.key != 'source_digest']
+
+
+def _dump_row(obj, columns):
+    row = {}
+    for column in columns:
+        value = getattr(obj, column.key)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        row[column.key] = value
+    if isinstance(obj, Submission):
+        row['source_code'] = obj.source_code
+    return row
+
+
+def _load_row(model, row, columns):
+    for column in columns:
+        value = row.get(column.key)
+        if value is not None and isinstance(column.columns[0].type, DateTime):
+            row[column.key] = datetime.fromisoformat(value)
+    return model(**row)
+
+
+def export_ndjson(name, fp, batch_size=1000):
+    model = dumped_models[name]
+    columns = _columns(model)
+    query = model.query.order_by(*inspect(model).primary_key)
+    if model is Problem:
+        query = query.undefer('body')
+    if model is Submission:
+        query = query.options(joinedload(Submission.source))
+    count = 0
+    for obj in query.execution_options(stream_results=True).yield_per(batch_size):
+        fp.write(json.dumps(_dump_row(obj, columns), ensure_ascii=False))
+        fp.write('\n')
+        count += 1
+    db.session.remove()
+    return count
+
+
+def import_ndjson(name, fp, batch_size=500):
+    model = dumped_models[name]
+    columns = _columns(model)
+    primary_key = inspect(model).primary_key
+    count = 0
+    batch = []
+
+    def flush():
+        keys = [tuple(row[x.key] for x in primary_key) for row in batch]
+        query = db.session.query(*primary_key)
+        for index, column in enumerate(primary_key):
+            query = query.filter(column.in_({x[index] for x in keys}))
+        existing = set(query)
+        objs = []
+        for key, row in zip(keys, batch):
+            if key not in existing:
+                existing.add(key)
+                objs.append(_load_row(model, row, columns))
+        db.session.add_all(objs)
+        db.session.commit()
+        db.session.expunge_all()
+        batch.clear()
+        return len(objs)
+
+    db.session.info['silent'] = True
+    try:
+        for line in fp:
+            line = line.strip()
+            if not line:
+                continue
+            batch.append(json.loads(line))
+            if len(batch) >= batch_size:
+                count += flush()
+        if batch:
+            count += flush()
+        _reset_sequence(model)
+    finally:
+        db.session.remove()
+    return count
+
+
+def _reset_sequence(model):
+    # Rows are inserted with their ids, so a PostgreSQL serial sequence has to
+    # be moved past them before the next insert that relies on it.
+    primary_key = inspect(model).primary_key
+    if db.engine.dialect.name != 'postgresql' or len(primary_key) != 1 or \
+            not isinstance(primary_key[0].type, Integer):
+        return
+    table, column = model.__tablename__, primary_key[0].name
+    db.session.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', '{column}'), "
+                            f"coalesce(max({column}), 1), max({column}) IS NOT NULL) FROM {table}"))
+    db.session.commit()
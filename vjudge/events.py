@@ -0,0 +1,68 @@
+import json
+import threading
+import time
+from collections import defaultdict
+
+import redis
+
+from config import REDIS_CONFIG, logger
+
+_redis_con = None
+
+
+def _get_redis():
+    global _redis_con
+    if _redis_con is None:
+        _redis_con = redis.StrictRedis(host=REDIS_CONFIG['host'], port=REDIS_CONFIG['port'], db=REDIS_CONFIG['db'])
+    return _redis_con
+
+
+def publish(kind, **payload):
+    try:
+        _get_redis().publish(REDIS_CONFIG['channel'][kind], json.dumps(payload))
+    except redis.exceptions.RedisError as e:
+        logger.error(f'Publish {kind} event failed, reason: {e}')
+
+
+class EventListener(threading.Thread):
+    def __init__(self, daemon=True):
+        super().__init__(daemon=daemon)
+        self._handlers = defaultdict(list)
+        self._kinds = {v: k for k, v in REDIS_CONFIG['channel'].items()}
+
+    def subscribe(self, kind, handler):
+        self._handlers[kind].append(handler)
+
+    def subscribe_to(self, kind):
+        def decorator(handler):
+            self.subscribe(kind, handler)
+            return handler
+
+        return decorator
+
+    def run(self):
+        while True:
+            try:
+                pubsub = _get_redis().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(*self._kinds)
+                for message in pubsub.listen():
+                    self._dispatch(message)
+            except redis.exceptions.RedisError as e:
+                logger.error(f'EventListener disconnected, reason: {e}')
+                time.sleep(5)
+
+    def _dispatch(self, message):
+        channel = message['channel']
+        if isinstance(channel, bytes):
+            channel = channel.decode()
+        kind = self._kinds.get(channel)
+        try:
+            payload = json.loads(message['data'])
+        except (TypeError, ValueError):
+            logger.error(f'EventListener: received corrupt data "{message["data"]}"')
+            return
+        for handler in self._handlers[kind]:
+            try:
+                handler(payload)
+            except Exception as e:
+                logger.exception(f'EventListener: {kind} handler failed, reason: {e}')
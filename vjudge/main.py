@@ -1,21 +1,35 @@
 import asyncio
 import json
+import os
+import signal
+import socket
 import threading
 import time
+from collections import defaultdict
 from datetime import datetime, timedelta, timezone
 from queue import Queue, Empty
 
 import redis
 from sqlalchemy import or_
+from sqlalchemy.exc import SQLAlchemyError
 
-from config import REDIS_CONFIG, logger
+from config import (REDIS_CONFIG, CIRCUIT_BREAKER_CONFIG, CONTEST_LIST_REFRESH_INTERVAL, CONTEST_PREWARM_CONFIG,
+                    WORKER_STATE_INTERVAL, logger)
+from .events import EventListener
+from .metrics import registry, MetricsPusher
 from .models import db, Submission, Problem, Contest
-from .site import get_client_by_oj_name, exceptions
+from .profiler import SamplingProfiler
+from .site import contest_clients, get_client_by_oj_name, exceptions
+
+submit_counter = registry.counter('vjudge_submits_total', 'Submissions sent to remote judges by account.',
+                                  ('oj_name', 'user_id', 'result'))
+poll_counter = registry.counter('vjudge_status_polls_total', 'Status polls sent to remote judges by account.',
+                                ('oj_name', 'user_id'))
 
 
 class StatusCrawler(threading.Thread):
     def __init__(self, client, daemon=None):
-        super().__init__(daemon=daemon)
+        super().__init__(name=f'status:{client.get_name()}:{client.get_user_id()}', daemon=daemon)
         self._client = client
         self._user_id = client.get_user_id()
         self._name = client.get_name()
@@ -24,6 +38,8 @@ class StatusCrawler(threading.Thread):
         self._tasks = []
         self._thread = None
         self._loop = None
+        self._in_flight = {}
+        self.last_error = None
 
     def run(self):
         self._thread = threading.current_thread()
@@ -54,23 +70,32 @@ class StatusCrawler(threading.Thread):
         self._stop_event.set()
         self._loop.call_soon_threadsafe(self._loop.stop)
 
+    def in_flight(self):
+        return [{'submission_id': k, 'run_id': v} for k, v in list(self._in_flight.items())]
+
     async def _crawl_status(self, submission_id):
         submission = Submission.query.get(submission_id)
         if (not submission.run_id or submission.oj_name != self._name
                 or submission.verdict != 'Being Judged'):
             return
+        self._in_flight[submission.id] = submission.run_id
+        try:
+            await self._poll_status(submission)
+        finally:
+            self._in_flight.pop(submission.id, None)
+
+    async def _poll_status(self, submission):
         for delay in range(120):
             await asyncio.sleep(delay)
+            poll_counter.inc(self._name, self._user_id)
             try:
                 verdict, exe_time, exe_mem = self._client.get_submit_status(
                     submission.run_id,
                     user_id=submission.user_id,
                     problem_id=submission.problem_id)
             except exceptions.ConnectionError as e:
-                submission.verdict = 'Judge Failed'
-                db.session.commit()
-                logger.error(f'Crawled status failed, submission_id: {submission.id}, reason: {e}')
-                return
+                await self._handle_connection_error(submission, e)
+                continue
             except exceptions.LoginRequired:
                 try:
                     self._client.update_cookies()
@@ -78,21 +103,31 @@ class StatusCrawler(threading.Thread):
                         f'StatusCrawler login expired, login again, name: {self._name}, user_id: {self._user_id}')
                     continue
                 except exceptions.ConnectionError as e:
-                    submission.verdict = 'Judge Failed'
-                    db.session.commit()
-                    logger.error(f'Crawled status failed, submission_id: {submission.id}, reason: {e}')
-                    return
+                    await self._handle_connection_error(submission, e)
+                    continue
+            if submission.first_polled_at is None:
+                submission.first_polled_at = datetime.utcnow()
             if verdict not in ('Being Judged', 'Queuing', 'Compiling', 'Running'):
                 submission.verdict = verdict
                 submission.exe_time = exe_time
                 submission.exe_mem = exe_mem
+                submission.judged_at = datetime.utcnow()
                 db.session.commit()
                 logger.info(
                     f'Crawled status successfully, submission_id: {submission.id}, verdict: {submission.verdict}')
                 return
         submission.verdict = 'Judge Failed'
+        submission.judged_at = datetime.utcnow()
         db.session.commit()
         logger.error(f'Crawled status failed, submission_id: {submission.id}, reason: Timeout')
+        self.last_error = _error_info(f'submission {submission.id}: Timeout')
+
+    async def _handle_connection_error(self, submission, e):
+        logger.warning(f'Crawled status failed, submission_id: {submission.id}, reason: {e}, will retry')
+        self.last_error = _error_info(f'submission {submission.id}: {e}')
+        breaker = self._client.get_breaker()
+        if breaker.is_open:
+            await asyncio.sleep(max(breaker.retry_after(), 1))
 
     def _pending_tasks(self):
         if hasattr(asyncio, 'all_tasks'):
@@ -105,54 +140,146 @@ class StatusCrawler(threading.Thread):
         return f'<StatusCrawler(oj_name={self._name}, user_id={self._user_id})>'
 
 
-class Submitter(threading.Thread):
-    def __init__(self, client, submit_queue, status_crawler, daemon=None):
-        super().__init__(daemon=daemon)
+def _error_info(message):
+    return {'time': time.time(), 'message': message}
+
+
+class _Worker(threading.Thread):
+    def __init__(self, role, client, daemon=None):
+        super().__init__(name=f'{role}:{client.get_name()}:{client.get_user_id()}', daemon=daemon)
         self._client = client
         self._user_id = client.get_user_id()
         self._name = client.get_name()
+        self._stop_event = threading.Event()
+        self._abort_event = threading.Event()
+        self._resume_event = threading.Event()
+        self._resume_event.set()
+        self._drain = True
+        self.current = None
+        self.last_error = None
+
+    @property
+    def oj_name(self):
+        return self._name
+
+    def stop(self, drain=True):
+        self._drain = drain
+        self._stop_event.set()
+        if not drain:
+            self._abort_event.set()
+
+    def pause(self):
+        self._resume_event.clear()
+
+    def resume(self):
+        self._resume_event.set()
+
+    def state(self):
+        return {
+            'user_id': self._user_id,
+            'alive': self.is_alive(),
+            'paused': not self._resume_event.is_set(),
+            'stopping': self._stop_event.is_set(),
+            'current': self.current,
+            'last_error': self.last_error,
+        }
+
+    def _wait_for_site(self):
+        breaker = self._client.get_breaker()
+        if not breaker.is_open:
+            return False
+        logger.warning(f'Site {breaker.site} is unavailable, pausing {self.name}')
+        db.session.remove()
+        # A draining worker still has to wait here, otherwise it would pull
+        # the requeued task again at once and spin while the site is down.
+        self._abort_event.wait(max(breaker.retry_after(), 1))
+        return True
+
+    def _next_task(self, task_queue):
+        self.current = None
+        while True:
+            if self._stop_event.is_set() and not self._drain:
+                return None
+            if not self._resume_event.wait(60):
+                if self._stop_event.is_set():
+                    return None
+                continue
+            try:
+                task = task_queue.get(timeout=60)
+            except Empty:
+                if self._stop_event.is_set():
+                    return None
+                continue
+            if self._resume_event.is_set() and not (self._stop_event.is_set() and not self._drain):
+                return task
+            task_queue.put(task)
+
+
+class Submitter(_Worker):
+    def __init__(self, client, submit_queue, status_crawler, daemon=None):
+        super().__init__('submitter', client, daemon)
         self._submit_queue = submit_queue
         self._status_crawler = status_crawler
-        self._stop_event = threading.Event()
+
+    def state(self):
+        return dict(super().state(), in_flight=self._status_crawler.in_flight(),
+                    status_error=self._status_crawler.last_error)
 
     def run(self):
         self._status_crawler.start()
         self._status_crawler.wait_start()
         logger.info(f'Started submitter, name: {self._name}, user_id: {self._user_id}')
         while True:
-            try:
-                submission = Submission.query.get(self._submit_queue.get(timeout=60))
-            except Empty:
-                if self._stop_event.is_set():
-                    break
-                continue
+            task = self._next_task(self._submit_queue)
+            if task is None:
+                break
+            submission_id, dequeued_at = task
+            self.current = submission_id
+            submission = Submission.query.get(submission_id)
             logger.info(f'Start judging submission {submission.id}, verdict: {submission.verdict}')
             if submission.verdict not in ('Queuing', 'Being Judged'):
                 continue
+            submission.dequeued_at = dequeued_at
+            submission.picked_at = datetime.utcnow()
             if submission.verdict == 'Being Judged':
+                db.session.commit()
                 self._status_crawler.add_task(submission.id)
                 continue
             try:
                 run_id = self._client.submit_problem(
                     submission.problem_id, submission.language, submission.source_code)
             except (exceptions.SubmitError, exceptions.ConnectionError) as e:
+                if isinstance(e, exceptions.ConnectionError) and self._wait_for_site():
+                    self._submit_queue.put((submission.id, dequeued_at))
+                    continue
+                submit_counter.inc(self._name, self._user_id, 'failed')
                 submission.verdict = 'Submit Failed'
+                submission.judged_at = datetime.utcnow()
                 db.session.commit()
                 logger.error(f'Submission {submission.id} is submitted failed, reason: {e}')
+                self.last_error = _error_info(f'submission {submission.id}: {e}')
             except exceptions.LoginRequired:
+                submit_counter.inc(self._name, self._user_id, 'login_required')
                 try:
                     self._client.update_cookies()
-                    self._submit_queue.put(submission.id)
+                    self._submit_queue.put((submission.id, dequeued_at))
                     logger.debug(
                         f'Submitter login is expired, login again, name: {self._name}, user_id: {self._user_id}')
                 except exceptions.ConnectionError as e:
+                    if self._wait_for_site():
+                        self._submit_queue.put((submission.id, dequeued_at))
+                        continue
                     submission.verdict = 'Submit Failed'
+                    submission.judged_at = datetime.utcnow()
                     db.session.commit()
                     logger.error(f'Submission {submission.id} is submitted failed, reason: {e}')
+                    self.last_error = _error_info(f'submission {submission.id}: {e}')
             else:
+                submit_counter.inc(self._name, self._user_id, 'success')
                 submission.run_id = run_id
                 submission.user_id = self._user_id
                 submission.verdict = 'Being Judged'
+                submission.submitted_at = datetime.utcnow()
                 db.session.commit()
                 logger.info(f'Submission {submission.id} is submitted successfully')
                 self._status_crawler.add_task(submission.id)
@@ -162,35 +289,26 @@ class Submitter(threading.Thread):
         self._status_crawler.join()
         logger.info(f'Stopped submitter, name: {self._name}, user_id: {self._user_id}')
 
-    def stop(self):
-        self._stop_event.set()
-
     def __repr__(self):
         return f'<Submitter(oj_name={self._name}, user_id={self._user_id})>'
 
 
-class PageCrawler(threading.Thread):
+class PageCrawler(_Worker):
     def __init__(self, client, page_queue, daemon=None):
-        super().__init__(daemon=daemon)
-        self._client = client
-        self._name = client.get_name()
-        self._user_id = client.get_user_id()
+        super().__init__('crawler', client, daemon)
         self._client_type = client.get_client_type()
         self._supported_crawl_type = ['problem']
         if self._client_type == 'contest':
             self._supported_crawl_type.append('contest')
         self._page_queue = page_queue
-        self._stop_event = threading.Event()
 
     def run(self):
         logger.info(f'Started PageCrawler, name: {self._name}, user_id: {self._user_id}')
         while True:
-            try:
-                data = self._page_queue.get(timeout=60)
-            except Empty:
-                if self._stop_event.is_set():
-                    break
-                continue
+            data = self._next_task(self._page_queue)
+            if data is None:
+                break
+            self.current = data
             if not isinstance(data, dict):
                 logger.error(f'PageCrawler: data type should be dict, data: "{data}"')
                 continue
@@ -209,6 +327,9 @@ class PageCrawler(threading.Thread):
                     self._crawl_contest()
             except exceptions.ConnectionError as e:
                 logger.error(f'Crawled page failed, name: {self._name}, user_id: {self._user_id}, reason: {e}')
+                self.last_error = _error_info(str(e))
+                if self._wait_for_site():
+                    self._page_queue.put(data)
             except exceptions.LoginRequired:
                 try:
                     self._client.update_cookies()
@@ -217,11 +338,9 @@ class PageCrawler(threading.Thread):
                         f'PageCrawler login expired, login again, name: {self._name}, user_id: {self._user_id}')
                 except exceptions.ConnectionError as e:
                     logger.error(f'Crawled contest failed, name: {self._name}, user_id: {self._user_id}, reason: {e}')
+                    self.last_error = _error_info(str(e))
         logger.info(f'Stopped PageCrawler, name: {self._name}, user_id: {self._user_id}')
 
-    def stop(self):
-        self._stop_event.set()
-
     def _crawl_problem(self, problem_id):
         result = self._client.get_problem(problem_id)
         if not isinstance(result, dict):
@@ -271,7 +390,7 @@ class PageCrawler(threading.Thread):
 
 class SubmitterHandler(threading.Thread):
     def __init__(self, normal_accounts, contest_accounts, daemon=None):
-        super().__init__(daemon=daemon)
+        super().__init__(name='submitter-handler', daemon=daemon)
         self._redis_key = REDIS_CONFIG['queue']['submitter_queue']
         self._redis_con = redis.StrictRedis(
             host=REDIS_CONFIG['host'], port=REDIS_CONFIG['port'], db=REDIS_CONFIG['db'])
@@ -280,14 +399,25 @@ class SubmitterHandler(threading.Thread):
         self._running_submitters = {}
         self._stopping_submitters = set()
         self._queues = {}
+        self._states = {}
+        self._limits = {}
+        self._held = defaultdict(list)
+        self._unreachable = set()
+        self._retry_timers = {}
+        self._lock = threading.RLock()
+        registry.gauge('vjudge_submit_queue_size', 'Submissions waiting in the per-oj submit queue.',
+                       ('oj_name',), function=self._queue_sizes)
+        registry.gauge('vjudge_submitters', 'Submitter threads by state.', ('state',), function=self._submitter_counts)
 
     def run(self):
         self._scan_unfinished_tasks()
         last_clean = datetime.utcnow()
         while True:
             data = self._redis_con.brpop(self._redis_key, timeout=600)
+            dequeued_at = datetime.utcnow()
             if datetime.utcnow() - last_clean > timedelta(hours=1):
-                self._clean_free_submitters()
+                with self._lock:
+                    self._clean_free_submitters()
                 last_clean = datetime.utcnow()
             if not data:
                 continue
@@ -303,17 +433,123 @@ class SubmitterHandler(threading.Thread):
             if submission.oj_name not in self._normal_accounts and submission.oj_name not in self._contest_accounts:
                 logger.error(f'Unsupported oj_name: {submission.oj_name}')
                 continue
-            if submission.oj_name not in self._queues:
-                self._queues[submission.oj_name] = Queue()
-            submit_queue = self._queues.get(submission.oj_name)
-            if submission.oj_name not in self._running_submitters:
-                if not self._start_new_submitters(submission.oj_name, submit_queue):
-                    submission.verdict = 'Submit Failed'
-                    db.session.commit()
-                    logger.error(f'Cannot start client for {submission.oj_name}')
+            oj_name = submission.oj_name
+            task = (submission.id, dequeued_at)
+            with self._lock:
+                if self._states.get(oj_name) == 'draining':
+                    self._held[oj_name].append(task)
+                    continue
+                submit_queue = self._queues.setdefault(oj_name, Queue())
+                if oj_name in self._running_submitters:
+                    submit_queue.put(task)
+                    continue
+            started = self._start_new_submitters(oj_name, submit_queue)
+            with self._lock:
+                if self._states.get(oj_name) == 'draining':
+                    self._held[oj_name].append(task)
                     continue
-            assert submission.oj_name in self._running_submitters
-            submit_queue.put(submission.id)
+                if started or oj_name in self._running_submitters:
+                    submit_queue.put(task)
+                    continue
+                if oj_name in self._unreachable:
+                    self._park(oj_name, task)
+                    continue
+            submission.verdict = 'Submit Failed'
+            submission.dequeued_at = dequeued_at
+            submission.judged_at = datetime.utcnow()
+            db.session.commit()
+            logger.error(f'Cannot start client for {oj_name}')
+
+    def control(self, action, oj_name, count=None):
+        start_queue = None
+        with self._lock:
+            submitters = self._running_submitters.get(oj_name, {}).get('submitters', {})
+            if action == 'pause':
+                self._states[oj_name] = 'paused'
+                for submitter in submitters.values():
+                    submitter.pause()
+            elif action == 'resume':
+                self._states.pop(oj_name, None)
+                for submitter in submitters.values():
+                    submitter.resume()
+                held = self._held.pop(oj_name, [])
+                if held:
+                    submit_queue = self._queues.setdefault(oj_name, Queue())
+                    for task in held:
+                        submit_queue.put(task)
+                    if oj_name not in self._running_submitters:
+                        start_queue = submit_queue
+            elif action == 'drain':
+                self._states[oj_name] = 'draining'
+                self._running_submitters.pop(oj_name, None)
+                for submitter in submitters.values():
+                    submitter.resume()
+                    submitter.stop()
+                    self._stopping_submitters.add(submitter)
+            elif action == 'scale':
+                self._limits[oj_name] = count
+                while len(submitters) > count:
+                    user_id, submitter = submitters.popitem()
+                    submitter.stop(drain=False)
+                    self._stopping_submitters.add(submitter)
+                if oj_name in self._running_submitters and len(submitters) < count:
+                    start_queue = self._queues[oj_name]
+        if start_queue is not None and not self._start_new_submitters(oj_name, start_queue):
+            logger.error(f'Cannot start client for {oj_name}')
+        logger.info(f'SubmitterHandler: {action} {oj_name}, count: {count}')
+
+    def prewarm(self, oj_name):
+        with self._lock:
+            if oj_name in self._running_submitters or self._states.get(oj_name) == 'draining':
+                return False
+            submit_queue = self._queues.setdefault(oj_name, Queue())
+        return self._start_new_submitters(oj_name, submit_queue)
+
+    def state(self):
+        result = {}
+        with self._lock:
+            stopping = [x for x in self._stopping_submitters if x.is_alive()]
+            for oj_name in set(self._queues) | set(self._running_submitters) | set(self._states):
+                submitters = self._running_submitters.get(oj_name, {}).get('submitters', {})
+                result[oj_name] = {
+                    'state': self._states.get(oj_name, 'running' if submitters else 'idle'),
+                    'queue': self._queues[oj_name].qsize() if oj_name in self._queues else 0,
+                    'held': len(self._held.get(oj_name, ())),
+                    'limit': self._limits.get(oj_name),
+                    'workers': [x.state() for x in submitters.values()],
+                    'stopping': [x.state() for x in stopping if x.oj_name == oj_name],
+                }
+        return result
+
+    def _queue_sizes(self):
+        return {(oj_name,): queue.qsize() for oj_name, queue in list(self._queues.items())}
+
+    def _park(self, oj_name, task):
+        # The site could not be reached while logging in, so the task is held
+        # and pushed back to Redis later instead of failing the submission.
+        self._held[oj_name].append(task)
+        if oj_name not in self._retry_timers:
+            logger.warning(f'Site {oj_name} is unreachable, holding its submissions')
+            timer = threading.Timer(CIRCUIT_BREAKER_CONFIG['cooldown'], self._release_parked, (oj_name,))
+            timer.daemon = True
+            self._retry_timers[oj_name] = timer
+            timer.start()
+
+    def _release_parked(self, oj_name):
+        with self._lock:
+            self._retry_timers.pop(oj_name, None)
+            if self._states.get(oj_name) == 'draining':
+                return
+            held = self._held.pop(oj_name, [])
+        try:
+            for submission_id, dequeued_at in held:
+                self._redis_con.lpush(self._redis_key, submission_id)
+        except redis.exceptions.RedisError as e:
+            logger.error(f'Released held submissions failed, name: {oj_name}, reason: {e}')
+
+    def _submitter_counts(self):
+        running = sum(len(x['submitters']) for x in list(self._running_submitters.values()))
+        return {('running',): running, ('stopping',): len(self._stopping_submitters)}
 
     def _scan_unfinished_tasks(self):
         submissions = Submission.query.filter(
@@ -321,28 +557,53 @@ class SubmitterHandler(threading.Thread):
         for submission in submissions:
             self._redis_con.lpush(self._redis_key, submission.id)
 
-    def _start_new_submitters(self, oj_name, submit_queue):
-        submitter_info = {'submitters': {}}
-        submitters = submitter_info.get('submitters')
-        accounts = {}
-        if oj_name in self._normal_accounts:
-            accounts = self._normal_accounts[oj_name]
+    def _accounts(self, oj_name):
         if oj_name in self._contest_accounts:
-            accounts = self._contest_accounts[oj_name]
-        for auth in accounts:
+            return self._contest_accounts[oj_name]
+        return self._normal_accounts.get(oj_name, {})
+
+    def _start_new_submitters(self, oj_name, submit_queue):
+        # Creating a client logs in to the remote judge, so it is done without
+        # holding the lock and only the finished submitters are registered.
+        with self._lock:
+            accounts = self._accounts(oj_name)
+            submitters = self._running_submitters.get(oj_name, {}).get('submitters', {})
+            limit = self._limits.get(oj_name, len(accounts))
+            missing = [x for x in accounts if x[0] not in submitters][:max(limit - len(submitters), 0)]
+        created = []
+        errors = []
+        for auth in missing:
             try:
                 crawler = StatusCrawler(get_client_by_oj_name(oj_name, auth), daemon=True)
                 submitter = Submitter(get_client_by_oj_name(oj_name, auth), submit_queue, crawler, daemon=True)
             except exceptions.JudgeException as e:
-                logger.error(f'Create submitter failed, name: {oj_name}, user_id: auth[0], reason: {e}')
+                logger.error(f'Create submitter failed, name: {oj_name}, user_id: {auth[0]}, reason: {e}')
+                errors.append(e)
                 continue
-            submitter.start()
-            submitters[auth[0]] = submitter
-        if not submitters:
-            return False
-        submitter_info['start_time'] = datetime.utcnow()
-        self._running_submitters[oj_name] = submitter_info
-        return True
+            created.append((auth[0], submitter))
+        with self._lock:
+            if self._states.get(oj_name) == 'draining':
+                return False
+            submitter_info = self._running_submitters.get(oj_name) or {'submitters': {}}
+            submitters = submitter_info.get('submitters')
+            limit = self._limits.get(oj_name, len(accounts))
+            for user_id, submitter in created:
+                if len(submitters) >= limit or user_id in submitters:
+                    continue
+                if self._states.get(oj_name) == 'paused':
+                    submitter.pause()
+                submitter.start()
+                submitters[user_id] = submitter
+            if not submitters:
+                if errors and all(isinstance(x, exceptions.ConnectionError) for x in errors):
+                    self._unreachable.add(oj_name)
+                else:
+                    self._unreachable.discard(oj_name)
+                return False
+            self._unreachable.discard(oj_name)
+            submitter_info.setdefault('start_time', datetime.utcnow())
+            self._running_submitters[oj_name] = submitter_info
+            return True
 
     def _clean_free_submitters(self):
         free_clients = []
@@ -372,7 +633,7 @@ class SubmitterHandler(threading.Thread):
 
 class CrawlerHandler(threading.Thread):
     def __init__(self, normal_accounts, contest_accounts, daemon=None):
-        super().__init__(daemon=daemon)
+        super().__init__(name='crawler-handler', daemon=daemon)
         self._redis_key = REDIS_CONFIG['queue']['crawler_queue']
         self._redis_con = redis.StrictRedis(
             host=REDIS_CONFIG['host'], port=REDIS_CONFIG['port'], db=REDIS_CONFIG['db'])
@@ -381,13 +642,21 @@ class CrawlerHandler(threading.Thread):
         self._running_crawlers = {}
         self._stopping_crawlers = set()
         self._queues = {}
+        self._states = {}
+        self._limits = {}
+        self._held = defaultdict(list)
+        self._lock = threading.RLock()
+        registry.gauge('vjudge_crawl_queue_size', 'Crawl tasks waiting in the per-oj crawl queue.',
+                       ('oj_name',), function=self._queue_sizes)
+        registry.gauge('vjudge_crawlers', 'Page crawler threads by state.', ('state',), function=self._crawler_counts)
 
     def run(self):
         last_clean = datetime.utcnow()
         while True:
             data = self._redis_con.brpop(self._redis_key, timeout=600)
             if datetime.utcnow() - last_clean > timedelta(hours=1):
-                self._clean_free_crawlers()
+                with self._lock:
+                    self._clean_free_crawlers()
                 last_clean = datetime.utcnow()
             if not data:
                 continue
@@ -407,14 +676,6 @@ class CrawlerHandler(threading.Thread):
             if oj_name not in self._normal_accounts and oj_name not in self._contest_accounts:
                 logger.error(f'Unsupported oj_name: {oj_name}')
                 continue
-            if oj_name not in self._queues:
-                self._queues[oj_name] = Queue()
-            crawl_queue = self._queues.get(oj_name)
-            if oj_name not in self._running_crawlers:
-                if not self._start_new_crawlers(oj_name, crawl_queue):
-                    logger.error(f'Cannot start client for {oj_name}')
-                    continue
-            assert oj_name in self._running_crawlers
             if crawl_type == 'problem':
                 crawl_all = data.get('all')
                 problem_id = data.get('problem_id')
@@ -426,31 +687,124 @@ class CrawlerHandler(threading.Thread):
                 data = {'type': 'problem'}
                 if not crawl_all:
                     data['problem_id'] = problem_id
-                crawl_queue.put(data)
             elif crawl_type == 'contest':
-                crawl_queue.put({'type': 'contest'})
+                data = {'type': 'contest'}
+            with self._lock:
+                if self._states.get(oj_name) == 'draining':
+                    self._held[oj_name].append(data)
+                    continue
+                crawl_queue = self._queues.setdefault(oj_name, Queue())
+                if oj_name in self._running_crawlers:
+                    crawl_queue.put(data)
+                    continue
+            started = self._start_new_crawlers(oj_name, crawl_queue)
+            with self._lock:
+                if self._states.get(oj_name) == 'draining':
+                    self._held[oj_name].append(data)
+                    continue
+                if started or oj_name in self._running_crawlers:
+                    crawl_queue.put(data)
+                    continue
+            logger.error(f'Cannot start client for {oj_name}')
+
+    def control(self, action, oj_name, count=None):
+        start_queue = None
+        with self._lock:
+            crawlers = self._running_crawlers.get(oj_name, {}).get('crawlers', {})
+            if action == 'pause':
+                self._states[oj_name] = 'paused'
+                for crawler in crawlers.values():
+                    crawler.pause()
+            elif action == 'resume':
+                self._states.pop(oj_name, None)
+                for crawler in crawlers.values():
+                    crawler.resume()
+                held = self._held.pop(oj_name, [])
+                if held:
+                    crawl_queue = self._queues.setdefault(oj_name, Queue())
+                    for task in held:
+                        crawl_queue.put(task)
+                    if oj_name not in self._running_crawlers:
+                        start_queue = crawl_queue
+            elif action == 'drain':
+                self._states[oj_name] = 'draining'
+                self._running_crawlers.pop(oj_name, None)
+                for crawler in crawlers.values():
+                    crawler.resume()
+                    crawler.stop()
+                    self._stopping_crawlers.add(crawler)
+            elif action == 'scale':
+                self._limits[oj_name] = count
+                while len(crawlers) > count:
+                    user_id, crawler = crawlers.popitem()
+                    crawler.stop(drain=False)
+                    self._stopping_crawlers.add(crawler)
+                if oj_name in self._running_crawlers and len(crawlers) < count:
+                    start_queue = self._queues[oj_name]
+        if start_queue is not None and not self._start_new_crawlers(oj_name, start_queue):
+            logger.error(f'Cannot start client for {oj_name}')
+        logger.info(f'CrawlerHandler: {action} {oj_name}, count: {count}')
+
+    def state(self):
+        result = {}
+        with self._lock:
+            stopping = [x for x in self._stopping_crawlers if x.is_alive()]
+            for oj_name in set(self._queues) | set(self._running_crawlers) | set(self._states):
+                crawlers = self._running_crawlers.get(oj_name, {}).get('crawlers', {})
+                result[oj_name] = {
+                    'state': self._states.get(oj_name, 'running' if crawlers else 'idle'),
+                    'queue': self._queues[oj_name].qsize() if oj_name in self._queues else 0,
+                    'held': len(self._held.get(oj_name, ())),
+                    'limit': self._limits.get(oj_name),
+                    'workers': [x.state() for x in crawlers.values()],
+                    'stopping': [x.state() for x in stopping if x.oj_name == oj_name],
+                }
+        return result
+
+    def _queue_sizes(self):
+        return {(oj_name,): queue.qsize() for oj_name, queue in list(self._queues.items())}
+
+    def _crawler_counts(self):
+        running = sum(len(x['crawlers']) for x in list(self._running_crawlers.values()))
+        return {('running',): running, ('stopping',): len(self._stopping_crawlers)}
+
+    def _accounts(self, oj_name):
+        if oj_name in self._contest_accounts:
+            return self._contest_accounts[oj_name]
+        return self._normal_accounts.get(oj_name, {})
 
     def _start_new_crawlers(self, oj_name, crawl_queue):
-        crawler_info = {'crawlers': {}}
-        crawlers = crawler_info.get('crawlers')
-        accounts = {}
-        if oj_name in self._normal_accounts:
-            accounts = self._normal_accounts[oj_name]
-        if oj_name in self._contest_accounts:
-            accounts = self._contest_accounts[oj_name]
-        for auth in accounts:
+        with self._lock:
+            accounts = self._accounts(oj_name)
+            crawlers = self._running_crawlers.get(oj_name, {}).get('crawlers', {})
+            limit = self._limits.get(oj_name, len(accounts))
+            missing = [x for x in accounts if x[0] not in crawlers][:max(limit - len(crawlers), 0)]
+        created = []
+        for auth in missing:
             try:
                 crawler = PageCrawler(get_client_by_oj_name(oj_name, auth), crawl_queue, daemon=True)
             except exceptions.JudgeException as e:
                 logger.error(f'Create crawler failed, name: {oj_name}, user_id: {auth[0]}, reason: {e}')
                 continue
-            crawler.start()
-            crawlers[auth[0]] = crawler
-        if not crawlers:
-            return False
-        crawler_info['start_time'] = datetime.utcnow()
-        self._running_crawlers[oj_name] = crawler_info
-        return True
+            created.append((auth[0], crawler))
+        with self._lock:
+            if self._states.get(oj_name) == 'draining':
+                return False
+            crawler_info = self._running_crawlers.get(oj_name) or {'crawlers': {}}
+            crawlers = crawler_info.get('crawlers')
+            limit = self._limits.get(oj_name, len(accounts))
+            for user_id, crawler in created:
+                if len(crawlers) >= limit or user_id in crawlers:
+                    continue
+                if self._states.get(oj_name) == 'paused':
+                    crawler.pause()
+                crawler.start()
+                crawlers[user_id] = crawler
+            if not crawlers:
+                return False
+            crawler_info.setdefault('start_time', datetime.utcnow())
+            self._running_crawlers[oj_name] = crawler_info
+            return True
 
     def _clean_free_crawlers(self):
         free_clients = []
@@ -478,6 +832,123 @@ class CrawlerHandler(threading.Thread):
         logger.info(f'Stopping crawlers: {self._stopping_crawlers}')
 
 
+class ContestListRefresher(threading.Thread):
+    def __init__(self, interval=CONTEST_LIST_REFRESH_INTERVAL, daemon=None):
+        super().__init__(name='contest-refresher', daemon=daemon)
+        self._interval = interval
+        self._redis_key = REDIS_CONFIG['cache']['recent_contests']
+        self._redis_con = redis.StrictRedis(
+            host=REDIS_CONFIG['host'], port=REDIS_CONFIG['port'], db=REDIS_CONFIG['db'])
+
+    def run(self):
+        while True:
+            for site in contest_clients:
+                try:
+                    self._refresh(site)
+                except Exception as e:
+                    db.session.rollback()
+                    logger.exception(f'Refreshed contest list failed, site: {site}, reason: {e}')
+            time.sleep(self._interval)
+
+    def _refresh(self, site):
+        contest_list = contest_clients[site].get_recent_contest()
+        if not contest_list:
+            logger.error(f'Refreshed contest list failed, site: {site}, reason: empty contest list')
+            return
+        for contest_info in contest_list:
+            oj_name = f'{site}_ct_{contest_info.contest_id}'
+            contest = Contest.query.get(oj_name) or Contest(oj_name=oj_name)
+            contest.site = site
+            contest.contest_id = contest_info.contest_id
+            contest.title = contest_info.title
+            contest.public = contest_info.public
+            contest.status = contest_info.status
+            # Stored as naive UTC like the other models, an aware value never
+            # compares equal and would rewrite every contest on each refresh.
+            if contest_info.start_time:
+                contest.start_time = datetime.utcfromtimestamp(contest_info.start_time)
+            if contest_info.end_time:
+                contest.end_time = datetime.utcfromtimestamp(contest_info.end_time)
+            db.session.add(contest)
+        db.session.commit()
+        self._redis_con.set(f'{self._redis_key}-{site}', json.dumps([x.to_json() for x in contest_list]),
+                            ex=self._interval * 3)
+        logger.info(f'Refreshed contest list successfully, site: {site}, count: {len(contest_list)}')
+
+
+class ContestPrewarmer(threading.Thread):
+    def __init__(self, submitter_handler, contest_accounts, lead_time=CONTEST_PREWARM_CONFIG['lead_time'],
+                 interval=CONTEST_PREWARM_CONFIG['interval'], daemon=None):
+        super().__init__(name='contest-prewarmer', daemon=daemon)
+        self._submitter_handler = submitter_handler
+        self._contest_accounts = contest_accounts
+        self._lead_time = timedelta(seconds=lead_time)
+        self._interval = interval
+        self._warmed = {}
+        self._redis_key = REDIS_CONFIG['queue']['crawler_queue']
+        self._redis_con = redis.StrictRedis(
+            host=REDIS_CONFIG['host'], port=REDIS_CONFIG['port'], db=REDIS_CONFIG['db'])
+
+    def run(self):
+        while True:
+            try:
+                self._prewarm()
+            except (redis.exceptions.RedisError, SQLAlchemyError) as e:
+                db.session.rollback()
+                logger.error(f'Prewarmed contests failed, reason: {e}')
+            time.sleep(self._interval)
+
+    def _prewarm(self):
+        if not self._contest_accounts:
+            return
+        now = datetime.utcnow()
+        contests = Contest.query.filter(Contest.oj_name.in_(list(self._contest_accounts)),
+                                        Contest.start_time.between(now - self._lead_time, now + self._lead_time))
+        upcoming = {x.oj_name: x.start_time.replace(tzinfo=None) for x in contests}
+        db.session.remove()
+        for oj_name in list(self._warmed):
+            if oj_name not in upcoming:
+                self._warmed.pop(oj_name)
+        for oj_name, start_time in upcoming.items():
+            warmed = self._warmed.get(oj_name)
+            if warmed is None or warmed[0] != start_time:
+                started = self._submitter_handler.prewarm(oj_name)
+                self._crawl_contest(oj_name)
+                self._warmed[oj_name] = (start_time, now >= start_time)
+                logger.info(f'Prewarmed contest {oj_name}, start_time: {start_time}, submitters started: {started}')
+            elif not warmed[1] and now >= start_time:
+                self._crawl_contest(oj_name)
+                self._warmed[oj_name] = (start_time, True)
+
+    def _crawl_contest(self, oj_name):
+        self._redis_con.lpush(self._redis_key, json.dumps({'oj_name': oj_name, 'type': 'contest'}))
+
+
+class StateReporter(threading.Thread):
+    def __init__(self, submitter_handler, crawler_handler, interval=WORKER_STATE_INTERVAL, daemon=None):
+        super().__init__(name='state-reporter', daemon=daemon)
+        self._submitter_handler = submitter_handler
+        self._crawler_handler = crawler_handler
+        self._interval = interval
+        self._process = f'{socket.gethostname()}:{os.getpid()}'
+        self._redis_key = REDIS_CONFIG['cache']['worker_state']
+        self._redis_con = redis.StrictRedis(
+            host=REDIS_CONFIG['host'], port=REDIS_CONFIG['port'], db=REDIS_CONFIG['db'])
+
+    def run(self):
+        while True:
+            state = {
+                'time': time.time(),
+                'submitters': self._submitter_handler.state(),
+                'crawlers': self._crawler_handler.state(),
+            }
+            try:
+                self._redis_con.hset(self._redis_key, self._process, json.dumps(state, default=str))
+            except redis.exceptions.RedisError as e:
+                logger.error(f'Reported worker state failed, reason: {e}')
+            time.sleep(self._interval)
+
+
 class VJudge(object):
     def __init__(self, normal_accounts=None, contest_accounts=None):
         if not normal_accounts and not contest_accounts:
@@ -485,6 +956,9 @@ class VJudge(object):
                            'submitter and crawler will not work')
         self._normal_accounts = normal_accounts or {}
         self._contest_accounts = contest_accounts or {}
+        self._profiler = SamplingProfiler()
+        self._submitter_handle = None
+        self._crawler_handle = None
 
     @property
     def normal_accounts(self):
@@ -495,9 +969,35 @@ class VJudge(object):
         return self._contest_accounts
 
     def start(self):
-        submitter_handle = SubmitterHandler(self._normal_accounts, self._contest_accounts, True)
-        crawler_handle = CrawlerHandler(self._normal_accounts, self._contest_accounts, True)
-        submitter_handle.start()
-        crawler_handle.start()
-        submitter_handle.join()
-        crawler_handle.join()
+        self._submitter_handle = SubmitterHandler(self._normal_accounts, self._contest_accounts, True)
+        self._crawler_handle = CrawlerHandler(self._normal_accounts, self._contest_accounts, True)
+        contest_list_refresher = ContestListRefresher(daemon=True)
+        contest_prewarmer = ContestPrewarmer(self._submitter_handle, self._contest_accounts, daemon=True)
+        metrics_pusher = MetricsPusher('worker')
+        state_reporter = StateReporter(self._submitter_handle, self._crawler_handle, daemon=True)
+        event_listener = EventListener()
+        event_listener.subscribe('profiler', self._handle_profiler_event)
+        event_listener.subscribe('control', self._handle_control_event)
+        signal.signal(signal.SIGUSR1, self._profiler.toggle)
+        self._submitter_handle.start()
+        self._crawler_handle.start()
+        contest_list_refresher.start()
+        contest_prewarmer.start()
+        metrics_pusher.start()
+        state_reporter.start()
+        event_listener.start()
+        self._submitter_handle.join()
+        self._crawler_handle.join()
+
+    def _handle_profiler_event(self, event):
+        if event.get('action') == 'start':
+            self._profiler.start(event.get('seconds'))
+        elif event.get('action') == 'stop':
+            self._profiler.stop()
+
+    def _handle_control_event(self, event):
+        action, oj_name, target = event.get('action'), event.get('oj_name'), event.get('target')
+        if target in ('submitter', 'all'):
+            self._submitter_handle.control(action, oj_name, event.get('count'))
+        if target in ('crawler', 'all'):
+            self._crawler_handle.control(action, oj_name, event.get('count'))
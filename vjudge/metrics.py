@@ -0,0 +1,224 @@
+import json
+import os
+import resource
+import socket
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections import OrderedDict
+
+import redis
+
+from config import REDIS_CONFIG, METRICS_PUSH_INTERVAL, logger
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Metric(ABC):
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _items(self):
+        with self._lock:
+            return list(self._values.items())
+
+    @abstractmethod
+    def samples(self):
+        pass
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def samples(self):
+        for labelvalues, value in self._items():
+            yield self.name, dict(zip(self.labelnames, labelvalues)), value
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        super().__init__(name, documentation, labelnames)
+        self._function = function
+
+    def set(self, value, *labelvalues):
+        with self._lock:
+            self._values[labelvalues] = value
+
+    def samples(self):
+        items = self._function().items() if self._function else self._items()
+        for labelvalues, value in items:
+            yield self.name, dict(zip(self.labelnames, labelvalues)), value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self._buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labelvalues):
+        index = bisect_left(self._buckets, value)
+        with self._lock:
+            counts = self._values.get(labelvalues)
+            if counts is None:
+                counts = self._values[labelvalues] = [0] * (len(self._buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        for labelvalues, counts in items:
+            labels = dict(zip(self.labelnames, labelvalues))
+            total = 0
+            for bound, count in zip(self._buckets + ('+Inf',), counts):
+                total += count
+                yield f'{self.name}_bucket', dict(labels, le=str(bound)), total
+            yield f'{self.name}_sum', labels, counts[-1]
+            yield f'{self.name}_count', labels, total
+
+
+class Registry(object):
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        for index, registered in enumerate(self._metrics):
+            if registered.name == metric.name:
+                self._metrics[index] = metric
+                return metric
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), function=None):
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def snapshot(self):
+        result = []
+        for metric in self._metrics:
+            try:
+                samples = list(metric.samples())
+            except Exception as e:
+                logger.error(f'Collect metric {metric.name} failed, reason: {e}')
+                continue
+            result.append({'name': metric.name, 'type': metric.kind, 'help': metric.documentation,
+                           'samples': samples})
+        return result
+
+
+def _process_cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return {(): usage.ru_utime + usage.ru_stime}
+
+
+def _process_rss_bytes():
+    # Only /proc reports the current RSS; ru_maxrss is the peak and its unit
+    # differs between platforms, so nothing is reported without /proc.
+    try:
+        with open('/proc/self/statm') as f:
+            return {(): int(f.read().split()[1]) * resource.getpagesize()}
+    except OSError:
+        return {}
+
+
+registry = Registry()
+registry.gauge('process_cpu_seconds_total', 'User and system CPU time of the process.', function=_process_cpu_seconds)
+registry.gauge('process_resident_memory_bytes', 'Resident memory of the process.', function=_process_rss_bytes)
+
+_redis_con = None
+
+
+def _get_redis():
+    global _redis_con
+    if _redis_con is None:
+        _redis_con = redis.StrictRedis(host=REDIS_CONFIG['host'], port=REDIS_CONFIG['port'], db=REDIS_CONFIG['db'])
+    return _redis_con
+
+
+class MetricsPusher(threading.Thread):
+    def __init__(self, role, interval=METRICS_PUSH_INTERVAL, daemon=True):
+        super().__init__(daemon=daemon)
+        self.process = f'{role}:{socket.gethostname()}:{os.getpid()}'
+        self._interval = interval
+        self._redis_key = REDIS_CONFIG['cache']['metrics']
+
+    def run(self):
+        while True:
+            try:
+                self.push()
+            except redis.exceptions.RedisError as e:
+                logger.error(f'Pushed metrics failed, process: {self.process}, reason: {e}')
+            time.sleep(self._interval)
+
+    def push(self):
+        data = {'time': time.time(), 'metrics': registry.snapshot()}
+        _get_redis().hset(self._redis_key, self.process, json.dumps(data))
+
+
+def load_snapshots(redis_con, max_age=METRICS_PUSH_INTERVAL * 4):
+    snapshots = {}
+    stale = []
+    now = time.time()
+    for process, data in redis_con.hgetall(REDIS_CONFIG['cache']['metrics']).items():
+        process = process.decode()
+        try:
+            data = json.loads(data)
+        except ValueError:
+            stale.append(process)
+            continue
+        if now - data['time'] > max_age:
+            stale.append(process)
+        else:
+            snapshots[process] = data['metrics']
+    if stale:
+        redis_con.hdel(REDIS_CONFIG['cache']['metrics'], *stale)
+    return snapshots
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def render(groups):
+    families = OrderedDict()
+    for extra_labels, metrics in groups:
+        for metric in metrics:
+            family = families.setdefault(metric['name'], (metric, []))
+            for name, labels, value in metric['samples']:
+                family[1].append((name, dict(labels, **extra_labels), value))
+    lines = []
+    for name, (metric, samples) in families.items():
+        lines.append(f'# HELP {name} {metric["help"]}')
+        lines.append(f'# TYPE {name} {metric["type"]}')
+        for sample_name, labels, value in samples:
+            if labels:
+                labels = ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+                sample_name = f'{sample_name}{{{labels}}}'
+            lines.append(f'{sample_name} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
@@ -1,7 +1,25 @@
+from collections import defaultdict
 from datetime import datetime, timezone
-from sqlalchemy import Column, Integer, Boolean, String, DateTime, UniqueConstraint
+from sqlalchemy import (Column, Integer, Boolean, String, DateTime, LargeBinary, ForeignKey, UniqueConstraint,
+                        bindparam, event, func, inspect, text)
+from sqlalchemy.orm import column_property, deferred, relationship
 
-from . import db
+from . import db, events
+from .compression import CompressedText, compress, decompress, digest
+from .search import SearchUnsupported, get_search_index, strip_tags
+
+
+class SourceCode(db.Model):
+    __tablename__ = 'source_codes'
+    digest = Column(String, primary_key=True)
+    data = Column(LargeBinary, nullable=False)
+
+    @property
+    def text(self):
+        return decompress(self.data)
+
+    def __repr__(self):
+        return f'<SourceCode(digest={self.digest})>'
 
 
 class Submission(db.Model):
@@ -11,22 +29,40 @@ class Submission(db.Model):
     oj_name = Column(String, nullable=False)
     problem_id = Column(String, nullable=False)
     language = Column(String, nullable=False)
-    source_code = Column(String, nullable=False)
+    source_digest = Column(String, ForeignKey('source_codes.digest'), nullable=False)
     run_id = Column(String)
-    verdict = Column(String, default='Queuing')
+    verdict = column_property(Column(String, default='Queuing'), active_history=True)
     exe_time = Column(Integer)
     exe_mem = Column(Integer)
     time_stamp = Column(DateTime, default=datetime.utcnow)
+    enqueued_at = Column(DateTime)
+    dequeued_at = Column(DateTime)
+    picked_at = Column(DateTime)
+    submitted_at = Column(DateTime)
+    first_polled_at = Column(DateTime)
+    judged_at = Column(DateTime)
 
-    def to_json(self):
-        submission_json = {
-            'id': self.id,
-            'oj_name': self.oj_name,
-            'problem_id': self.problem_id,
-            'verdict': self.verdict,
-            'exe_time': self.exe_time,
-            'exe_mem': self.exe_mem
-        }
+    source = relationship(SourceCode, viewonly=True)
+
+    json_fields = ('id', 'oj_name', 'problem_id', 'verdict', 'exe_time', 'exe_mem')
+
+    @property
+    def source_code(self):
+        if '_source_code' in self.__dict__:
+            return self._source_code
+        if self.source is None:
+            return None
+        return self.source.text
+
+    @source_code.setter
+    def source_code(self, value):
+        self._source_code = value
+        self.source_digest = digest(value)
+
+    def to_json(self, fields=None):
+        submission_json = {}
+        for field in fields or self.json_fields:
+            submission_json[field] = getattr(self, field)
         return submission_json
 
     def __repr__(self):
@@ -40,37 +76,36 @@ class Problem(db.Model):
     problem_id = Column(String, primary_key=True, index=True)
     last_update = Column(DateTime, nullable=False)
     title = Column(String)
-    description = Column(String)
-    input = Column(String)
-    output = Column(String)
-    sample_input = Column(String)
-    sample_output = Column(String)
+    description = deferred(Column(CompressedText), group='body')
+    input = deferred(Column(CompressedText), group='body')
+    output = deferred(Column(CompressedText), group='body')
+    sample_input = deferred(Column(CompressedText), group='body')
+    sample_output = deferred(Column(CompressedText), group='body')
     time_limit = Column(Integer)
     mem_limit = Column(Integer)
 
-    def to_json(self):
-        problem_json = {
-            'oj_name': self.oj_name,
-            'problem_id': self.problem_id,
-            'last_update': self._to_timestamp(self.last_update),
-            'title': self.title,
-            'description': self.description,
-            'input': self.input,
-            'output': self.output,
-            'sample_input': self.sample_input,
-            'sample_output': self.sample_output,
-            'time_limit': self.time_limit,
-            'mem_limit': self.mem_limit
-        }
+    json_fields = ('oj_name', 'problem_id', 'last_update', 'title', 'description', 'input', 'output',
+                   'sample_input', 'sample_output', 'time_limit', 'mem_limit')
+    summary_fields = ('oj_name', 'problem_id', 'title')
+
+    def to_json(self, fields=None):
+        problem_json = {}
+        for field in fields or self.json_fields:
+            value = getattr(self, field)
+            if field == 'last_update':
+                value = self._to_timestamp(value)
+            problem_json[field] = value
         return problem_json
 
     def summary(self):
-        summary_json = {
-            'oj_name': self.oj_name,
-            'problem_id': self.problem_id,
-            'title': self.title,
-        }
-        return summary_json
+        return self.to_json(self.summary_fields)
+
+    @classmethod
+    def search(cls, q):
+        search_index = get_search_index(db.engine.dialect.name)
+        if search_index is None:
+            raise SearchUnsupported(f'Search is not supported on {db.engine.dialect.name}')
+        return search_index.match(q)
 
     @staticmethod
     def _to_timestamp(dt):
@@ -115,3 +150,179 @@ class Contest(db.Model):
     def __repr__(self):
         return (f'<Contest(site={self.site} contest_id={self.contest_id}, title="{self.title}", '
                 f'public={self.public}, status={self.status})>')
+
+
+class Counter(db.Model):
+    __tablename__ = 'counters'
+    name = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+    @classmethod
+    def get(cls, *names):
+        value = db.session.query(func.sum(cls.value)).filter(cls.name.in_(names)).scalar()
+        return value or 0
+
+    @classmethod
+    def rebuild(cls):
+        db.session.query(cls).delete(synchronize_session=False)
+        counts = defaultdict(int)
+        for model, columns in _counted_columns.items():
+            table = model.__tablename__
+            counts[counter_name(table)] = model.query.count()
+            for column in columns:
+                attr = getattr(model, column)
+                for value, count in db.session.query(attr, func.count()).group_by(attr):
+                    if value is not None:
+                        counts[counter_name(table, column, value)] = count
+        db.session.add_all(cls(name=name, value=value) for name, value in counts.items())
+        db.session.commit()
+
+    def __repr__(self):
+        return f'<Counter(name={self.name}, value={self.value})>'
+
+
+def counter_name(table, column=None, value=None):
+    if column is None:
+        return table
+    return f'{table}:{column}:{value}'
+
+
+_counted_columns = {
+    Submission: ('oj_name', 'verdict'),
+    Problem: ('oj_name',),
+}
+
+_insert_source_code = text('INSERT INTO source_codes (digest, data) VALUES (:digest, :data) '
+                           'ON CONFLICT (digest) DO NOTHING').bindparams(bindparam('data', type_=LargeBinary))
+
+_incr_counter = text('INSERT INTO counters (name, value) VALUES (:name, :delta) '
+                     'ON CONFLICT (name) DO UPDATE SET value = counters.value + excluded.value')
+
+
+def _counter_names(obj, columns):
+    table = obj.__tablename__
+    names = [counter_name(table)]
+    for column in columns:
+        value = getattr(obj, column)
+        if value is not None:
+            names.append(counter_name(table, column, value))
+    return names
+
+
+@event.listens_for(db.session, 'before_flush')
+def _store_source_codes(session, flush_context, instances):
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Submission) and '_source_code' in obj.__dict__:
+            session.connection().execute(
+                _insert_source_code, digest=obj.source_digest, data=compress(obj.__dict__.pop('_source_code')))
+
+
+@event.listens_for(db.session, 'after_flush')
+def _update_counters(session, flush_context):
+    deltas = defaultdict(int)
+    for obj in session.new:
+        columns = _counted_columns.get(type(obj))
+        if columns is not None:
+            for name in _counter_names(obj, columns):
+                deltas[name] += 1
+    for obj in session.deleted:
+        columns = _counted_columns.get(type(obj))
+        if columns is not None:
+            for name in _counter_names(obj, columns):
+                deltas[name] -= 1
+    for obj in session.dirty:
+        columns = _counted_columns.get(type(obj))
+        if columns is None:
+            continue
+        attrs = inspect(obj).attrs
+        for column in columns:
+            history = attrs[column].history
+            if not history.added:
+                continue
+            for value in history.deleted:
+                if value is not None:
+                    deltas[counter_name(obj.__tablename__, column, value)] -= 1
+            for value in history.added:
+                if value is not None:
+                    deltas[counter_name(obj.__tablename__, column, value)] += 1
+    connection = session.connection()
+    for name, delta in deltas.items():
+        if delta:
+            connection.execute(_incr_counter, name=name, delta=delta)
+
+
+_searched_body_columns = {'description', 'input', 'output'}
+
+
+@event.listens_for(Problem.__table__, 'after_create')
+def _create_search_index(target, connection, **kwargs):
+    search_index = get_search_index(connection.dialect.name)
+    if search_index is not None:
+        for statement in search_index.ddl:
+            connection.execute(statement)
+
+
+@event.listens_for(Problem.__table__, 'before_drop')
+def _drop_search_index(target, connection, **kwargs):
+    search_index = get_search_index(connection.dialect.name)
+    if search_index is not None:
+        for statement in search_index.drop_ddl:
+            connection.execute(statement)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _update_search_index(session, flush_context):
+    search_index = None
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, Problem):
+            continue
+        if search_index is None:
+            search_index = get_search_index(session.connection().dialect.name)
+            if search_index is None:
+                return
+        if obj in session.deleted:
+            search_index.delete(session.connection(), obj.oj_name, obj.problem_id)
+            continue
+        state = inspect(obj)
+        changed = {x for x in {'title'} | _searched_body_columns if state.attrs[x].history.added}
+        if not changed:
+            continue
+        title = body = None
+        if state.pending or 'title' not in state.unloaded:
+            title = obj.title or ''
+        if state.pending or changed & _searched_body_columns:
+            body = strip_tags(' '.join(getattr(obj, x) or '' for x in ('description', 'input', 'output')))
+        search_index.update(session.connection(), obj.oj_name, obj.problem_id, title=title, body=body)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_events(session, flush_context):
+    if session.info.get('silent'):
+        return
+    pending_events = session.info.setdefault('pending_events', [])
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Contest) and (obj in session.new or obj in session.deleted or session.is_modified(obj)):
+            pending_events.append(('contest', {'site': obj.site, 'contest_id': obj.contest_id}))
+        if isinstance(obj, Submission) and obj not in session.deleted and (
+                obj in session.new or session.is_modified(obj)):
+            pending_events.append(('submission', dict(obj.to_json(), user_id=obj.user_id)))
+        if not isinstance(obj, Problem):
+            continue
+        deleted = obj in session.deleted
+        state = inspect(obj)
+        if deleted or state.pending or state.attrs.title.history.added:
+            pending_events.append(('problem', {'oj_name': obj.oj_name, 'problem_id': obj.problem_id,
+                                               'title': obj.title, 'deleted': deleted}))
+        elif session.is_modified(obj):
+            pending_events.append(('problem', {'oj_name': obj.oj_name, 'problem_id': obj.problem_id}))
+
+
+@event.listens_for(db.session, 'after_commit')
+def _publish_events(session):
+    for kind, payload in session.info.pop('pending_events', []):
+        events.publish(kind, **payload)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_events(session, previous_transaction):
+    session.info.pop('pending_events', None)
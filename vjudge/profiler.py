@@ -0,0 +1,85 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from config import PROFILER_CONFIG, logger
+
+
+def _thread_label(name):
+    parts = name.split(':')
+    if len(parts) < 2:
+        return name
+    return f'{parts[0]};{parts[1]}'
+
+
+def _collapse(label, frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    stack.append(label)
+    stack.reverse()
+    return ';'.join(stack)
+
+
+class SamplingProfiler(object):
+    def __init__(self, interval=PROFILER_CONFIG['interval'], max_seconds=PROFILER_CONFIG['max_seconds'],
+                 output_dir=PROFILER_CONFIG['output_dir']):
+        self._interval = interval
+        self._max_seconds = max_seconds
+        self._output_dir = output_dir
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop_event = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds=None):
+        # Also caps SIGUSR1 toggles, which would otherwise sample until the next signal.
+        seconds = min(seconds or self._max_seconds, self._max_seconds)
+        with self._lock:
+            if self.running:
+                return False
+            self._stop_event = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(self._stop_event, seconds),
+                                            name='profiler', daemon=True)
+            self._thread.start()
+        logger.info(f'Started profiler, interval: {self._interval}, seconds: {seconds}')
+        return True
+
+    def stop(self):
+        with self._lock:
+            if not self.running:
+                return False
+            self._stop_event.set()
+        return True
+
+    def toggle(self, *args):
+        if not self.stop():
+            self.start(self._max_seconds)
+
+    def _run(self, stop_event, seconds):
+        own_ident = threading.get_ident()
+        stacks = Counter()
+        start = time.monotonic()
+        while not stop_event.wait(self._interval):
+            names = {x.ident: x.name for x in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != own_ident:
+                    stacks[_collapse(_thread_label(names.get(ident, 'unknown')), frame)] += 1
+            if time.monotonic() - start >= seconds:
+                break
+        path = os.path.join(self._output_dir, f'vjudge-{os.getpid()}-{time.strftime("%Y%m%d%H%M%S")}.folded')
+        try:
+            with open(path, 'w') as f:
+                for stack, count in stacks.most_common():
+                    f.write(f'{stack} {count}\n')
+        except OSError as e:
+            logger.error(f'Wrote profile failed, path: {path}, reason: {e}')
+            return
+        logger.info(f'Stopped profiler, path: {path}, samples: {sum(stacks.values())}')
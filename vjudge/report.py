@@ -0,0 +1,60 @@
+import math
+from collections import defaultdict
+
+from .models import db, Submission
+
+lifecycle_stages = (
+    ('redis_queue', 'enqueued_at', 'dequeued_at'),
+    ('local_queue', 'dequeued_at', 'picked_at'),
+    ('submit', 'picked_at', 'submitted_at'),
+    ('first_poll', 'submitted_at', 'first_polled_at'),
+    ('judge', 'submitted_at', 'judged_at'),
+    ('total', 'enqueued_at', 'judged_at'),
+)
+
+report_percentiles = (50, 90, 99)
+
+_timestamp_fields = ('enqueued_at', 'dequeued_at', 'picked_at', 'submitted_at', 'first_polled_at', 'judged_at')
+
+
+def percentile(values, p):
+    return values[max(int(math.ceil(p / 100 * len(values))) - 1, 0)]
+
+
+def _group_key(row, group_by):
+    if group_by == 'account':
+        return f'{row.oj_name}/{row.user_id}'
+    return row.oj_name
+
+
+def lifecycle_report(since=None, group_by='oj_name', ids=None):
+    columns = [Submission.id, Submission.oj_name, Submission.user_id] + [getattr(Submission, x) for x in _timestamp_fields]
+    query = db.session.query(*columns).on_replica().filter(Submission.judged_at.isnot(None))
+    if since is not None:
+        query = query.filter(Submission.judged_at >= since)
+    if ids is not None:
+        ids = set(ids)
+        query = query.filter(Submission.id.between(min(ids, default=0), max(ids, default=-1)))
+    durations = defaultdict(list)
+    for row in query.yield_per(1000):
+        if ids is not None and row.id not in ids:
+            continue
+        group = _group_key(row, group_by)
+        for stage, start, end in lifecycle_stages:
+            start, end = getattr(row, start), getattr(row, end)
+            if start is None or end is None:
+                continue
+            value = (end - start).total_seconds()
+            durations[group, stage].append(value)
+            durations['*', stage].append(value)
+    db.session.remove()
+    stage_order = {x[0]: i for i, x in enumerate(lifecycle_stages)}
+    report = []
+    for group, stage in sorted(durations, key=lambda x: (x[0] != '*', x[0], stage_order[x[1]])):
+        values = sorted(durations[group, stage])
+        row = {'group': group, 'stage': stage, 'count': len(values)}
+        for p in report_percentiles:
+            row[f'p{p}'] = percentile(values, p)
+        row['max'] = values[-1]
+        report.append(row)
+    return report
@@ -0,0 +1,125 @@
+import re
+
+from sqlalchemy import String, Float, column, text
+
+_tag_pattern = re.compile(r'<[^>]+>')
+_word_pattern = re.compile(r'\w+', re.UNICODE)
+
+
+class SearchUnsupported(Exception):
+    pass
+
+
+def strip_tags(html):
+    return ' '.join(_tag_pattern.sub(' ', html).split())
+
+
+def _words(q):
+    return _word_pattern.findall(q)[:16]
+
+
+# problem_search maps problem keys to stable FTS5 rowids, since the rowids of
+# the problems table itself may change on VACUUM.
+class SQLiteSearchIndex(object):
+    ddl = (
+        'CREATE TABLE problem_search (id INTEGER PRIMARY KEY, oj_name VARCHAR NOT NULL, '
+        'problem_id VARCHAR NOT NULL, UNIQUE (oj_name, problem_id))',
+        "CREATE VIRTUAL TABLE problem_search_fts USING fts5(title, body, tokenize='unicode61', prefix='2 3')",
+    )
+    drop_ddl = (
+        'DROP TABLE problem_search_fts',
+        'DROP TABLE problem_search',
+    )
+
+    def update(self, connection, oj_name, problem_id, title=None, body=None):
+        key = {'oj_name': oj_name, 'problem_id': problem_id}
+        connection.execute(text('INSERT INTO problem_search (oj_name, problem_id) VALUES (:oj_name, :problem_id) '
+                                'ON CONFLICT (oj_name, problem_id) DO NOTHING'), **key)
+        rowid = connection.execute(text('SELECT id FROM problem_search '
+                                        'WHERE oj_name = :oj_name AND problem_id = :problem_id'), **key).scalar()
+        if title is None or body is None:
+            row = connection.execute(text('SELECT title, body FROM problem_search_fts WHERE rowid = :rowid'),
+                                     rowid=rowid).first()
+            if row is not None:
+                title = row[0] if title is None else title
+                body = row[1] if body is None else body
+        connection.execute(text('DELETE FROM problem_search_fts WHERE rowid = :rowid'), rowid=rowid)
+        connection.execute(text('INSERT INTO problem_search_fts (rowid, title, body) VALUES (:rowid, :title, :body)'),
+                           rowid=rowid, title=title or '', body=body or '')
+
+    def delete(self, connection, oj_name, problem_id):
+        key = {'oj_name': oj_name, 'problem_id': problem_id}
+        connection.execute(text('DELETE FROM problem_search_fts WHERE rowid IN (SELECT id FROM problem_search '
+                                'WHERE oj_name = :oj_name AND problem_id = :problem_id)'), **key)
+        connection.execute(text('DELETE FROM problem_search '
+                                'WHERE oj_name = :oj_name AND problem_id = :problem_id'), **key)
+
+    def match(self, q):
+        words = _words(q)
+        if not words:
+            return None
+        expression = ' '.join(f'"{x}"*' for x in words)
+        matches = text('SELECT s.oj_name AS oj_name, s.problem_id AS problem_id, '
+                       'bm25(problem_search_fts, 10.0, 1.0) AS rank '
+                       'FROM problem_search_fts JOIN problem_search AS s ON s.id = problem_search_fts.rowid '
+                       'WHERE problem_search_fts MATCH :expression').bindparams(expression=expression)
+        return matches.columns(column('oj_name', String), column('problem_id', String),
+                               column('rank', Float)).alias('matches')
+
+
+class PostgresSearchIndex(object):
+    ddl = (
+        'CREATE TABLE problem_search (oj_name VARCHAR NOT NULL, problem_id VARCHAR NOT NULL, '
+        'body_vector TSVECTOR NOT NULL, document TSVECTOR NOT NULL, PRIMARY KEY (oj_name, problem_id))',
+        'CREATE INDEX ix_problem_search_document ON problem_search USING GIN (document)',
+    )
+    drop_ddl = (
+        'DROP TABLE problem_search',
+    )
+
+    def update(self, connection, oj_name, problem_id, title=None, body=None):
+        key = {'oj_name': oj_name, 'problem_id': problem_id}
+        if body is None:
+            connection.execute(text("INSERT INTO problem_search (oj_name, problem_id, body_vector, document) "
+                                    "VALUES (:oj_name, :problem_id, ''::tsvector, ''::tsvector) "
+                                    "ON CONFLICT (oj_name, problem_id) DO NOTHING"), **key)
+        else:
+            connection.execute(text("INSERT INTO problem_search (oj_name, problem_id, body_vector, document) "
+                                    "VALUES (:oj_name, :problem_id, to_tsvector('simple', :body), ''::tsvector) "
+                                    "ON CONFLICT (oj_name, problem_id) "
+                                    "DO UPDATE SET body_vector = excluded.body_vector"), body=body, **key)
+        if title is None:
+            connection.execute(text("UPDATE problem_search SET document = setweight(body_vector, 'D') "
+                                    "|| (SELECT setweight(to_tsvector('simple', coalesce(title, '')), 'A') "
+                                    "FROM problems WHERE problems.oj_name = problem_search.oj_name "
+                                    "AND problems.problem_id = problem_search.problem_id) "
+                                    "WHERE oj_name = :oj_name AND problem_id = :problem_id"), **key)
+        else:
+            connection.execute(text("UPDATE problem_search SET document = "
+                                    "setweight(to_tsvector('simple', :title), 'A') || setweight(body_vector, 'D') "
+                                    "WHERE oj_name = :oj_name AND problem_id = :problem_id"), title=title, **key)
+
+    def delete(self, connection, oj_name, problem_id):
+        connection.execute(text('DELETE FROM problem_search WHERE oj_name = :oj_name AND problem_id = :problem_id'),
+                           oj_name=oj_name, problem_id=problem_id)
+
+    def match(self, q):
+        words = _words(q)
+        if not words:
+            return None
+        expression = ' & '.join(f'{x}:*' for x in words)
+        matches = text("SELECT oj_name, problem_id, -ts_rank(document, to_tsquery('simple', :expression)) AS rank "
+                       "FROM problem_search WHERE document @@ to_tsquery('simple', :expression)"
+                       ).bindparams(expression=expression)
+        return matches.columns(column('oj_name', String), column('problem_id', String),
+                               column('rank', Float)).alias('matches')
+
+
+_search_indexes = {
+    'sqlite': SQLiteSearchIndex(),
+    'postgresql': PostgresSearchIndex(),
+}
+
+
+def get_search_index(dialect_name):
+    return _search_indexes.get(dialect_name)
@@ -1,14 +1,41 @@
+import json
 import logging
+import random
+import re
+import time
 from abc import abstractmethod, ABC
 
 import requests
 
-from config import get_header
+from config import REMOTE_TRACE_CONFIG, RETRY_CONFIG, get_header
+from . import exceptions
+from .retry import backoff, get_breaker
+from ..metrics import registry
 
 logging.basicConfig(level=logging.INFO)
 
+remote_latency = registry.histogram('vjudge_remote_request_duration_seconds', 'Remote judge request latency.',
+                                    ('oj_name', 'endpoint', 'account'),
+                                    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+remote_requests = registry.counter('vjudge_remote_requests_total', 'Remote judge requests by status code.',
+                                   ('oj_name', 'endpoint', 'account', 'status'))
+remote_bytes = registry.counter('vjudge_remote_bytes_total', 'Bytes exchanged with remote judges.',
+                                ('oj_name', 'endpoint', 'account', 'direction'))
+remote_retries = registry.counter('vjudge_remote_retries_total', 'Remote judge requests retried after a failure.',
+                                  ('oj_name', 'endpoint'))
+remote_relogins = registry.counter('vjudge_remote_relogins_total', 'Forced re-logins after LoginRequired.',
+                                   ('oj_name', 'account'))
+
+trace_logger = logging.getLogger('vjudge-core.remote')
+if REMOTE_TRACE_CONFIG['path']:
+    trace_logger.propagate = False
+    trace_logger.addHandler(logging.FileHandler(REMOTE_TRACE_CONFIG['path']))
+    trace_logger.setLevel(logging.INFO)
+
 
 class BaseClient(ABC):
+    endpoint_patterns = ()
+
     def __init__(self):
         self._session = requests.session()
         self._session.headers.update(get_header())
@@ -53,6 +80,90 @@ class BaseClient(ABC):
     def get_submit_status(self, run_id, **kwargs):
         pass
 
+    @abstractmethod
+    def _get_latest_run_id(self, problem_id):
+        pass
+
+    def get_breaker(self):
+        return get_breaker(re.sub(r'_ct_[0-9]+$', '', self.get_name()))
+
+    def _send(self, method, url, data=None, timeout=None, retry=True):
+        labels = (self.get_name(), self._get_endpoint(url), self._get_account())
+        breaker = self.get_breaker()
+        if not breaker.allow():
+            raise exceptions.CircuitOpen(f'Circuit breaker of {breaker.site} is open')
+        policy = RETRY_CONFIG['request']
+        # Submits are never resent blindly, and callers that already poll on
+        # their own (e.g. the status crawler's event loop) must not sleep here.
+        attempts = 1 if not retry or method == 'post' and labels[1] == 'submit' else policy['attempts']
+        error = None
+        try:
+            for attempt in range(attempts):
+                if attempt:
+                    remote_retries.inc(*labels[:2])
+                    time.sleep(backoff(policy, attempt - 1))
+                start = time.perf_counter()
+                try:
+                    r = self._session.request(method, url, data=data, timeout=timeout)
+                except requests.exceptions.RequestException as e:
+                    status = 'timeout' if isinstance(e, requests.exceptions.Timeout) else 'error'
+                    self._record_request(labels, method, url, status, time.perf_counter() - start)
+                    error = e
+                    continue
+                self._record_request(labels, method, url, r.status_code, time.perf_counter() - start,
+                                     len(r.request.body or ''), len(r.content))
+                if r.status_code in (502, 503, 504):
+                    error = requests.exceptions.HTTPError(f'{r.status_code} Server Error', response=r)
+                    continue
+                breaker.record_success()
+                return r
+            breaker.record_failure()
+            raise error
+        finally:
+            breaker.release()
+
+    def _submit_with_retry(self, url, make_data, problem_id, previous_run_id):
+        policy = RETRY_CONFIG['submit']
+        for attempt in range(policy['attempts']):
+            try:
+                return self._request_url('post', url, data=make_data())
+            except exceptions.CircuitOpen:
+                raise
+            except exceptions.ConnectionError:
+                if attempt == policy['attempts'] - 1:
+                    raise
+            time.sleep(backoff(policy, attempt))
+            try:
+                if self._get_latest_run_id(problem_id) != previous_run_id:
+                    return None
+            except exceptions.ConnectionError:
+                continue
+
+    def _record_request(self, labels, method, url, status, elapsed, sent=0, received=0):
+        remote_latency.observe(elapsed, *labels)
+        remote_requests.inc(*labels, str(status))
+        remote_bytes.inc(*labels, 'sent', amount=sent)
+        remote_bytes.inc(*labels, 'received', amount=received)
+        if trace_logger.handlers and (not isinstance(status, int) or status >= 400
+                                      or random.random() < REMOTE_TRACE_CONFIG['sample_rate']):
+            trace_logger.info(json.dumps({
+                'time': time.time(), 'oj_name': labels[0], 'endpoint': labels[1], 'account': labels[2],
+                'method': method, 'url': url, 'status': status, 'elapsed': round(elapsed, 4),
+                'sent': sent, 'received': received}))
+
+    def _record_relogin(self):
+        remote_relogins.inc(self.get_name(), self._get_account())
+
+    def _get_endpoint(self, url):
+        for pattern, endpoint in self.endpoint_patterns:
+            if re.search(pattern, url):
+                return endpoint
+        return 'other'
+
+    def _get_account(self):
+        auth = getattr(self, 'auth', None)
+        return auth[0] if auth else 'anonymous'
+
 
 class ContestInfo(object):
     def __init__(self, site, contest_id, title='', public=True, status='Pending',
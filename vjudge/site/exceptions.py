@@ -6,6 +6,10 @@ class ConnectionError(JudgeException):
     pass
 
 
+class CircuitOpen(ConnectionError):
+    pass
+
+
 class LoginError(JudgeException):
     pass
 
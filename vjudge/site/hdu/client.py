@@ -7,12 +7,13 @@ import requests
 from bs4 import BeautifulSoup
 from bs4.element import NavigableString
 
+from config import REMOTE_BASE_URLS
 from .. import exceptions
 from ..base import BaseClient, ContestClient, ContestInfo
 
 __all__ = ('HDUClient', 'HDUContestClient')
 
-BASE_URL = 'http://acm.hdu.edu.cn'
+BASE_URL = REMOTE_BASE_URLS['hdu']
 
 LANG_ID = {'G++': '0', 'GCC': '1', 'C++': '2',
            'C': '3', 'Pascal': '4', 'Java': '5', 'C#': '6'}
@@ -22,6 +23,14 @@ PAGE_TITLES = {'Problem Description': 'description', 'Input': 'input', 'Output':
 
 
 class _UniClient(BaseClient):
+    endpoint_patterns = (
+        (r'/userloginex\.php', 'login'),
+        (r'submit\.php', 'submit'),
+        (r'status\.php', 'status'),
+        (r'(showproblem|listproblem)\.php', 'problem'),
+        (r'/contests/contest_show\.php', 'contest'),
+    )
+
     def __init__(self, auth=None, client_type='practice', contest_id='0', timeout=5):
         super().__init__()
         self.auth = auth
@@ -66,6 +75,7 @@ class _UniClient(BaseClient):
     def update_cookies(self):
         if self.auth is None:
             raise exceptions.LoginRequired('Login is required')
+        self._record_relogin()
         self.login(self.username, self.password)
 
     def get_problem(self, problem_id):
@@ -94,23 +104,17 @@ class _UniClient(BaseClient):
         else:
             data['check'] = '0'
         url = self._get_submit_url()
-        resp = self._request_url('post', url, data=data)
-        if re.search('Code length is improper', resp):
-            raise exceptions.SubmitError('Code length is too short')
-        if re.search("Please don't re-submit in 5 seconds, thank you.", resp):
-            raise exceptions.SubmitError('Submit too frequently')
-        if not re.search('Realtime Status', resp):
-            raise exceptions.SubmitError('Submit failed unexpectedly')
-        url = self._get_status_url(problem_id=problem_id, user_id=self.username)
-        resp = self._request_url('get', url)
-        try:
-            tables = BeautifulSoup(resp, 'lxml').find_all('table')
-            tables.reverse()
-            pattern = re.compile(r'Run ID.*Judge Status.*Author', re.DOTALL)
-            table = next(filter(lambda x: re.search(pattern, str(x)), tables))
-            tag = table.find('tr', align="center")
-            run_id = tag.find('td').text.strip()
-        except (AttributeError, StopIteration):
+        previous_run_id = self._get_latest_run_id(problem_id)
+        resp = self._submit_with_retry(url, lambda: data, problem_id, previous_run_id)
+        if resp is not None:
+            if re.search('Code length is improper', resp):
+                raise exceptions.SubmitError('Code length is too short')
+            if re.search("Please don't re-submit in 5 seconds, thank you.", resp):
+                raise exceptions.SubmitError('Submit too frequently')
+            if not re.search('Realtime Status', resp):
+                raise exceptions.SubmitError('Submit failed unexpectedly')
+        run_id = self._get_latest_run_id(problem_id)
+        if run_id is None or run_id == previous_run_id:
             raise exceptions.SubmitError('Submit failed unexpectedly')
         return run_id
 
@@ -118,23 +122,36 @@ class _UniClient(BaseClient):
         user_id = kwargs.get('user_id', '')
         problem_id = kwargs.get('problem_id', '')
         url = self._get_status_url(run_id=run_id, problem_id=problem_id, user_id=user_id)
-        resp = self._request_url('get', url)
+        resp = self._request_url('get', url, retry=False)
         result = self.__class__._find_verdict(resp, run_id)
         if result is not None:
             return result
         if self.client_type == 'contest':
             for page in range(2, 5):
                 status_url = url + f'&page={page}'
-                resp = self._request_url('get', status_url)
+                resp = self._request_url('get', status_url, retry=False)
                 result = self.__class__._find_verdict(resp, run_id)
                 if result is not None:
                     return result
 
-    def _request_url(self, method, url, data=None, timeout=None):
+    def _get_latest_run_id(self, problem_id):
+        url = self._get_status_url(problem_id=problem_id, user_id=self.username)
+        resp = self._request_url('get', url)
+        try:
+            tables = BeautifulSoup(resp, 'lxml').find_all('table')
+            tables.reverse()
+            pattern = re.compile(r'Run ID.*Judge Status.*Author', re.DOTALL)
+            table = next(filter(lambda x: re.search(pattern, str(x)), tables))
+            tag = table.find('tr', align="center")
+            return tag.find('td').text.strip()
+        except (AttributeError, StopIteration):
+            return None
+
+    def _request_url(self, method, url, data=None, timeout=None, retry=True):
         if timeout is None:
             timeout = self.timeout
         try:
-            r = self._session.request(method, url, data=data, timeout=timeout)
+            r = self._send(method, url, data=data, timeout=timeout, retry=retry)
         except requests.exceptions.RequestException:
             raise exceptions.ConnectionError(f'Request "{url}" failed')
         if re.search('Sign In Your Account', r.text):
@@ -237,8 +254,8 @@ class _UniClient(BaseClient):
 
 class HDUClient(_UniClient):
     def __init__(self, auth=None, **kwargs):
-        super().__init__(auth, **kwargs)
         self.name = 'hdu'
+        super().__init__(auth, **kwargs)
 
     def get_name(self):
         return self.name
@@ -282,8 +299,8 @@ class HDUContestClient(_UniClient, ContestClient):
         timeout = kwargs.get('timeout', 5)
         if contest_id is None:
             raise exceptions.JudgeException('You must specific a contest id')
-        super().__init__(auth, 'contest', str(contest_id), timeout)
         self.name = f'hdu_ct_{contest_id}'
+        super().__init__(auth, 'contest', str(contest_id), timeout)
         self._contest_info = ContestInfo('hdu', self.contest_id)
         self.refresh_contest_info()
 
@@ -0,0 +1,88 @@
+import random
+import threading
+import time
+
+from config import CIRCUIT_BREAKER_CONFIG, logger
+from ..metrics import registry
+
+
+def backoff(policy, attempt):
+    delay = min(policy['max_delay'], policy['base_delay'] * 2 ** attempt)
+    return random.uniform(delay / 2, delay)
+
+
+class CircuitBreaker(object):
+    def __init__(self, site, threshold=CIRCUIT_BREAKER_CONFIG['threshold'],
+                 cooldown=CIRCUIT_BREAKER_CONFIG['cooldown'], max_cooldown=CIRCUIT_BREAKER_CONFIG['max_cooldown']):
+        self.site = site
+        self._threshold = threshold
+        self._base_cooldown = cooldown
+        self._max_cooldown = max_cooldown
+        self._cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._probing = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
+
+    def retry_after(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 0
+            return max(self._opened_at + self._cooldown - time.monotonic(), 0)
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing is not None or time.monotonic() - self._opened_at < self._cooldown:
+                return False
+            self._probing = threading.get_ident()
+            return True
+
+    def release(self):
+        # Frees the probe of the calling thread when its request ended without
+        # recording a success or a failure.
+        with self._lock:
+            if self._probing == threading.get_ident():
+                self._probing = None
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info(f'Circuit breaker closed, site: {self.site}')
+            self._failures = 0
+            self._opened_at = None
+            self._probing = None
+            self._cooldown = self._base_cooldown
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing is not None:
+                self._probing = None
+                self._opened_at = time.monotonic()
+                self._cooldown = min(self._cooldown * 2, self._max_cooldown)
+                logger.warning(f'Circuit breaker reopened, site: {self.site}, cooldown: {self._cooldown}')
+            elif self._opened_at is None and self._failures >= self._threshold:
+                self._opened_at = time.monotonic()
+                logger.warning(f'Circuit breaker opened, site: {self.site}, failures: {self._failures}')
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(site):
+    breaker = _breakers.get(site)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(site, CircuitBreaker(site))
+    return breaker
+
+
+registry.gauge('vjudge_circuit_breaker_open', 'Whether the circuit breaker of a site is open.', ('site',),
+               function=lambda: {(k,): int(v.is_open) for k, v in list(_breakers.items())})
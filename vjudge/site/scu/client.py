@@ -1,27 +1,104 @@
+import hashlib
 import os
 import re
 import sqlite3
+import threading
+import time
 
 import requests
 from bs4 import BeautifulSoup
 
+from config import REMOTE_BASE_URLS, SCU_CAPTCHA_CONFIG, logger
 from .. import exceptions
 from ..base import BaseClient
+from .solver import CaptchaSolver
+from ...metrics import registry
 
 __all__ = ('SOJClient',)
 
-base_url = 'http://acm.scu.edu.cn/soj'
+base_url = REMOTE_BASE_URLS['scu']
 base_dir = os.path.abspath(os.path.dirname(__file__))
-db = sqlite3.connect(os.path.join(base_dir, 'captcha.db'), check_same_thread=False)
+
+
+class CaptchaStore(object):
+    def __init__(self, path, check_interval=60):
+        self._path = path
+        self._check_interval = check_interval
+        self._codes = {}
+        self._mtime = None
+        self._checked_at = time.monotonic()
+        self._lock = threading.Lock()
+        self.reload()
+
+    def get(self, digest):
+        if time.monotonic() - self._checked_at >= self._check_interval:
+            self._reload_if_changed()
+        return self._codes.get(digest)
+
+    def add(self, digest, code):
+        with self._lock:
+            try:
+                connection = sqlite3.connect(self._path)
+                try:
+                    with connection:
+                        connection.execute('INSERT OR IGNORE INTO captcha (hash, code) VALUES (?, ?)', (digest, code))
+                finally:
+                    connection.close()
+                self._mtime = os.stat(self._path).st_mtime_ns
+            except (OSError, sqlite3.Error) as e:
+                logger.error(f'Saved captcha failed, path: {self._path}, hash: {digest}, reason: {e}')
+            codes = dict(self._codes)
+            codes.setdefault(digest, code)
+            self._codes = codes
+
+    def reload(self):
+        mtime = os.stat(self._path).st_mtime_ns
+        connection = sqlite3.connect(f'file:{self._path}?mode=ro', uri=True)
+        try:
+            codes = dict(connection.execute('SELECT hash, code FROM captcha'))
+        finally:
+            connection.close()
+        self._codes = codes
+        self._mtime = mtime
+        return len(codes)
+
+    def _reload_if_changed(self):
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._checked_at = time.monotonic()
+            if os.stat(self._path).st_mtime_ns != self._mtime:
+                logger.info(f'Reloaded captcha store, path: {self._path}, count: {self.reload()}')
+        except (OSError, sqlite3.Error) as e:
+            logger.error(f'Reloaded captcha store failed, path: {self._path}, reason: {e}')
+        finally:
+            self._lock.release()
+
+
+captcha_db_path = SCU_CAPTCHA_CONFIG['db_path'] or os.path.join(base_dir, 'captcha.db')
+captcha_store = CaptchaStore(captcha_db_path)
+captcha_solver = CaptchaSolver(path=SCU_CAPTCHA_CONFIG['templates_path'],
+                               save_interval=SCU_CAPTCHA_CONFIG['save_interval'])
+captcha_lookups = registry.counter('vjudge_scu_captcha_lookups_total', 'SCU captcha lookups by outcome.',
+                                   ('result',))
 
 
 class SOJClient(BaseClient):
+    endpoint_patterns = (
+        (r'/login\.action', 'login'),
+        (r'/submit\.action', 'submit'),
+        (r'/solutions\.action', 'status'),
+        (r'/problems?\.action', 'problem'),
+        (r'/validation_code', 'captcha'),
+    )
+
     def __init__(self, auth=None, **kwargs):
         super().__init__()
         self.auth = auth
         self.name = 'scu'
         self.client_type = 'practice'
         self.timeout = kwargs.get('timeout', 5)
+        self._solved_captcha = None
         if auth is not None:
             self.username, self.password = auth
             self.login(self.username, self.password)
@@ -64,6 +141,7 @@ class SOJClient(BaseClient):
     def update_cookies(self):
         if self.auth is None:
             raise exceptions.LoginRequired
+        self._record_relogin()
         self.login(self.username, self.password)
 
     def get_problem(self, problem_id):
@@ -103,35 +181,38 @@ class SOJClient(BaseClient):
         if self.auth is None:
             raise exceptions.LoginRequired('Login is required')
         submit_url = f'{base_url}/submit.action'
-        status_url = f'{base_url}/solutions.action?userId={self.username}&problemId={problem_id}'
-        captcha = self._get_captcha()
-        if captcha is None:
-            raise exceptions.JudgeException('Can not find a valid captcha')
-        data = {
-            'problemId': problem_id,
-            'validation': captcha,
-            'language': language,
-            'source': source_code,
-            'submit': 'Submit'
-        }
-        resp = self._request_url('post', submit_url, data=data)
-        if re.search('ERROR', resp):
+
+        def make_data():
+            captcha = self._get_captcha()
+            if captcha is None:
+                raise exceptions.JudgeException('Can not find a valid captcha')
+            return {
+                'problemId': problem_id,
+                'validation': captcha,
+                'language': language,
+                'source': source_code,
+                'submit': 'Submit'
+            }
+
+        self._solved_captcha = None
+        previous_run_id = self._get_latest_run_id(problem_id)
+        resp = self._submit_with_retry(submit_url, make_data, problem_id, previous_run_id)
+        if resp is not None and re.search('ERROR', resp):
             if not self.check_login():
                 raise exceptions.LoginRequired('Login is required')
             else:
                 raise exceptions.SubmitError('Submit failed unexpectedly')
-        resp = self._request_url('get', status_url)
-        soup = BeautifulSoup(resp, 'lxml')
-        try:
-            tag = soup.find_all('table')[1].find_all('tr')[1]
-            run_id = next(tag.stripped_strings)
-        except IndexError:
-            raise exceptions.SubmitError
+        run_id = self._get_latest_run_id(problem_id)
+        if run_id is None or run_id == previous_run_id:
+            raise exceptions.SubmitError('Submit failed unexpectedly')
+        if self._solved_captcha is not None:
+            captcha_store.add(*self._solved_captcha)
+            self._solved_captcha = None
         return run_id
 
     def get_submit_status(self, run_id, **kwargs):
         status_url = f'{base_url}/solutions.action?from={run_id}'
-        resp = self._request_url('get', status_url)
+        resp = self._request_url('get', status_url, retry=False)
         try:
             soup = BeautifulSoup(resp, 'lxml')
             tag = soup.find_all('table')[1].find_all('tr')[1]
@@ -159,11 +240,21 @@ class SOJClient(BaseClient):
             ids.append(pid)
         return ids
 
-    def _request_url(self, method, url, data=None, timeout=None):
+    def _get_latest_run_id(self, problem_id):
+        status_url = f'{base_url}/solutions.action?userId={self.username}&problemId={problem_id}'
+        resp = self._request_url('get', status_url)
+        soup = BeautifulSoup(resp, 'lxml')
+        try:
+            tag = soup.find_all('table')[1].find_all('tr')[1]
+            return next(tag.stripped_strings)
+        except (IndexError, StopIteration):
+            return None
+
+    def _request_url(self, method, url, data=None, timeout=None, retry=True):
         if timeout is None:
             timeout = self.timeout
         try:
-            r = self._session.request(method, url, data=data, timeout=timeout)
+            r = self._send(method, url, data=data, timeout=timeout, retry=retry)
         except requests.exceptions.RequestException:
             raise exceptions.ConnectionError(f'Request "{url}" failed')
         return r.text
@@ -171,15 +262,20 @@ class SOJClient(BaseClient):
     def _get_captcha(self):
         url = os.path.join(base_url, 'validation_code')
         try:
-            r = self._session.get(url, timeout=self.timeout)
+            r = self._send('get', url, timeout=self.timeout)
         except requests.exceptions.RequestException:
             raise exceptions.ConnectionError(f'Request "{url}" failed')
-        import hashlib
-        h = hashlib.md5(r.content).hexdigest()
-        cursor = db.cursor()
-        cursor.execute("SELECT Code FROM Captcha WHERE Hash=?", (h,))
-        res = cursor.fetchall()
-        try:
-            return res[0][0]
-        except IndexError:
-            return
+        self._solved_captcha = None
+        digest = hashlib.md5(r.content).hexdigest()
+        code = captcha_store.get(digest)
+        if code is not None:
+            captcha_lookups.inc('cached')
+            captcha_solver.learn(r.content, code)
+            return code
+        code = captcha_solver.solve(r.content)
+        if code is None:
+            captcha_lookups.inc('unsolved')
+            return None
+        captcha_lookups.inc('solved')
+        self._solved_captcha = (digest, code)
+        return code
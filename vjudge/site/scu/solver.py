@@ -0,0 +1,147 @@
+import io
+import os
+import threading
+import time
+import zipfile
+
+import numpy as np
+from PIL import Image
+
+from config import logger
+
+GLYPH_SIZE = (12, 16)
+INK_THRESHOLD = 0.5
+MIN_GLYPH_WIDTH = 2
+MAX_TEMPLATES = 20
+MAX_DISTANCE = 0.2
+
+
+class _TemplateSaver(threading.Thread):
+    def __init__(self, solver, interval):
+        super().__init__(name='captcha-template-saver', daemon=True)
+        self._solver = solver
+        self._interval = interval
+
+    def run(self):
+        while True:
+            time.sleep(self._interval)
+            self._solver.save()
+
+
+class CaptchaSolver(object):
+    def __init__(self, length=4, path=None, save_interval=60):
+        self.length = length
+        self._path = path
+        self._save_interval = save_interval
+        self._templates = {}
+        self._version = 0
+        self._saved_version = 0
+        self._saver = None
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        if path is not None:
+            self._templates = self._load(path)
+
+    def learn(self, content, code):
+        if self._is_full(code):
+            return
+        glyphs = self._segment(content)
+        if glyphs is None or len(glyphs) != len(code):
+            return
+        with self._lock:
+            templates = dict(self._templates)
+            for char, glyph in zip(code, glyphs):
+                known = templates.get(char)
+                if known is None:
+                    templates[char] = glyph[np.newaxis]
+                elif len(known) < MAX_TEMPLATES:
+                    templates[char] = np.concatenate((known, glyph[np.newaxis]))
+            self._templates = templates
+            self._version += 1
+            # Saved from a background thread, the archive is rewritten as a whole
+            # and learn() runs on the submit path.
+            if self._path is not None and self._saver is None:
+                self._saver = _TemplateSaver(self, self._save_interval)
+                self._saver.start()
+
+    def save(self):
+        with self._save_lock:
+            with self._lock:
+                templates, version = self._templates, self._version
+            if self._path is None or version == self._saved_version:
+                return
+            if self._save(self._path, templates):
+                self._saved_version = version
+
+    def solve(self, content):
+        templates = self._templates
+        if not templates:
+            return None
+        glyphs = self._segment(content)
+        if glyphs is None or len(glyphs) != self.length:
+            return None
+        code = []
+        for glyph in glyphs:
+            best_char, best_distance = None, MAX_DISTANCE
+            for char, known in templates.items():
+                distance = np.abs(known - glyph).mean(axis=(1, 2)).min()
+                if distance < best_distance:
+                    best_char, best_distance = char, distance
+            if best_char is None:
+                return None
+            code.append(best_char)
+        return ''.join(code)
+
+    @staticmethod
+    def _load(path):
+        try:
+            with np.load(path) as data:
+                templates = {chr(int(x)): data[x] for x in data.files}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, zipfile.BadZipFile) as e:
+            logger.error(f'Loaded captcha templates failed, path: {path}, reason: {e}')
+            return {}
+        logger.info(f'Loaded captcha templates, path: {path}, chars: {len(templates)}')
+        return templates
+
+    @staticmethod
+    def _save(path, templates):
+        # Written to a temporary file first so that a crash or a concurrent
+        # reader never sees a partial archive.
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(temp_path, 'wb') as f:
+                np.savez_compressed(f, **{str(ord(k)): v for k, v in templates.items()})
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.error(f'Saved captcha templates failed, path: {path}, reason: {e}')
+            return False
+        return True
+
+    def _is_full(self, code):
+        templates = self._templates
+        return all(char in templates and len(templates[char]) >= MAX_TEMPLATES for char in code)
+
+    @staticmethod
+    def _segment(content):
+        try:
+            image = Image.open(io.BytesIO(content)).convert('L')
+        except (OSError, ValueError) as e:
+            logger.warning(f'Decoded captcha image failed, reason: {e}')
+            return None
+        ink = np.asarray(image, dtype=np.float32) / 255 < INK_THRESHOLD
+        glyphs = []
+        start = None
+        for x, filled in enumerate(np.append(ink.any(axis=0), False)):
+            if filled and start is None:
+                start = x
+            elif not filled and start is not None:
+                if x - start >= MIN_GLYPH_WIDTH:
+                    glyph = ink[:, start:x]
+                    rows = np.flatnonzero(glyph.any(axis=1))
+                    glyph = Image.fromarray(glyph[rows[0]:rows[-1] + 1].astype(np.uint8) * 255)
+                    glyph = glyph.resize(GLYPH_SIZE, Image.BILINEAR)
+                    glyphs.append(np.asarray(glyph, dtype=np.float32) / 255)
+                start = None
+        return glyphs
@@ -0,0 +1,106 @@
+import heapq
+import json
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+import redis
+
+from config import REDIS_CONFIG, WORKLOAD_CAPTURE_PATH, logger
+from .dump import open_ndjson
+from .metrics import registry
+from .models import db, Submission
+
+dropped_records = registry.counter('vjudge_workload_dropped_records_total',
+                                   'Captured workload records dropped because the writer fell behind.')
+
+workload_kinds = ('submitter', 'crawler')
+
+
+class WorkloadRecorder(threading.Thread):
+    def __init__(self, path=WORKLOAD_CAPTURE_PATH, max_pending=10000, daemon=True):
+        super().__init__(daemon=daemon)
+        self.path = path
+        self.dropped = 0
+        self._pending = queue.Queue(maxsize=max_pending)
+
+    @property
+    def enabled(self):
+        return self.path is not None
+
+    def record(self, kind, job):
+        if self.path is None:
+            return
+        try:
+            self._pending.put_nowait(json.dumps([round(time.time(), 3), kind, job], separators=(',', ':')))
+        except queue.Full:
+            self.dropped += 1
+            dropped_records.inc()
+
+    def capture_path(self, pid):
+        # One file per process, gunicorn workers appending to a shared file
+        # would interleave batches and break gzip members.
+        if self.path.endswith('.gz'):
+            return f'{self.path[:-3]}.{pid}.gz'
+        return f'{self.path}.{pid}'
+
+    def run(self):
+        path = self.capture_path(os.getpid())
+        logger.info(f'Recording workload to {path}')
+        reported = 0
+        while True:
+            lines = [self._pending.get()]
+            while len(lines) < 1000:
+                try:
+                    lines.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with open_ndjson(path, 'a') as f:
+                    f.write('\n'.join(lines) + '\n')
+            except OSError as e:
+                logger.error(f'Recorded workload failed, path: {path}, lost: {len(lines)}, reason: {e}')
+            dropped = self.dropped
+            if dropped > reported:
+                logger.warning(f'Recorded workload fell behind, path: {path}, dropped: {dropped - reported}')
+                reported = dropped
+
+
+def _read_records(fp):
+    for line in fp:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def replay_workload(fps, source_code, speed=1.0):
+    redis_con = redis.StrictRedis(host=REDIS_CONFIG['host'], port=REDIS_CONFIG['port'], db=REDIS_CONFIG['db'])
+    counts = Counter()
+    started = time.time()
+    first = None
+    try:
+        records = heapq.merge(*[_read_records(x) for x in fps], key=lambda x: x[0])
+        for timestamp, kind, job in records:
+            if kind not in workload_kinds:
+                continue
+            if first is None:
+                first = timestamp
+            delay = started + (timestamp - first) / speed - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            if kind == 'submitter':
+                submission = Submission(oj_name=job['oj_name'], problem_id=job['problem_id'],
+                                        language=job['language'], source_code=source_code,
+                                        enqueued_at=datetime.utcnow())
+                db.session.add(submission)
+                db.session.commit()
+                redis_con.lpush(REDIS_CONFIG['queue']['submitter_queue'], submission.id)
+            else:
+                redis_con.lpush(REDIS_CONFIG['queue']['crawler_queue'], json.dumps(job))
+            counts[kind] += 1
+    finally:
+        db.session.remove()
+    return counts